@@ -0,0 +1,143 @@
+# benchmark_columnar.py
+# Throughput and peak memory of the dify_script row loop vs the columnar engine.
+#
+# Writes a synthetic CSV (id,value1,value2 with a small share of bad rows), then
+# runs each mode in a fresh process so peak RSS is not shared between runs. Both
+# modes must agree on the number of valid and bad rows, otherwise it exits with 1.
+#
+#   python benchmark_columnar.py                          # 1M and 10M rows
+#   python benchmark_columnar.py --rows 100000 --bad-ratio 0.01
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+
+import sys
+
+from columnar import COLUMNAR_BATCH_ROWS, iter_column_batches
+
+# Values int() rejects; "²" passes str.isdigit, so it also guards the columnar digit check
+BAD_VALUES = ["n/a", "1.5", "²", "+-1"]
+
+
+def write_csv(path: str, rows: int, bad_ratio: float, seed: int = 7):
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "value1", "value2"])
+        for i in range(1, rows + 1):
+            if rng.random() < bad_ratio:
+                writer.writerow([i, rng.choice(BAD_VALUES), rng.randint(0, 10**6)])
+            else:
+                writer.writerow([i, rng.randint(0, 10**6), rng.randint(0, 10**6)])
+
+
+def run_row_loop(path: str, keep: bool) -> dict:
+    """The conversion loop from dify_script.main, reading the same file."""
+    records = []
+    valid = 0
+    errors = 0
+    with open(path, newline="") as f:
+        for row_num, row in enumerate(csv.DictReader(f), start=1):
+            try:
+                record = {
+                    "id": int(row["id"]),
+                    "value1": int(row["value1"]),
+                    "value2": int(row["value2"]),
+                    "sum": int(row["value1"]) + int(row["value2"])
+                }
+                valid += 1
+                if keep:
+                    records.append(record)
+            except (ValueError, KeyError) as e:
+                errors += 1
+                if keep:
+                    records.append({"status": "error", "message": f"Data conversion error in row {row_num}: {e}",
+                                    "original_row": row, "type": "row_parse_error"})
+    return {"valid": valid, "errors": errors}
+
+
+def run_columnar(path: str, keep: bool, batch_rows: int) -> dict:
+    batches = []
+    valid = 0
+    errors = 0
+    with open(path, newline="") as f:
+        for batch in iter_column_batches(f, batch_rows):
+            valid += batch.valid_count
+            errors += int(batch.error_mask.sum())
+            if keep:
+                batches.append(batch.columns)
+    return {"valid": valid, "errors": errors}
+
+
+def _measure(target, args, queue):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    try:
+        result = target(*args)
+    except Exception as e:
+        # Reported to the parent, which would otherwise wait on the queue forever
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux
+    queue.put({**result, "seconds": elapsed, "peak_rss_mb": round(peak / 1024, 1),
+               "rss_growth_mb": round((peak - baseline) / 1024, 1)})
+
+
+def measure(target, *args) -> dict:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(target, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"{target.__name__} failed: {result['error']}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Row loop vs columnar CSV transform.")
+    parser.add_argument("--rows", default="1000000,10000000", help="Comma-separated row counts")
+    parser.add_argument("--bad-ratio", type=float, default=0.001, help="Share of rows with a non-integer value")
+    parser.add_argument("--batch-rows", type=int, default=COLUMNAR_BATCH_ROWS)
+    parser.add_argument("--stream-only", action="store_true",
+                        help="Discard results instead of keeping them in memory (isolates parsing cost)")
+    parser.add_argument("--output", default="benchmark_columnar.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    keep = not args.stream_only
+    results = []
+    mismatches = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in [int(r) for r in args.rows.split(",")]:
+            path = os.path.join(tmp, f"bench_{rows}.csv")
+            write_csv(path, rows, args.bad_ratio)
+            size_mb = os.path.getsize(path) / 2**20
+            print(f"📊 {rows} rows ({size_mb:.0f} MB)")
+
+            for mode, target, extra in [("row_loop", run_row_loop, (keep,)),
+                                        ("columnar", run_columnar, (keep, args.batch_rows))]:
+                result = measure(target, path, *extra)
+                result.update(mode=mode, rows=rows, rows_per_second=round(rows / result["seconds"]))
+                results.append(result)
+                print(f"✅ {mode:>9}: {result['seconds']:.2f}s  {result['rows_per_second']:,} rows/s  "
+                      f"peak RSS {result['peak_rss_mb']} MB (+{result['rss_growth_mb']} MB)  errors={result['errors']}")
+
+            row_loop, columnar = results[-2:]
+            if (row_loop["valid"], row_loop["errors"]) != (columnar["valid"], columnar["errors"]):
+                mismatches.append(rows)
+                print(f"❌ Modes disagree on {rows} rows: row_loop valid={row_loop['valid']} errors={row_loop['errors']}, "
+                      f"columnar valid={columnar['valid']} errors={columnar['errors']}")
+
+    with open(args.output, "w") as f:
+        json.dump({"bad_ratio": args.bad_ratio, "keep_results": keep, "results": results}, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+    if mismatches:
+        sys.exit(1)
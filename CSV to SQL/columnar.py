@@ -0,0 +1,260 @@
+import csv
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+REQUIRED_HEADERS = ["id", "value1", "value2"]
+OUTPUT_COLUMNS = ["id", "value1", "value2", "sum"]
+
+# Rows converted per columnar batch; bounds memory regardless of file size
+COLUMNAR_BATCH_ROWS = int(os.getenv("COLUMNAR_BATCH_ROWS", 100000))
+
+# Longest digit string that always fits in int64
+_MAX_DIGITS = 18
+
+
+class CsvHeaderError(ValueError):
+    pass
+
+
+def header_columns(fieldnames: List[str]) -> Dict[str, int]:
+    """Map each required column to its position; extra columns are ignored."""
+    fieldnames = [name.strip() for name in fieldnames]
+    missing = [h for h in REQUIRED_HEADERS if h not in fieldnames]
+    if missing:
+        raise CsvHeaderError(f"Missing required CSV headers. Expected: {REQUIRED_HEADERS}, Found: {fieldnames}")
+    return {name: fieldnames.index(name) for name in REQUIRED_HEADERS}
+
+
+def _parse_int_stripped(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """General path: tolerates surrounding whitespace; np.char ops are slower."""
+    stripped = np.char.strip(values)
+    digits = np.char.lstrip(stripped, "+-")
+    sign_len = np.char.str_len(stripped) - np.char.str_len(digits)
+    # isdecimal, not isdigit: int() rejects superscripts and other digit-like characters
+    valid = np.char.isdecimal(digits) & (sign_len <= 1) & (np.char.str_len(digits) <= _MAX_DIGITS)
+    return np.where(valid, stripped, "0").astype(np.int64), valid
+
+
+def parse_int_column(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse a fixed-width unicode column to int64 without a per-element loop: the
+    array is viewed as a (rows, width) matrix of code points and the digits are
+    weighted by powers of ten. Returns (values, valid mask); invalid entries are
+    0. Entries the fast path rejects (e.g. padded with spaces) get a second look
+    through the np.char path.
+    """
+    values = np.ascontiguousarray(values, dtype=str)
+    width = values.dtype.itemsize // 4
+    if len(values) == 0 or width == 0 or width > _MAX_DIGITS + 1:
+        return _parse_int_stripped(values)
+
+    codes = values.view(np.uint32).reshape(len(values), width).astype(np.int64)
+    length = np.count_nonzero(codes, axis=1)
+    first = codes[:, 0]
+    negative = first == ord("-")
+    signed = (negative | (first == ord("+"))).astype(np.int64)
+
+    position = np.arange(width)
+    in_number = (position >= signed[:, None]) & (position < length[:, None])
+    digits = codes - ord("0")
+    is_digit = (digits >= 0) & (digits <= 9)
+    valid = np.all(is_digit | ~in_number, axis=1) & (length - signed > 0) & (length - signed <= _MAX_DIGITS)
+
+    exponent = np.clip(length[:, None] - 1 - position, 0, _MAX_DIGITS)
+    magnitude = np.sum(np.where(in_number & is_digit, digits * 10 ** exponent, 0), axis=1)
+    parsed = np.where(valid, np.where(negative, -magnitude, magnitude), 0)
+
+    retry = np.flatnonzero(~valid)
+    if len(retry):
+        parsed[retry], valid[retry] = _parse_int_stripped(values[retry])
+    return parsed, valid
+
+
+class RecordSplitter:
+    """
+    Splits decoded CSV text, fed in arbitrary chunks, into records the way
+    csv.reader does: a record ends at a newline outside quotes, so other
+    line-break characters are data and a quoted field may span lines. The
+    incomplete record at the end of a chunk is carried over to the next one.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.quotes = 0  # '"' seen in `pending`; odd while inside a quoted field
+
+    def feed(self, text: str) -> List[str]:
+        *lines, partial = text.split("\n")
+        records = []
+        for line in lines:
+            self.pending += line
+            self.quotes += line.count('"')
+            if self.quotes % 2:
+                self.pending += "\n"
+                continue
+            records.append(self.pending)
+            self.pending, self.quotes = "", 0
+        self.pending += partial
+        self.quotes += partial.count('"')
+        return records
+
+    def finish(self, text: str = "") -> List[str]:
+        """Records left after the last chunk (`text`: whatever the decoder still held)."""
+        records = self.feed(text)
+        tail, self.pending, self.quotes = self.pending, "", 0
+        return records + [tail] if tail else records
+
+
+def iter_csv_records(text_chunks: Iterable[str]) -> Iterator[str]:
+    """Complete CSV records from decoded text chunks (see RecordSplitter)."""
+    splitter = RecordSplitter()
+    for chunk in text_chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.finish()
+
+
+@dataclass
+class ColumnBatch:
+    """One batch of converted rows. `error_mask` covers every input row of the batch."""
+    first_row: int
+    columns: Dict[str, np.ndarray]  # OUTPUT_COLUMNS, valid rows only
+    raw: np.ndarray  # (rows, len(REQUIRED_HEADERS)) input strings, kept for error reporting
+    error_mask: np.ndarray
+    error_reasons: Dict[int, str]  # batch offset -> reason, only for rows in error_mask
+
+    def __len__(self) -> int:
+        return len(self.error_mask)
+
+    @property
+    def valid_count(self) -> int:
+        return len(self.columns["id"])
+
+    def tuples(self) -> List[Tuple]:
+        return list(zip(*(self.columns[name].tolist() for name in OUTPUT_COLUMNS)))
+
+    def records(self) -> List[dict]:
+        return [dict(zip(OUTPUT_COLUMNS, row)) for row in self.tuples()]
+
+    def ordered_records(self) -> List[dict]:
+        """records() and errors() merged back into input row order."""
+        if not self.error_mask.any():
+            return self.records()
+        valid, errors = iter(self.records()), iter(self.errors())
+        return [next(errors) if bad else next(valid) for bad in self.error_mask.tolist()]
+
+    def errors(self) -> List[dict]:
+        """Row errors in the shape dify_script.main reports them, plus the row number."""
+        return [
+            {
+                "row": self.first_row + offset,
+                "status": "error",
+                "message": f"{self.error_reasons[offset]} in row {self.first_row + offset}",
+                "original_row": dict(zip(REQUIRED_HEADERS, self.raw[offset].tolist())),
+                "type": "row_parse_error",
+            }
+            for offset in np.flatnonzero(self.error_mask).tolist()
+        ]
+
+
+def _split_lines(lines: List[str], field_count: int) -> Optional[np.ndarray]:
+    """
+    Fast path for plain CSV (no quoting, every line has the header's field
+    count): one str.split over the whole batch instead of csv.reader per row.
+    """
+    text = "\n".join(lines)
+    if '"' in text:
+        return None
+    fields = text.replace("\n", ",").split(",")
+    if len(fields) != len(lines) * field_count:
+        return None
+    return np.array(fields, dtype=str).reshape(len(lines), field_count)
+
+
+def transform_lines(lines: List[str], columns: Dict[str, int], field_count: int, first_row: int) -> ColumnBatch:
+    """Convert a batch of raw CSV lines (no line endings, no blank lines)."""
+    table = _split_lines(lines, field_count)
+    if table is None:
+        return transform_rows(list(csv.reader(lines)), columns, first_row)
+    positions = [columns[name] for name in REQUIRED_HEADERS]
+    return _transform(table[:, positions], np.zeros(len(lines), dtype=bool), first_row,
+                      lambda offset: "")
+
+
+def transform_rows(rows: List[List[str]], columns: Dict[str, int], first_row: int) -> ColumnBatch:
+    """Convert already-split CSV rows; rows missing a required column are flagged."""
+    width = max(columns.values()) + 1
+    positions = [columns[name] for name in REQUIRED_HEADERS]
+    short = np.fromiter((len(row) < width for row in rows), dtype=bool, count=len(rows))
+    raw = np.array(
+        [[row[p] if p < len(row) else "" for p in positions] for row in rows],
+        dtype=str,
+    ).reshape(len(rows), len(positions))
+    return _transform(raw, short, first_row,
+                      lambda offset: f"Missing column (expected at least {width} columns, found {len(rows[offset])})")
+
+
+def _transform(raw: np.ndarray, short: np.ndarray, first_row: int, short_reason) -> ColumnBatch:
+    """
+    Parse the required columns and compute `sum` with vectorized expressions.
+    Bad rows are flagged in the error mask instead of raising.
+    """
+    parsed = {}
+    invalid = {}
+    for index, name in enumerate(REQUIRED_HEADERS):
+        values, valid = parse_int_column(raw[:, index])
+        parsed[name] = values
+        invalid[name] = ~valid & ~short
+
+    total = parsed["value1"] + parsed["value2"]
+    # Signed overflow: both operands differ in sign from the result
+    overflow = ((parsed["value1"] ^ total) & (parsed["value2"] ^ total)) < 0
+
+    error_mask = short | overflow
+    for mask in invalid.values():
+        error_mask |= mask
+
+    error_reasons = {}
+    for offset in np.flatnonzero(error_mask).tolist():
+        if short[offset]:
+            error_reasons[offset] = short_reason(offset)
+        elif overflow[offset] and not any(invalid[name][offset] for name in REQUIRED_HEADERS):
+            error_reasons[offset] = "Integer overflow computing sum"
+        else:
+            bad = [name for name in REQUIRED_HEADERS if invalid[name][offset]]
+            error_reasons[offset] = f"Data conversion error in column(s) {', '.join(bad)}"
+
+    keep = ~error_mask
+    output = {name: parsed[name][keep] for name in REQUIRED_HEADERS}
+    output["sum"] = total[keep]
+    return ColumnBatch(first_row, output, raw, error_mask, error_reasons)
+
+
+def iter_column_batches(lines: Iterable[str], batch_rows: int = COLUMNAR_BATCH_ROWS) -> Iterator[ColumnBatch]:
+    """
+    Read a CSV (header first) from any iterable of lines and yield ColumnBatches.
+    Lines must be whole records; use iter_csv_records when quoted fields may
+    contain line breaks.
+    Blank lines are skipped; row numbers count data rows from 1, like dify_script.
+    """
+    lines = iter(lines)
+    header = next((line for line in lines if line.strip()), None)
+    if header is None:
+        raise CsvHeaderError("CSV is empty")
+    fieldnames = next(csv.reader([header.lstrip("\ufeff")]))
+    columns = header_columns(fieldnames)
+
+    buffered = []
+    next_row = 1
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        buffered.append(line)
+        if len(buffered) >= batch_rows:
+            yield transform_lines(buffered, columns, len(fieldnames), next_row)
+            next_row += len(buffered)
+            buffered = []
+    if buffered:
+        yield transform_lines(buffered, columns, len(fieldnames), next_row)
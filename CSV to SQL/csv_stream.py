@@ -0,0 +1,128 @@
+import asyncio
+import codecs
+import csv
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from columnar import CsvHeaderError, RecordSplitter, header_columns, transform_lines
+from mysql_writer import write_rows
+
+# Rows parsed, transformed and written per batch
+CSV_BATCH_ROWS = int(os.getenv("CSV_BATCH_ROWS", 5000))
+# Row errors returned in the response (the total is always reported)
+MAX_REPORTED_ERRORS = int(os.getenv("MAX_REPORTED_ERRORS", 100))
+# Same restriction dify_script.main applies to the URLs it fetches
+CSV_URL_ALLOWED_HOSTS = [h.strip() for h in os.getenv("CSV_URL_ALLOWED_HOSTS", "upload.dify.ai").split(",") if h.strip()]
+CSV_FETCH_TIMEOUT = float(os.getenv("CSV_FETCH_TIMEOUT", 30))
+
+
+def check_csv_url(csv_url: str):
+    host = urlparse(csv_url).hostname or ""
+    if not any(host == allowed or host.endswith("." + allowed) for allowed in CSV_URL_ALLOWED_HOSTS):
+        raise ValueError(f"CSV URL host '{host}' is not allowed. Allowed: {CSV_URL_ALLOWED_HOSTS}")
+
+
+async def fetch_csv_chunks(csv_url: str) -> AsyncIterator[bytes]:
+    """Stream the CSV body from a URL without holding the whole file in memory."""
+    check_csv_url(csv_url)
+    async with httpx.AsyncClient(timeout=CSV_FETCH_TIMEOUT, follow_redirects=False) as client:
+        async with client.stream("GET", csv_url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
+
+async def iter_csv_records(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """
+    Decode byte chunks incrementally and yield lists of complete CSV records
+    (split like csv.reader does, see columnar.RecordSplitter).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    splitter = RecordSplitter()
+    async for chunk in byte_chunks:
+        records = splitter.feed(decoder.decode(chunk))
+        if records:
+            yield records
+    records = splitter.finish(decoder.decode(b"", final=True))
+    if records:
+        yield records
+
+
+async def ingest_csv_stream(byte_chunks: AsyncIterator[bytes], pool, db_slots: asyncio.Semaphore,
+                            batch_rows: int = CSV_BATCH_ROWS) -> dict:
+    """
+    Parse, transform (columnar.transform_lines) and upsert a CSV as it arrives.
+    Each batch is committed on its own, and the next batch is parsed while the
+    previous one is being written.
+    """
+    columns: Optional[Dict[str, int]] = None
+    field_count = 0
+    buffered: List[str] = []
+    next_row_num = 1
+    inserted = 0
+    row_count = 0
+    error_count = 0
+    reported_errors: List[dict] = []
+    pending_write: Optional[asyncio.Task] = None
+
+    async def write_batch(rows: List[Tuple]) -> int:
+        async with db_slots:
+            result = await asyncio.to_thread(write_rows, pool, rows)
+        return result["inserted"]
+
+    async def flush(rows: List[str]):
+        nonlocal next_row_num, inserted, row_count, error_count, pending_write
+        batch = transform_lines(rows, columns, field_count, next_row_num)
+        errors = batch.errors() if batch.error_mask.any() else []
+        next_row_num += len(rows)
+        row_count += len(rows)
+        error_count += len(errors)
+        reported_errors.extend(errors[:MAX_REPORTED_ERRORS - len(reported_errors)])
+        if pending_write is not None:
+            inserted += await pending_write
+            pending_write = None
+        if batch.valid_count:
+            pending_write = asyncio.create_task(write_batch(batch.tuples()))
+
+    try:
+        async for lines in iter_csv_records(byte_chunks):
+            if columns is None:
+                while lines and not lines[0].strip():
+                    lines = lines[1:]
+                if not lines:
+                    continue
+                fieldnames = next(csv.reader([lines[0]]))
+                columns = header_columns(fieldnames)
+                field_count = len(fieldnames)
+                lines = lines[1:]
+            for line in lines:
+                line = line.rstrip("\r\n")
+                if not line.strip():
+                    continue
+                buffered.append(line)
+                if len(buffered) >= batch_rows:
+                    await flush(buffered)
+                    buffered = []
+
+        if columns is None:
+            raise CsvHeaderError("CSV is empty")
+        if buffered:
+            await flush(buffered)
+        if pending_write is not None:
+            inserted += await pending_write
+            pending_write = None
+    finally:
+        if pending_write is not None:
+            # Let an in-flight batch finish (or fail) before reporting the error
+            await asyncio.gather(pending_write, return_exceptions=True)
+
+    return {
+        "status": "partial_success_with_errors" if error_count else "success",
+        "rows": row_count,
+        "inserted": inserted,
+        "error_count": error_count,
+        "errors": reported_errors,
+    }
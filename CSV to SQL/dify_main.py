@@ -1,16 +1,18 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from pydantic import BaseModel
-from typing import List
-import mysql.connector
+from typing import List, Optional
 from dotenv import load_dotenv
+import asyncio
 import os
 import logging
 
+from mysql_writer import create_pool, write_rows, POOL_SIZE
+from csv_stream import CsvHeaderError, fetch_csv_chunks, ingest_csv_stream
+
 # Load .env variables
 load_dotenv()
 
-app = FastAPI()
-
 # Read DB config from .env
 db_config = {
     "host": os.getenv("MYSQL_HOST"),
@@ -20,6 +22,18 @@ db_config = {
     "port": int(os.getenv("MYSQL_PORT", 3306))  # Default MySQL port is 3306
 }
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pool per worker instead of a new connection per request
+    app.state.db_pool = create_pool(db_config)
+    # Queue uploads beyond the pool size instead of failing with "pool exhausted"
+    app.state.db_slots = asyncio.Semaphore(POOL_SIZE)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
 # Define input schema
 class Record(BaseModel):
     id: int
@@ -48,30 +62,32 @@ class Payload(BaseModel):
 
 
 @app.post("/upload")
-async def upload_data(records: List[Record]):
+async def upload_data(records: List[Record], request: Request):
     # records = payload.result
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-
-        for row in records:
-            cursor.execute("""
-                INSERT INTO processed_data_dify (id, value1, value2, sum)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    value1 = VALUES(value1),
-                    value2 = VALUES(value2),
-                    sum = VALUES(sum)
-            """, (row.id, row.value1, row.value2, row.sum))
-
-        conn.commit()
-        return {"status": "success", "inserted": len(records)}
+        rows = [(row.id, row.value1, row.value2, row.sum) for row in records]
+
+        # The MySQL driver is blocking, so the write runs in a worker thread
+        async with request.app.state.db_slots:
+            result = await asyncio.to_thread(write_rows, request.app.state.db_pool, rows)
+
+        return {"status": "success", "inserted": result["inserted"], "method": result["method"]}
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+@app.post("/upload/csv")
+async def upload_csv(request: Request, url: Optional[str] = None):
+    """
+    Direct CSV ingestion without the LLM reformatting step. Send the CSV as the
+    request body (chunked uploads are fine), or pass ?url= to have it fetched.
+    """
+    try:
+        byte_chunks = fetch_csv_chunks(url) if url else request.stream()
+        return await ingest_csv_stream(byte_chunks, request.app.state.db_pool, request.app.state.db_slots)
+
+    except CsvHeaderError as e:
+        return {"status": "error", "message": str(e), "type": "header_error"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
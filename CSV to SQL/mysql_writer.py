@@ -0,0 +1,101 @@
+import csv
+import os
+import tempfile
+from typing import Iterable, List, Sequence, Tuple
+
+import mysql.connector
+from mysql.connector import pooling
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TABLE_NAME = os.getenv("MYSQL_TABLE", "processed_data_dify")
+COLUMNS = ("id", "value1", "value2", "sum")
+
+POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", 8))
+UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE", 1000))
+# Payloads at least this large go through LOAD DATA LOCAL INFILE (server needs local_infile=ON)
+LOAD_DATA_THRESHOLD = int(os.getenv("LOAD_DATA_THRESHOLD", 50000))
+ALLOW_LOCAL_INFILE = os.getenv("MYSQL_ALLOW_LOCAL_INFILE", "false").lower() == "true"
+
+_UPDATE_CLAUSE = ", ".join(f"`{c}` = VALUES(`{c}`)" for c in COLUMNS if c != "id")
+_COLUMN_LIST = ", ".join(f"`{c}`" for c in COLUMNS)
+_ROW_PLACEHOLDER = "(" + ", ".join(["%s"] * len(COLUMNS)) + ")"
+
+
+def create_pool(db_config: dict, pool_size: int = POOL_SIZE) -> pooling.MySQLConnectionPool:
+    return pooling.MySQLConnectionPool(
+        pool_name="csv_upload",
+        pool_size=pool_size,
+        pool_reset_session=True,
+        allow_local_infile=ALLOW_LOCAL_INFILE,
+        **db_config,
+    )
+
+
+def _chunks(rows: Sequence[Tuple], size: int) -> Iterable[Sequence[Tuple]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def upsert_rows(conn, rows: Sequence[Tuple], chunk_size: int = UPSERT_CHUNK_SIZE) -> int:
+    """Upsert with one multi-row INSERT ... ON DUPLICATE KEY UPDATE per chunk (no commit)."""
+    cursor = conn.cursor()
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            statement = (
+                f"INSERT INTO `{TABLE_NAME}` ({_COLUMN_LIST}) VALUES "
+                + ", ".join([_ROW_PLACEHOLDER] * len(chunk))
+                + f" ON DUPLICATE KEY UPDATE {_UPDATE_CLAUSE}"
+            )
+            cursor.execute(statement, [value for row in chunk for value in row])
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+def load_data_rows(conn, rows: Sequence[Tuple]) -> int:
+    """
+    Bulk load through a temporary CSV file. REPLACE gives the same result as the
+    upsert because every column is overwritten.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", delete=False) as tmp:
+        csv.writer(tmp, lineterminator="\n").writerows(rows)
+        path = tmp.name
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE `{TABLE_NAME}` "
+            f"FIELDS TERMINATED BY ',' LINES TERMINATED BY '\\n' ({_COLUMN_LIST})",
+            (path,),
+        )
+    finally:
+        cursor.close()
+        os.remove(path)
+    return len(rows)
+
+
+def write_rows(pool: pooling.MySQLConnectionPool, rows: List[Tuple], chunk_size: int = UPSERT_CHUNK_SIZE) -> dict:
+    """
+    Write all rows in one transaction on a pooled connection. Blocking: call it
+    from a worker thread, not the event loop.
+    """
+    conn = pool.get_connection()
+    try:
+        method = "upsert"
+        if ALLOW_LOCAL_INFILE and len(rows) >= LOAD_DATA_THRESHOLD:
+            try:
+                load_data_rows(conn, rows)
+                method = "load_data"
+            except mysql.connector.Error as e:
+                print(f"⚠️ LOAD DATA LOCAL INFILE failed, falling back to batched upsert: {e}")
+                conn.rollback()
+        if method == "upsert":
+            upsert_rows(conn, rows, chunk_size)
+        conn.commit()
+        return {"inserted": len(rows), "method": method}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()  # returns the connection to the pool
@@ -0,0 +1,159 @@
+# benchmark_profiles.py
+# Recall-vs-latency comparison of the vector storage profiles in schema.py.
+#
+# Loads the same vectors into one throwaway collection per profile on the Qdrant
+# server at QDRANT_HOST, then measures recall@k against an exact (brute-force
+# float32) baseline and per-query latency. Vectors are either sampled from the live
+# collection (--source-collection) or generated as synthetic clusters.
+#
+#   python benchmark_profiles.py --points 50000 --queries 200 --profiles default,int8,binary
+#   python benchmark_profiles.py --source-collection secure_photos --points 20000
+from qdrant_client import QdrantClient, models
+from urllib.parse import urlparse
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from schema import VECTOR_NAME, VECTOR_SIZE, SCHEMA_PROFILES, get_profile, SchemaProfile
+
+# --- Setup ---
+QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
+
+parsed = urlparse(QDRANT_HOST)
+client = QdrantClient(host=parsed.hostname or "localhost", port=parsed.port or 6333, timeout=300)
+
+BYTES_PER_DIM = {None: 4.0, "int8": 1.0, "binary": 1 / 8}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 200, seed: int = 7) -> np.ndarray:
+    """Clustered unit vectors, closer to real embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size=count)
+    return normalize(centers[assignment] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32))
+
+
+def sample_collection_vectors(collection_name: str, count: int) -> np.ndarray:
+    vectors = []
+    offset = None
+    while len(vectors) < count:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=min(512, count - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=[VECTOR_NAME],
+        )
+        vectors.extend(p.vector[VECTOR_NAME] for p in points)
+        if offset is None:
+            break
+    return normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Brute-force cosine top-k (vectors are unit length, so dot product == cosine)."""
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def reduce_dimension(vectors: np.ndarray, size: int) -> np.ndarray:
+    # text-embedding-3 vectors can be truncated and re-normalized (what `dimensions` does server-side)
+    return vectors if vectors.shape[1] == size else normalize(vectors[:, :size])
+
+
+def load_profile_collection(profile: SchemaProfile, corpus: np.ndarray) -> str:
+    collection_name = f"bench_profile_{profile.name}"
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=profile.vectors_config(),
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config(),
+        on_disk_payload=profile.on_disk_payload,
+    )
+    client.upload_collection(
+        collection_name=collection_name,
+        vectors={VECTOR_NAME: reduce_dimension(corpus, profile.vector_size)},
+        ids=list(range(len(corpus))),
+        batch_size=256,
+        parallel=2,
+    )
+    while client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+        time.sleep(2)
+    return collection_name
+
+
+def benchmark_profile(profile: SchemaProfile, corpus: np.ndarray, queries: np.ndarray,
+                      truth: np.ndarray, k: int, hnsw_ef: int) -> dict:
+    collection_name = load_profile_collection(profile, corpus)
+    queries = reduce_dimension(queries, profile.vector_size)
+    search_params = profile.search_params(hnsw_ef=hnsw_ef)
+
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        response = client.query_points(
+            collection_name=collection_name,
+            query=query.tolist(),
+            using=VECTOR_NAME,
+            limit=k,
+            search_params=search_params,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len({p.id for p in response.points} & set(expected.tolist())) / k)
+
+    return {
+        "profile": profile.name,
+        "collection": collection_name,
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "vector_ram_mb": round(len(corpus) * profile.vector_size * BYTES_PER_DIM[profile.quantization] / 2**20, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare schema profiles against exact search.")
+    parser.add_argument("--profiles", default=",".join(SCHEMA_PROFILES), help="Comma-separated profile names")
+    parser.add_argument("--points", type=int, default=50000, help="Corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Number of held-out query vectors")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--hnsw-ef", type=int, default=128, help="ef used at search time")
+    parser.add_argument("--source-collection", help="Sample vectors from this collection instead of synthetic ones")
+    parser.add_argument("--output", default="benchmark_profiles.json", help="Where to write the JSON results")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections")
+    args = parser.parse_args()
+
+    total = args.points + args.queries
+    if args.source_collection:
+        vectors = sample_collection_vectors(args.source_collection, total)
+    else:
+        vectors = synthetic_vectors(total, VECTOR_SIZE)
+    corpus, queries = vectors[:-args.queries], vectors[-args.queries:]
+    print(f"📊 Corpus: {len(corpus)} vectors, {len(queries)} queries, k={args.top_k}")
+
+    truth = exact_top_k(corpus, queries, args.top_k)
+    results = []
+    for name in args.profiles.split(","):
+        profile = get_profile(name.strip())
+        result = benchmark_profile(profile, corpus, queries, truth, args.top_k, args.hnsw_ef)
+        results.append(result)
+        print(f"✅ {result['profile']:>10}: recall@{args.top_k}={result['recall_at_k']:.4f} "
+              f"p50={result['p50_ms']}ms p99={result['p99_ms']}ms vector RAM≈{result['vector_ram_mb']}MB")
+        if not args.keep:
+            client.delete_collection(result["collection"])
+
+    with open(args.output, "w") as f:
+        json.dump({"points": len(corpus), "queries": len(queries), "top_k": args.top_k, "results": results}, f, indent=2)
+    print(f"💾 Results written to {args.output}")
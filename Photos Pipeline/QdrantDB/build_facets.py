@@ -0,0 +1,47 @@
+# build_facets.py
+# (Re)build the facet index (value counts of deviceType / appName / localFolderName /
+# persons and photos per month, see common/facets.py) by scanning the collection.
+#
+#   FACET_INDEX_PATH=/data/facets.sqlite python build_facets.py
+#
+# ingest_photos.py keeps the index current afterwards; re-run this after writing to the
+# collection any other way (e.g. the NiFi flow). The metadata service reloads it on its own.
+from qdrant_client import QdrantClient
+from pathlib import Path
+from urllib.parse import urlparse
+import argparse
+import os
+import sys
+import time
+
+from schema import COLLECTION_ALIAS
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.facets import FacetStore, iter_facet_payloads
+
+
+def build(client: QdrantClient, collection: str, path: str, batch_size: int = 1000) -> int:
+    store = FacetStore(path)
+    try:
+        store.rebuild(iter_facet_payloads(client, collection, batch_size))
+        return store.load().points
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the facet index by scanning the collection.")
+    parser.add_argument("--collection", default=COLLECTION_ALIAS, help="Collection or alias to scan")
+    parser.add_argument("--output", default=os.getenv("FACET_INDEX_PATH"), help="SQLite file (default: $FACET_INDEX_PATH)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Points per scroll request")
+    args = parser.parse_args()
+    if not args.output:
+        raise SystemExit("❌ No index file: set FACET_INDEX_PATH or pass --output.")
+
+    QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
+    parsed = urlparse(QDRANT_HOST)
+    client = QdrantClient(host=parsed.hostname or "localhost", port=parsed.port or 6333, timeout=120)
+
+    start = time.time()
+    points = build(client, args.collection, args.output, args.batch_size)
+    print(f"✅ Indexed facets of {points} points from '{args.collection}' into {args.output} ({time.time() - start:.1f}s)")
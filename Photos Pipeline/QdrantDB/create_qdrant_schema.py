@@ -1,9 +1,25 @@
 import requests
 import json
+import os
+import sys
 import time
+from pathlib import Path
 
-QDRANT_HOST = "http://localhost:6333"
-COLLECTION_NAME = "secure_photos"
+from schema import COLLECTION_ALIAS, FIELDS_TO_INDEX, SCHEMA_PROFILE, get_profile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.embedders import embedding_dimension
+from common.facets import FacetStore
+from common.result_cache import bump_collection_version
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
+COLLECTION_NAME = COLLECTION_ALIAS
+
+# Step 0: Refuse to touch a live alias; schema changes go through migrate_collection.py
+aliases_resp = requests.get(f"{QDRANT_HOST}/aliases")
+if aliases_resp.ok and any(a["alias_name"] == COLLECTION_NAME for a in aliases_resp.json()["result"]["aliases"]):
+    print(f"❌ '{COLLECTION_NAME}' is an alias. Use migrate_collection.py to change the schema without downtime.")
+    exit(1)
 
 # Step 1: Delete existing collection
 delete_url = f"{QDRANT_HOST}/collections/{COLLECTION_NAME}"
@@ -13,16 +29,22 @@ if del_resp.ok:
 else:
     print(f"⚠️ Could not delete collection (maybe doesn't exist): {del_resp.text}")
 
+# The collection is empty now; results cached by the search services are all stale
+if bump_collection_version(COLLECTION_NAME) is not None:
+    print(f"🔄 Invalidated cached search results for '{COLLECTION_NAME}'")
+if os.getenv("FACET_INDEX_PATH"):
+    facets = FacetStore(os.getenv("FACET_INDEX_PATH"))
+    facets.rebuild([])
+    facets.close()
+    print(f"🧮 Reset facet index {os.getenv('FACET_INDEX_PATH')}")
+
 # Step 2: Create new collection with named vector
+# SCHEMA_PROFILE picks vector storage: default, on_disk, int8, binary, int8_768 (see schema.py).
+# The vector size follows the embedding model (EMBEDDING_BACKEND=local, EMBEDDING_DIMENSIONS)
+profile = get_profile(SCHEMA_PROFILE, vector_size=embedding_dimension())
+print(f"📐 Using schema profile '{profile.name}' with {profile.vector_size}-dim vectors: {profile.description}")
 create_url = f"{QDRANT_HOST}/collections/{COLLECTION_NAME}"
-create_payload = {
-    "vectors": {
-        "summary_embedding": {
-            "size": 1536,
-            "distance": "Cosine"
-        }
-    }
-}
+create_payload = profile.rest_config()
 
 create_resp = requests.put(create_url, json=create_payload)
 if create_resp.ok:
@@ -32,28 +54,11 @@ else:
     print(f"❌ Failed to create collection: {create_resp.text}")
     exit(1)
 
-# Step 3: Index metadata fields for filtering and querying
-fields_to_index = {
-    "image_path": "keyword", # "text" is analyzed for full-text search, allowing for tokenization and stemming, while "keyword" is used for exact matches without analysis.
-    "summary": "text",
-    "title": "keyword",
-    "description": "text",
-    "imageViews": "keyword",
-    "timestamp": "integer",
-    "formatted_time": "text",
-    "url": "keyword",
-    "latitude": "float",
-    "longitude": "float",
-    "altitude": "float",
-    "appName": "keyword",
-    "deviceType": "keyword",
-    "localFolderName": "keyword",
-    "persons": "text"
-}
-
+# Step 3: Index metadata fields for filtering and querying (field types in schema.py;
+# update_qdrant_schema.py then switches TEXT_INDEX_FIELDS to word-tokenized text)
 index_url = f"{QDRANT_HOST}/collections/{COLLECTION_NAME}/index"
 
-for field, field_type in fields_to_index.items():
+for field, field_type in FIELDS_TO_INDEX.items():
     index_payload = {
         "field_name": field,
         "field_schema": field_type
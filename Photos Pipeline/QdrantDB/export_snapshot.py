@@ -0,0 +1,75 @@
+# export_snapshot.py
+# Export the photo collection into a memory-mapped snapshot for Qdrant-free search
+# (see common/vector_snapshot.py for the format; the rag service loads it with
+# VECTOR_SNAPSHOT_PATH).
+#
+#   python export_snapshot.py --output /data/secure_photos.snapshot                # float16 vectors
+#   python export_snapshot.py --output /data/secure_photos.snapshot --dtype int8   # half the size again
+#
+# The snapshot replaces any previous one at --output only once it is complete, so
+# services can keep serving the old files while a new export runs.
+from qdrant_client import QdrantClient
+from pathlib import Path
+from urllib.parse import urlparse
+import argparse
+import os
+import sys
+import time
+
+from schema import COLLECTION_ALIAS, VECTOR_NAME
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.vector_snapshot import SNAPSHOT_DTYPES, STRING_FIELDS, CATEGORY_FIELDS, LIST_FIELD, SnapshotWriter
+
+# --- Setup ---
+QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
+
+parsed = urlparse(QDRANT_HOST)
+client = QdrantClient(host=parsed.hostname or "localhost", port=parsed.port or 6333, timeout=120)
+
+EXPORTED_FIELDS = list(STRING_FIELDS + CATEGORY_FIELDS) + [LIST_FIELD, "timestamp", "location", "latitude", "longitude"]
+
+
+def export(collection: str, output: str, dtype: str, batch_size: int) -> int:
+    dim = client.get_collection(collection).config.params.vectors[VECTOR_NAME].size
+    # Upper bound for the vector file; points deleted during the export just leave unused rows
+    capacity = client.count(collection_name=collection, exact=True).count
+    writer = SnapshotWriter(output, capacity, dim, dtype=dtype, source=collection)
+
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=EXPORTED_FIELDS,
+            with_vectors=[VECTOR_NAME],
+        )
+        for point in points:
+            if writer.count >= capacity:
+                print("⚠️ Points were added during the export; re-run to include them")
+                break
+            writer.add(point.id, point.vector[VECTOR_NAME], point.payload or {})
+        if writer.count and writer.count % (batch_size * 20) < batch_size:
+            print(f"📦 Exported {writer.count}/{capacity} points...")
+        if offset is None or writer.count >= capacity:
+            break
+
+    writer.close()
+    return writer.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the collection into a memory-mapped search snapshot.")
+    parser.add_argument("--collection", default=COLLECTION_ALIAS, help="Collection or alias to export")
+    parser.add_argument("--output", required=True, help="Snapshot directory to create or replace")
+    parser.add_argument("--dtype", default="float16", choices=SNAPSHOT_DTYPES,
+                        help="Vector storage: float16 (2 bytes/dim) or int8 with per-row scale (1 byte/dim)")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Points per scroll request")
+    args = parser.parse_args()
+
+    start = time.time()
+    exported = export(args.collection, args.output, args.dtype, args.batch_size)
+    size_mb = sum(f.stat().st_size for f in Path(args.output).iterdir()) / 2**20
+    print(f"✅ Exported {exported} points from '{args.collection}' to {args.output} "
+          f"({size_mb:.0f} MB, {time.time() - start:.1f}s)")
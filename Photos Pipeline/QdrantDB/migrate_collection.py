@@ -0,0 +1,201 @@
+# migrate_collection.py
+# Zero-downtime schema migration: build a new versioned collection next to the live one,
+# copy the points in parallel batches, validate, then atomically repoint the alias.
+#
+#   python migrate_collection.py                       # secure_photos -> secure_photos_v<N+1>
+#   python migrate_collection.py --drop-old            # ... and delete the previous collection
+#   python migrate_collection.py --profile int8        # change vector storage (see schema.py profiles)
+#   python migrate_collection.py --rollback secure_photos_v2
+#
+# Searches keep hitting the old collection through the alias until the swap, which
+# is a single update_collection_aliases call.
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from qdrant_client import QdrantClient, models
+from pathlib import Path
+from urllib.parse import urlparse
+import argparse
+import os
+import re
+import sys
+import time
+
+from build_facets import build as build_facets
+from schema import COLLECTION_ALIAS, VECTOR_NAME, SCHEMA_PROFILE, SCHEMA_PROFILES, create_collection_with_schema, finish_bulk_load, get_profile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.embedders import embedding_dimension
+from common.result_cache import bump_collection_version
+
+# --- Setup ---
+QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
+
+parsed = urlparse(QDRANT_HOST)
+client = QdrantClient(host=parsed.hostname or "localhost", port=parsed.port or 6333, timeout=120)
+
+
+def alias_target(alias: str):
+    """Collection the alias points at, or None if the alias doesn't exist."""
+    for alias_description in client.get_aliases().aliases:
+        if alias_description.alias_name == alias:
+            return alias_description.collection_name
+    return None
+
+
+def next_version_name(alias: str) -> str:
+    versions = [
+        int(match.group(1))
+        for collection in client.get_collections().collections
+        if (match := re.fullmatch(rf"{re.escape(alias)}_v(\d+)", collection.name))
+    ]
+    return f"{alias}_v{max(versions, default=0) + 1}"
+
+
+def upgrade_payload(payload: dict) -> dict:
+    """Fill fields added to the schema since the point was ingested."""
+    if "location" not in payload and payload.get("latitude") is not None and payload.get("longitude") is not None:
+        payload = {**payload, "location": {"lat": payload["latitude"], "lon": payload["longitude"]}}
+    return payload
+
+
+def copy_points(source: str, target: str, batch_size: int, workers: int) -> int:
+    """Scroll `source` and upsert into `target`, keeping up to 2*workers batches in flight."""
+    copied = 0
+    offset = None
+    inflight = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            points, offset = client.scroll(
+                collection_name=source,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if points:
+                batch = [models.PointStruct(id=p.id, vector=p.vector, payload=upgrade_payload(p.payload or {})) for p in points]
+                inflight.add(pool.submit(client.upsert, collection_name=target, points=batch, wait=True))
+                copied += len(batch)
+
+            if len(inflight) >= workers * 2:
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                print(f"📦 Copied {copied} points...")
+
+            if offset is None:
+                break
+
+        for future in inflight:
+            future.result()
+    return copied
+
+
+def wait_until_green(collection_name: str, timeout_seconds: int):
+    deadline = time.time() + timeout_seconds
+    while time.time() < deadline:
+        status = client.get_collection(collection_name).status
+        if status == models.CollectionStatus.GREEN:
+            return
+        print(f"⏳ Waiting for '{collection_name}' to finish indexing (status: {status})")
+        time.sleep(5)
+    raise TimeoutError(f"'{collection_name}' did not finish indexing within {timeout_seconds}s")
+
+
+def swap_alias(alias: str, new_collection: str):
+    operations = []
+    if alias_target(alias) is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=new_collection, alias_name=alias)
+    ))
+    # Delete + create in one request is applied atomically by Qdrant
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"🔀 Alias '{alias}' now points to '{new_collection}'")
+    # Searches through the alias now see different points (or payload shapes)
+    if bump_collection_version(alias) is not None:
+        print(f"🔄 Invalidated cached search results for '{alias}'")
+    if os.getenv("FACET_INDEX_PATH"):
+        points = build_facets(client, alias, os.getenv("FACET_INDEX_PATH"))
+        print(f"🧮 Rebuilt facet index from {points} points of '{new_collection}'")
+
+
+def migrate(args):
+    alias = args.alias
+    existing = {c.name for c in client.get_collections().collections}
+    source = alias_target(alias)
+    legacy = source is None and alias in existing
+    if legacy:
+        # First migration: `secure_photos` is still a plain collection, not an alias
+        source = alias
+    if source is None:
+        raise SystemExit(f"❌ Neither an alias nor a collection named '{alias}' exists.")
+    if legacy and not args.drop_legacy:
+        raise SystemExit(
+            f"❌ '{alias}' is a plain collection, so the alias can only be created after deleting it. "
+            f"Re-run with --drop-legacy to copy it, delete '{alias}' and create the alias "
+            f"(searches fail for the moment between those two calls; later migrations are atomic)."
+        )
+
+    profile = get_profile(args.profile, args.hnsw_m, args.ef_construct, vector_size=embedding_dimension())
+    source_size = client.get_collection(source).config.params.vectors[VECTOR_NAME].size
+    if source_size != profile.vector_size:
+        # Copying can't change the dimension; re-ingest with EMBEDDING_DIMENSIONS set instead
+        raise SystemExit(
+            f"❌ Profile '{profile.name}' expects {profile.vector_size}-dim vectors but '{source}' has {source_size}. "
+            f"Create the collection with create_qdrant_schema.py and re-ingest with the new embedding settings "
+            f"(EMBEDDING_BACKEND / LOCAL_EMBEDDING_MODEL / EMBEDDING_DIMENSIONS)."
+        )
+
+    target = args.target or next_version_name(alias)
+    print(f"🛠️ Migrating '{source}' -> '{target}' (alias '{alias}', profile '{profile.name}')")
+    create_collection_with_schema(client, target, bulk_load=True, profile=profile)
+
+    copied = copy_points(source, target, args.batch_size, args.workers)
+    finish_bulk_load(client, target)
+
+    source_count = client.count(collection_name=source, exact=True).count
+    target_count = client.count(collection_name=target, exact=True).count
+    print(f"🔎 Validation: source={source_count} target={target_count} copied={copied}")
+    if abs(source_count - target_count) > args.tolerance:
+        raise SystemExit(f"❌ Point counts differ by more than {args.tolerance}; alias left on '{source}'.")
+
+    if not args.no_wait:
+        wait_until_green(target, args.index_timeout)
+
+    if legacy:
+        client.delete_collection(collection_name=alias)
+        print(f"🗑️ Deleted legacy collection '{alias}'")
+
+    swap_alias(alias, target)
+
+    if args.drop_old and not legacy:
+        client.delete_collection(collection_name=source)
+        print(f"🗑️ Deleted previous collection '{source}'")
+    elif not legacy:
+        print(f"↩️ Previous collection '{source}' kept; roll back with --rollback {source}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the photo collection behind an alias without downtime.")
+    parser.add_argument("--alias", default=COLLECTION_ALIAS, help="Alias the services query")
+    parser.add_argument("--target", help="Name of the new collection (default: next <alias>_vN)")
+    parser.add_argument("--profile", default=SCHEMA_PROFILE, choices=list(SCHEMA_PROFILES),
+                        help="Vector storage profile for the new collection")
+    parser.add_argument("--hnsw-m", type=int, help="Override the profile's HNSW m")
+    parser.add_argument("--ef-construct", type=int, help="Override the profile's HNSW ef_construct")
+    parser.add_argument("--batch-size", type=int, default=256, help="Points per scroll/upsert batch")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel upsert workers")
+    parser.add_argument("--tolerance", type=int, default=0,
+                        help="Allowed count difference (points ingested into the old collection during the copy)")
+    parser.add_argument("--no-wait", action="store_true", help="Swap without waiting for HNSW indexing to finish")
+    parser.add_argument("--index-timeout", type=int, default=3600, help="Seconds to wait for indexing")
+    parser.add_argument("--drop-old", action="store_true", help="Delete the previous collection after the swap")
+    parser.add_argument("--drop-legacy", action="store_true",
+                        help="Allow deleting a plain (non-alias) collection with the alias name on first migration")
+    parser.add_argument("--rollback", metavar="COLLECTION", help="Only repoint the alias at an existing collection")
+    args = parser.parse_args()
+
+    if args.rollback:
+        swap_alias(args.alias, args.rollback)
+    else:
+        migrate(args)
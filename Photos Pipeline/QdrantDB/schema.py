@@ -0,0 +1,181 @@
+# schema.py
+# Single definition of the `secure_photos` collection layout, shared by the schema tools.
+from dataclasses import dataclass
+from typing import Optional
+from qdrant_client import QdrantClient, models
+import os
+
+# Name the search services and ingestion use. After the first migration this is an
+# alias pointing at a versioned collection (secure_photos_v1, secure_photos_v2, ...).
+COLLECTION_ALIAS = os.getenv("COLLECTION_NAME", "secure_photos")
+
+VECTOR_NAME = "summary_embedding"
+VECTOR_SIZE = 1536
+
+# Field types create_qdrant_schema.py indexes ...
+FIELDS_TO_INDEX = {
+    "image_path": "keyword",
+    "summary": "text",
+    "title": "keyword",
+    "description": "text",
+    "imageViews": "keyword",
+    "timestamp": "integer",
+    "formatted_time": "text",
+    "url": "keyword",
+    "latitude": "float",
+    "longitude": "float",
+    "altitude": "float",
+    "location": "geo",
+    "appName": "keyword",
+    "deviceType": "keyword",
+    "localFolderName": "keyword",
+    "persons": "text",
+}
+
+# ... with the word-tokenized text indexes applied by update_qdrant_schema.py
+TEXT_INDEX_FIELDS = ["title", "deviceType", "appName", "localFolderName", "image_path"]
+
+
+def index_schema() -> dict:
+    schema = dict(FIELDS_TO_INDEX)
+    for field in TEXT_INDEX_FIELDS:
+        schema[field] = "text"
+    return schema
+
+
+def field_schema(field_type: str):
+    if field_type == "text":
+        return models.TextIndexParams(
+            type="text",
+            tokenizer=models.TokenizerType.WORD,
+            min_token_len=2,
+            lowercase=True
+        )
+    return models.PayloadSchemaType(field_type)
+
+
+@dataclass
+class SchemaProfile:
+    """Storage / index trade-offs for the `summary_embedding` vectors."""
+    name: str
+    description: str
+    vector_size: int = VECTOR_SIZE
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    quantization: Optional[str] = None  # None, "int8" or "binary"
+    oversampling: float = 1.0  # candidates fetched with quantized vectors, then rescored with originals
+
+    def vectors_config(self) -> dict:
+        return {
+            VECTOR_NAME: models.VectorParams(
+                size=self.vector_size,
+                distance=models.Distance.COSINE,
+                on_disk=self.on_disk_vectors,
+            )
+        }
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self):
+        # Quantized vectors stay in RAM; the float32 originals can then live on disk for rescoring
+        if self.quantization == "int8":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            ))
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self, hnsw_ef: Optional[int] = None, exact: bool = False) -> models.SearchParams:
+        quantization = None
+        if self.quantization:
+            quantization = models.QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
+        return models.SearchParams(hnsw_ef=hnsw_ef, exact=exact, quantization=quantization)
+
+    def rest_config(self) -> dict:
+        """Collection body for the REST API (used by create_qdrant_schema.py)."""
+        body = {
+            "vectors": {
+                VECTOR_NAME: {"size": self.vector_size, "distance": "Cosine", "on_disk": self.on_disk_vectors}
+            },
+            "hnsw_config": {"m": self.hnsw_m, "ef_construct": self.hnsw_ef_construct},
+            "on_disk_payload": self.on_disk_payload,
+        }
+        if self.quantization == "int8":
+            body["quantization_config"] = {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}}
+        elif self.quantization == "binary":
+            body["quantization_config"] = {"binary": {"always_ram": True}}
+        return body
+
+
+# Approximate vector RAM per 1M points at 1536 dims: default ~6.1 GB, int8 ~1.5 GB, binary ~0.2 GB
+SCHEMA_PROFILES = {
+    "default": SchemaProfile("default", "float32 vectors in RAM, default HNSW (current behaviour)"),
+    "on_disk": SchemaProfile(
+        "on_disk", "float32 vectors and payload on disk (memory-mapped), no quantization",
+        on_disk_vectors=True, on_disk_payload=True,
+    ),
+    "int8": SchemaProfile(
+        "int8", "int8 scalar quantization in RAM, originals on disk for rescoring",
+        on_disk_vectors=True, on_disk_payload=True, quantization="int8", oversampling=2.0,
+    ),
+    "binary": SchemaProfile(
+        "binary", "binary quantization in RAM, originals on disk for rescoring",
+        on_disk_vectors=True, on_disk_payload=True, quantization="binary", oversampling=3.0,
+        hnsw_m=32, hnsw_ef_construct=256,
+    ),
+    "int8_768": SchemaProfile(
+        "int8_768", "int8 quantization of 768-dim embeddings (text-embedding-3 `dimensions`)",
+        vector_size=768, on_disk_vectors=True, on_disk_payload=True, quantization="int8", oversampling=2.0,
+    ),
+}
+SCHEMA_PROFILE = os.getenv("SCHEMA_PROFILE", "default")
+
+
+def get_profile(name: str, hnsw_m: Optional[int] = None, hnsw_ef_construct: Optional[int] = None,
+                vector_size: Optional[int] = None) -> SchemaProfile:
+    if name not in SCHEMA_PROFILES:
+        raise ValueError(f"Unknown schema profile '{name}'. Available: {', '.join(SCHEMA_PROFILES)}")
+    base = SCHEMA_PROFILES[name]
+    return SchemaProfile(**{
+        **base.__dict__,
+        "hnsw_m": hnsw_m or base.hnsw_m,
+        "hnsw_ef_construct": hnsw_ef_construct or base.hnsw_ef_construct,
+        "vector_size": vector_size or base.vector_size,
+    })
+
+
+def create_collection_with_schema(client: QdrantClient, collection_name: str, bulk_load: bool = False,
+                                  profile: Optional[SchemaProfile] = None):
+    """
+    Create `collection_name` with the named vector and every payload index.
+    With bulk_load, HNSW indexing is deferred (indexing_threshold=0) until
+    `finish_bulk_load` is called, which makes large copies much faster.
+    """
+    profile = profile or SCHEMA_PROFILES["default"]
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=profile.vectors_config(),
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config(),
+        on_disk_payload=profile.on_disk_payload,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0) if bulk_load else None,
+    )
+    for field, field_type in index_schema().items():
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=field_schema(field_type),
+            wait=True
+        )
+        print(f"✅ Indexed field '{field}' as '{field_type}' on '{collection_name}'")
+
+
+def finish_bulk_load(client: QdrantClient, collection_name: str, indexing_threshold: int = 20000):
+    client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=indexing_threshold),
+    )
@@ -1,7 +1,14 @@
 # update_indexes_qdrant.py
-from qdrant_client import QdrantClient, models
+from qdrant_client import QdrantClient
+from pathlib import Path
 from urllib.parse import urlparse
 import os
+import sys
+
+from schema import TEXT_INDEX_FIELDS, field_schema
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.result_cache import bump_collection_version
 
 # --- Setup ---
 QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
@@ -10,14 +17,8 @@ COLLECTION_NAME = os.getenv("COLLECTION_NAME", "secure_photos")
 parsed = urlparse(QDRANT_HOST)
 client = QdrantClient(host=parsed.hostname or "localhost", port=parsed.port or 6333)
 
-# --- Fields to update ---
-fields_to_update = [
-    "title",
-    "deviceType",
-    "appName",
-    "localFolderName",
-    "image_path",
-]
+# --- Fields to update (shared with create_qdrant_schema.py via schema.py) ---
+fields_to_update = list(TEXT_INDEX_FIELDS)
 
 def recreate_index(field_name: str):
     try:
@@ -31,12 +32,7 @@ def recreate_index(field_name: str):
         client.create_payload_index(
             collection_name=COLLECTION_NAME,
             field_name=field_name,
-            field_schema=models.TextIndexParams(
-                type="text",
-                tokenizer=models.TokenizerType.WORD,
-                min_token_len=2,
-                lowercase=True
-            ),
+            field_schema=field_schema("text"),
             wait=True
         )
         print(f"✅ Updated index for: {field_name}")
@@ -46,3 +42,6 @@ def recreate_index(field_name: str):
 if __name__ == "__main__":
     for field in fields_to_update:
         recreate_index(field)
+    # Keyword -> text indexes change what the metadata filters match
+    if bump_collection_version(COLLECTION_NAME) is not None:
+        print(f"🔄 Invalidated cached search results for '{COLLECTION_NAME}'")
@@ -0,0 +1,149 @@
+"""
+Concurrency benchmark for the /query endpoint.
+
+Runs the service fully offline with the stand-ins from benchmarks/fakes.py
+(shared with benchmarks/run_benchmarks.py): FakeAzureServer answers the Azure
+embeddings call (with a configurable artificial latency) and Qdrant runs
+in-process in ":memory:" mode, seeded with synthetic photo points.
+
+Two variants of the endpoint are driven with the same concurrent load:
+  * before - the original handler: `async def` calling the synchronous
+             AzureOpenAI / QdrantClient, which blocks the event loop
+  * after  - the current main.app using AsyncAzureOpenAI / AsyncQdrantClient
+
+Usage:
+    python benchmark_concurrency.py --requests 200 --concurrency 32 --latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "benchmarks"))
+import fakes
+
+
+# --- Variants under test ---
+def build_blocking_app(photos):
+    """Reproduces the original handler: sync clients inside `async def`."""
+    from fastapi import FastAPI
+    from openai import AzureOpenAI
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import NamedVector
+    from main import QueryInput, COLLECTION_NAME
+
+    azure_openai_client = AzureOpenAI(
+        api_key=os.environ["AZURE_OPENAI_API_KEY"],
+        api_version="2024-12-01-preview",
+        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+    )
+    qdrant_client_lib = QdrantClient(location=":memory:")
+    fakes.seed_sync(qdrant_client_lib, COLLECTION_NAME, photos)
+
+    blocking_app = FastAPI()
+
+    @blocking_app.post("/query")
+    async def process_query(input: QueryInput):
+        embedding_response = azure_openai_client.embeddings.create(
+            input=input.query.strip(), model=fakes.EMBEDDING_DEPLOYMENT,
+        )
+        query_embedding = [float(x) for x in embedding_response.data[0].embedding]
+        search_result = qdrant_client_lib.search(
+            collection_name=COLLECTION_NAME,
+            query_vector=NamedVector(name="summary_embedding", vector=query_embedding),
+            limit=5,
+            with_payload=True,
+        )
+        return {"image_results": [
+            {"image_url": p.payload["url"], "summary": p.payload["summary"]} for p in search_result
+        ]}
+
+    return blocking_app
+
+
+async def seed_async_app(app, photos):
+    from main import COLLECTION_NAME
+
+    await fakes.seed_async(app.state.qdrant_client, COLLECTION_NAME, photos)
+
+
+# --- Load driver ---
+async def drive_load(app, total_requests: int, concurrency: int) -> dict:
+    import httpx
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def one_request(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                # Unique per request: the current app would otherwise answer repeats from its
+                # embedding cache and the comparison would measure caching, not the clients
+                response = await client.post("/query", json={"query": f"white lion {i}"})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+        "qps": round(total_requests / elapsed, 2),
+    }
+
+
+async def run(args) -> dict:
+    server = fakes.FakeAzureServer(embedding_latency_ms=args.latency_ms).start()
+    os.environ.update({
+        "AZURE_OPENAI_API_KEY": "stub-key",
+        "AZURE_OPENAI_ENDPOINT": server.endpoint,
+        "EMBEDDING_BACKEND": "azure",
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME": fakes.EMBEDDING_DEPLOYMENT,
+        "QDRANT_HOST": ":memory:",
+        # Empty rather than unset so a .env file can't turn them back on: nothing
+        # persisted from earlier runs, no shared result cache, no snapshot
+        "EMBEDDING_CACHE_PATH": "",
+        "RESULT_CACHE_PATH": "",
+        "VECTOR_SNAPSHOT_PATH": "",
+    })
+
+    import main
+
+    photos = fakes.synthetic_photos(args.points)
+    results = {}
+    try:
+        results["before"] = await drive_load(build_blocking_app(photos), args.requests, args.concurrency)
+
+        async with main.app.router.lifespan_context(main.app):
+            await seed_async_app(main.app, photos)
+            results["after"] = await drive_load(main.app, args.requests, args.concurrency)
+    finally:
+        server.stop()
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /query under concurrent load.")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests per variant")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent in-flight requests")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Artificial stub embedding latency")
+    parser.add_argument("--points", type=int, default=1000, help="Synthetic points seeded into Qdrant")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for variant, stats in results.items():
+        print(f"{variant:>6}: p50={stats['p50_ms']}ms  p99={stats['p99_ms']}ms  qps={stats['qps']}")
+    print(json.dumps(results, indent=2))
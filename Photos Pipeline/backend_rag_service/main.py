@@ -1,14 +1,30 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from pathlib import Path
+from typing import List, Optional, Tuple
+import asyncio
 import os
-import numpy as np # Only used for np.isfinite in debug, can remove if debug is gone
+import sys
+import httpx
 
 # Qdrant Client imports
-from qdrant_client import QdrantClient
-from qdrant_client.models import SearchParams
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import NamedVector, SearchRequest
 
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
+
+# Shared helpers live in Photos Pipeline/common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.embedders import Embedder, create_embedder, embedding_backend, embedding_model_key
+from common.embedding_cache import EmbeddingCache
+from common.instrumentation import count, instrument_app, register_cache_stats, span
+from common.normalize import normalize_query
+from common.result_cache import ResultCache, result_cache_key
+from common.search_params import search_params_from_env
+from common.upstream import Upstream, UpstreamError, upstream_error_response
+from common.vector_snapshot import VectorSnapshot
 
 load_dotenv()
 
@@ -17,68 +33,309 @@ QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
-COLLECTION_NAME = "secure_photos"
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
+# Alias maintained by QdrantDB/migrate_collection.py, so schema migrations never interrupt search
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "secure_photos")
+
+# "azure" (the deployment above, EMBEDDING_DIMENSIONS for reduced-dimension profiles)
+# or "local" (an in-process CPU model, see common/embedders.py)
+EMBEDDING_BACKEND = embedding_backend()
+# Cache key for embeddings: different models or dimensions must never share cached vectors
+EMBEDDING_MODEL_KEY = embedding_model_key()
+
+# Search tuning for quantized collections (QDRANT_SEARCH_OVERSAMPLING / QDRANT_HNSW_EF,
+# see common/search_params.py); /hybrid-query in the metadata service uses the same
+SEARCH_PARAMS = search_params_from_env()
+
+# Search a memory-mapped snapshot (QdrantDB/export_snapshot.py) instead of the Qdrant server
+VECTOR_SNAPSHOT_PATH = os.getenv("VECTOR_SNAPSHOT_PATH")
+RESULT_PAYLOAD_FIELDS = ["url", "summary"]
+
+# Connection pool sizing shared by the Azure and Qdrant HTTP clients
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 30))
 
-# Validate essential environment variables
-if not all([QDRANT_HOST, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME]):
+# /query/batch limits (Azure accepts at most 2048 inputs per embeddings request)
+MAX_BATCH_SIZE = min(int(os.getenv("MAX_BATCH_SIZE", 256)), 2048)
+MAX_RESULTS_PER_QUERY = int(os.getenv("MAX_RESULTS_PER_QUERY", 50))
+
+# Ranked results shared by all workers through this SQLite file, invalidated when
+# ingestion or the schema tools bump the collection version (see common/result_cache.py)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH")
+
+# Quota of the embedding deployment available to this worker (0 = unlimited)
+AZURE_EMBEDDING_RPM = float(os.getenv("AZURE_EMBEDDING_RPM", 0))
+AZURE_EMBEDDING_TPM = float(os.getenv("AZURE_EMBEDDING_TPM", 0))
+
+# Validate essential environment variables (Azure is only needed for Azure embeddings)
+if EMBEDDING_BACKEND == "azure" and not all([QDRANT_HOST, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME]):
     raise ValueError("Missing one or more required environment variables (QDRANT_HOST, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME).")
 
-# --- FastAPI App Initialization ---
-app = FastAPI(title="Image Search Backend (Qdrant)", description="Search image metadata via semantic similarity using Qdrant.")
 
-# --- Azure OpenAI Embedding Client Initialization ---
-azure_openai_client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    api_version="2024-12-01-preview", # Check if this API version is still current
-    azure_endpoint=AZURE_OPENAI_ENDPOINT
-)
+def create_qdrant_client() -> AsyncQdrantClient:
+    # QDRANT_HOST=":memory:" runs an in-process Qdrant (used by the benchmarks)
+    if QDRANT_HOST == ":memory:":
+        return AsyncQdrantClient(location=":memory:")
+    return AsyncQdrantClient(
+        url=QDRANT_HOST,
+        timeout=int(HTTP_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+    )
+
+
+def create_azure_openai_client() -> AsyncAzureOpenAI:
+    return AsyncAzureOpenAI(
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        max_retries=0,  # the Upstream layer retries, within the request deadline
+        http_client=httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        ),
+    )
 
-# --- Qdrant Client Initialization ---
-# Initializing Qdrant Client globally for reuse across requests.
-# For production async FastAPI, consider using `qdrant_client.AsyncQdrantClient`
-# and managing its lifecycle (e.g., in app startup/shutdown events).
-qdrant_client_lib = QdrantClient(host="localhost", port=6333)
+
+# --- Client lifecycle ---
+# Both clients hold pooled keep-alive connections, so they are created once when
+# the worker starts and closed when it shuts down instead of per request.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.azure_openai_client = create_azure_openai_client() if EMBEDDING_BACKEND == "azure" else None
+    # Rate limits, retries and coalescing of identical in-flight embedding requests
+    app.state.embedding_upstream = Upstream("azure_embedding", rpm=AZURE_EMBEDDING_RPM, tpm=AZURE_EMBEDDING_TPM)
+    # A local model is loaded once here and shared by all requests of this worker
+    app.state.embedder = create_embedder(app.state.azure_openai_client, app.state.embedding_upstream)
+    app.state.vector_snapshot = None
+    app.state.qdrant_client = None
+    if VECTOR_SNAPSHOT_PATH:
+        # Only the manifest is read here; vectors and payloads are paged in from the mmap on demand
+        app.state.vector_snapshot = VectorSnapshot(VECTOR_SNAPSHOT_PATH)
+        expected_dim = app.state.embedder.dimension or app.state.vector_snapshot.dim
+        if app.state.vector_snapshot.dim != expected_dim:
+            raise ValueError(f"Snapshot has {app.state.vector_snapshot.dim}-dim vectors, {EMBEDDING_MODEL_KEY} produces {expected_dim}.")
+        print(f"📂 Serving {len(app.state.vector_snapshot)} points from snapshot {VECTOR_SNAPSHOT_PATH}")
+    else:
+        app.state.qdrant_client = create_qdrant_client()
+    # Query-embedding cache, also used by the metadata service's /hybrid-query
+    # (EMBEDDING_CACHE_PATH persists it and shares it between workers and services)
+    app.state.embedding_cache = EmbeddingCache.from_env()
+    register_cache_stats("embedding", app.state.embedding_cache.stats)
+    app.state.result_cache = ResultCache(RESULT_CACHE_PATH) if RESULT_CACHE_PATH else None
+    # A snapshot never changes under a running worker, but a re-export must not reuse its results
+    app.state.result_namespace = (
+        f"snapshot:{VECTOR_SNAPSHOT_PATH}@{app.state.vector_snapshot.created_at}"
+        if app.state.vector_snapshot is not None else COLLECTION_NAME
+    )
+    if app.state.result_cache is not None:
+        register_cache_stats("result", app.state.result_cache.stats)
+    try:
+        yield
+    finally:
+        await app.state.embedder.close()
+        if app.state.azure_openai_client is not None:
+            await app.state.azure_openai_client.close()
+        if app.state.qdrant_client is not None:
+            await app.state.qdrant_client.close()
+        app.state.embedding_cache.close()
+        if app.state.result_cache is not None:
+            app.state.result_cache.close()
+
+
+# --- FastAPI App Initialization ---
+app = FastAPI(
+    title="Image Search Backend (Qdrant)",
+    description="Search image metadata via semantic similarity using Qdrant.",
+    lifespan=lifespan,
+)
+instrument_app(app, "rag")
+app.add_exception_handler(UpstreamError, upstream_error_response)
 
 # --- Pydantic Models ---
 class QueryInput(BaseModel):
     query: str
 
+class BatchQueryInput(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    limit: int = Field(5, ge=1, le=MAX_RESULTS_PER_QUERY)
+
+class BatchQueryResult(BaseModel):
+    query: str
+    image_results: List[dict] = []
+    error: Optional[str] = None
+
+# --- Helpers ---
+async def get_query_embedding(app: FastAPI, query: str) -> list:
+    """Return the query embedding, calling the embedder only on a cache miss."""
+    embedding_cache: EmbeddingCache = app.state.embedding_cache
+    vector = embedding_cache.get(query, EMBEDDING_MODEL_KEY)
+    if vector is None:
+        embedder: Embedder = app.state.embedder
+        with span(f"{EMBEDDING_BACKEND}_embedding"):
+            embedding = await embedder.embed_one(normalize_query(query))
+        vector = embedding_cache.put(query, EMBEDDING_MODEL_KEY, embedding)
+    return vector.tolist()
+
+
+async def get_query_embeddings(app: FastAPI, queries: List[str]) -> list:
+    """
+    Embed many queries with a single embedder call (one Azure request) for all cache misses.
+    Returns one vector (or the Exception that prevented it) per input, in order.
+    """
+    embedding_cache: EmbeddingCache = app.state.embedding_cache
+    embeddings = [None] * len(queries)
+    misses = {}  # normalized text -> positions that need it
+    for position, query in enumerate(queries):
+        vector = embedding_cache.get(query, EMBEDDING_MODEL_KEY)
+        if vector is not None:
+            embeddings[position] = vector.tolist()
+        else:
+            misses.setdefault(normalize_query(query), []).append(position)
+
+    if not misses:
+        return embeddings
+
+    texts = list(misses)
+    try:
+        with span(f"{EMBEDDING_BACKEND}_embedding_batch"):
+            embedded = await app.state.embedder.embed(texts)
+        vectors = [embedding_cache.put(text, EMBEDDING_MODEL_KEY, embedding).tolist()
+                   for text, embedding in zip(texts, embedded)]
+    except UpstreamError:
+        # Throttled or out of time: splitting the batch would only multiply the load
+        raise
+    except Exception:
+        # One bad input (e.g. over the token limit) fails the whole request;
+        # retry one by one so only that query reports an error
+        count("embedding_batch_fallback")
+        vectors = await asyncio.gather(*(get_query_embedding(app, text) for text in texts), return_exceptions=True)
+
+    for text, vector in zip(texts, vectors):
+        for position in misses[text]:
+            embeddings[position] = vector
+    return embeddings
+
+
+async def search_one(app: FastAPI, vector: list, limit: int) -> list:
+    snapshot: Optional[VectorSnapshot] = app.state.vector_snapshot
+    if snapshot is not None:
+        # NumPy releases the GIL in the matrix product, so other requests keep running
+        return await asyncio.to_thread(snapshot.search, vector, limit, None, RESULT_PAYLOAD_FIELDS)
+    return await app.state.qdrant_client.search(
+        collection_name=COLLECTION_NAME,
+        query_vector=NamedVector(name="summary_embedding", vector=vector),
+        limit=limit,
+        search_params=SEARCH_PARAMS,
+        with_payload=True,
+    )
+
+
+async def search_many(app: FastAPI, vectors: List[list], limit: int) -> list:
+    """Run all searches in one Qdrant search_batch call, falling back to per-query searches on failure."""
+    snapshot: Optional[VectorSnapshot] = app.state.vector_snapshot
+    if snapshot is not None:
+        with span("snapshot_search_batch"):
+            return await asyncio.to_thread(snapshot.search_batch, vectors, limit, None, RESULT_PAYLOAD_FIELDS)
+
+    qdrant_client: AsyncQdrantClient = app.state.qdrant_client
+    requests = [
+        SearchRequest(
+            vector=NamedVector(name="summary_embedding", vector=vector),
+            limit=limit,
+            params=SEARCH_PARAMS,
+            with_payload=True,
+        )
+        for vector in vectors
+    ]
+    try:
+        with span("qdrant_search_batch"):
+            return await qdrant_client.search_batch(collection_name=COLLECTION_NAME, requests=requests)
+    except Exception:
+        count("search_batch_fallback")
+        return await asyncio.gather(
+            *(qdrant_client.search(
+                collection_name=COLLECTION_NAME,
+                query_vector=search_request.vector,
+                limit=limit,
+                search_params=SEARCH_PARAMS,
+                with_payload=True,
+            ) for search_request in requests),
+            return_exceptions=True,
+        )
+
+
+def result_key(query: str, limit: int) -> str:
+    # Different embedding deployments/dimensions rank differently
+    return result_cache_key("query", query, limit=limit, model=EMBEDDING_MODEL_KEY)
+
+
+def cached_results(app: FastAPI, keys: List[str]) -> Tuple[Optional[int], List[Optional[list]]]:
+    """(collection version, cached image results or None per key); (None, all None) without a result cache."""
+    result_cache: Optional[ResultCache] = app.state.result_cache
+    if result_cache is None:
+        return None, [None] * len(keys)
+    with span("result_cache"):
+        version = result_cache.version(app.state.result_namespace)
+        results = [result_cache.get(app.state.result_namespace, key, version) for key in keys]
+    hits = sum(result is not None for result in results)
+    if hits:
+        count("result_cache_hit", hits)
+    return version, results
+
+
+def store_results(app: FastAPI, version: Optional[int], key: str, image_results: List[dict]):
+    if version is not None:
+        app.state.result_cache.put(app.state.result_namespace, key, version, image_results)
+
+
+def to_image_results(points) -> List[dict]:
+    image_results = []
+    for point in points:
+        payload = point.payload
+        if payload:
+            summary = payload.get("summary")
+            image_url = payload.get("url")
+            if summary and image_url:
+                image_results.append({"image_url": image_url, "summary": summary})
+    return image_results
+
+
 # --- API Endpoints ---
 @app.post("/query")
-async def process_query(input: QueryInput):
+async def process_query(input: QueryInput, request: Request):
     user_query = input.query.strip()
     if not user_query:
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
 
+    # Same answer as last time unless the collection changed since
+    key = result_key(user_query, 5)
+    version, (image_results,) = cached_results(request.app, [key])
+    if image_results is not None:
+        return {
+            "query": user_query,
+            "image_results": image_results,
+            "message": "Top-k matched images retrieved successfully."
+        }
+
     try:
-        # 1. Get embedding for the user query
-        embedding_response = azure_openai_client.embeddings.create(
-            input=user_query,
-            model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME,
-        )
-        # Convert embedding to a list of native Python floats
-        query_embedding = [float(x) for x in embedding_response.data[0].embedding]
-
-        # 2. Perform semantic search in Qdrant
-        search_result = qdrant_client_lib.search(
-            collection_name=COLLECTION_NAME,
-            # Use dictionary format for named vector search as found to be working with 1.14.3
-            query_vector={"name": "summary_embedding", "vector": query_embedding},
-            limit=5, # Retrieve top 5 results
-            with_payload=True, # Include payload in results
-        )
+        # 1. Get embedding for the user query (served from the cache when possible)
+        with span("embedding"):
+            query_embedding = await get_query_embedding(request.app, user_query)
+
+        # 2. Perform semantic search in Qdrant (or the local snapshot)
+        with span("qdrant_search"):
+            search_result = await search_one(request.app, query_embedding, limit=5) # Retrieve top 5 results
 
         # 3. Process search results
-        image_results = []
-        for point in search_result: # Iterate directly over the list of points returned by search_result
-            # Points are Pydantic models; use .payload to access attributes
-            payload = point.payload
-            # Ensure payload and its attributes exist before accessing
-            if payload:
-                summary = payload.get("summary")
-                image_url = payload.get("url")
-                if summary and image_url:
-                    image_results.append({"image_url": image_url, "summary": summary})
+        image_results = to_image_results(search_result)
+        store_results(request.app, version, key, image_results)
 
         return {
             "query": user_query,
@@ -86,8 +343,81 @@ async def process_query(input: QueryInput):
             "message": "Top-k matched images retrieved successfully."
         }
 
+    except UpstreamError:
+        raise
     except Exception as e:
         # Log the full traceback for debugging purposes
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.post("/query/batch")
+async def process_query_batch(input: BatchQueryInput, request: Request):
+    """
+    Answer many queries with one embeddings request and one Qdrant search_batch.
+    Results are returned in input order; a failing query carries an `error`
+    instead of failing the whole batch.
+    """
+    if len(input.queries) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(input.queries)} queries (max {MAX_BATCH_SIZE}).")
+
+    results = [BatchQueryResult(query=query.strip()) for query in input.queries]
+    valid = [i for i, result in enumerate(results) if result.query]
+    for i, result in enumerate(results):
+        if not result.query:
+            result.error = "Query cannot be empty."
+
+    keys = {i: result_key(results[i].query, input.limit) for i in valid}
+    version, cached = cached_results(request.app, [keys[i] for i in valid])
+    misses = []
+    for i, image_results in zip(valid, cached):
+        if image_results is None:
+            misses.append(i)
+        else:
+            results[i].image_results = image_results
+    valid = misses
+
+    try:
+        with span("embedding"):
+            embeddings = await get_query_embeddings(request.app, [results[i].query for i in valid])
+
+        searchable = []
+        for i, embedding in zip(valid, embeddings):
+            if isinstance(embedding, Exception):
+                results[i].error = f"Embedding failed: {str(embedding)}"
+            else:
+                searchable.append((i, embedding))
+
+        if searchable:
+            search_results = await search_many(
+                request.app, [embedding for _, embedding in searchable], input.limit
+            )
+            for (i, _), points in zip(searchable, search_results):
+                if isinstance(points, Exception):
+                    results[i].error = f"Search failed: {str(points)}"
+                else:
+                    results[i].image_results = to_image_results(points)
+                    store_results(request.app, version, keys[i], results[i].image_results)
+
+    except UpstreamError:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    failed = sum(1 for result in results if result.error)
+    return {
+        "results": results,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+    }
+
+
+@app.get("/cache/stats")
+async def cache_stats(request: Request):
+    stats = {"embedding_cache": request.app.state.embedding_cache.stats()}
+    if request.app.state.result_cache is not None:
+        stats["result_cache"] = request.app.state.result_cache.stats()
+    return stats
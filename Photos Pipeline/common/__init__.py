@@ -0,0 +1 @@
+"""Helpers shared by the services under Photos Pipeline/ (imported via the parent directory)."""
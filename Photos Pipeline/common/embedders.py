@@ -0,0 +1,255 @@
+"""
+Embedding backends for queries and photo summaries, picked with EMBEDDING_BACKEND.
+
+    embedder = create_embedder(azure_client, upstream)   # azure_client/upstream unused by "local"
+    vector = await embedder.embed_one("dog on the beach")
+    vectors = await embedder.embed(summaries)             # one vector per text, in order
+    embedder.name                                         # cache key: never mix vectors of two models
+    embedder.dimension                                    # vector size (None: the deployment's default)
+
+* azure - the Azure OpenAI embeddings deployment, called through the shared
+          Upstream limiter when one is given (the original behaviour)
+* local - a sentence-transformers model (LOCAL_EMBEDDING_MODEL: hub name or
+          local directory) loaded once per process and run on CPU, optionally
+          with the ONNX Runtime backend (LOCAL_EMBEDDING_RUNTIME=onnx). Once the
+          model is on disk no network access is needed.
+
+The local backend batches concurrent calls itself: texts wait in a queue until
+LOCAL_EMBEDDING_MAX_BATCH of them are pending or the oldest has waited
+LOCAL_EMBEDDING_MAX_WAIT_MS, and a batch is only dispatched when one of the
+LOCAL_EMBEDDING_THREADS inference threads is free, so batches grow under load
+instead of queueing behind each other. Identical texts in flight are encoded
+once. Inference releases the GIL, so the event loop keeps serving meanwhile.
+
+The collection's vector size has to match the model: the schema tools take it
+from `embedding_dimension()`, so create the collection with EMBEDDING_BACKEND set
+the same way as for ingestion and the services. For the local backend that
+loads the model once to read its size, unless EMBEDDING_DIMENSIONS is set (it
+must then match the model; LocalEmbedder.load checks).
+"""
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from .instrumentation import count
+from .upstream import Upstream, estimate_tokens
+
+EMBEDDING_BACKENDS = ("azure", "local")
+DEFAULT_LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+# Settings are read when an embedder is created rather than at import, so the
+# services' own load_dotenv() (which runs after their imports) still applies
+def embedding_backend() -> str:
+    backend = os.getenv("EMBEDDING_BACKEND", "azure")
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Expected one of {EMBEDDING_BACKENDS}.")
+    return backend
+
+
+def _embedding_dimensions() -> Optional[int]:
+    # Must match the collection's vector size when it was created with a reduced-dimension
+    # schema profile (text-embedding-3 models accept a `dimensions` parameter)
+    return int(os.getenv("EMBEDDING_DIMENSIONS", 0)) or None
+
+
+def _local_model_name() -> str:
+    return os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_LOCAL_EMBEDDING_MODEL)
+
+
+class Embedder(ABC):
+    name: str
+    dimension: Optional[int] = None
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in order."""
+
+    async def embed_one(self, text: str) -> List[float]:
+        return (await self.embed([text]))[0]
+
+    async def close(self):
+        pass
+
+
+class AzureEmbedder(Embedder):
+    def __init__(self, client, deployment: str, dimensions: Optional[int] = None, upstream: Optional[Upstream] = None):
+        self.client = client
+        self.deployment = deployment
+        self.dimension = dimensions
+        self.name = f"{deployment}@{dimensions}" if dimensions else deployment
+        self.options = {"dimensions": dimensions} if dimensions else {}
+        self.upstream = upstream
+
+    async def _create(self, input, key=None, tokens: int = 0):
+        request = lambda: self.client.embeddings.create(input=input, model=self.deployment, **self.options)
+        if self.upstream is None:
+            return await request()
+        return await self.upstream.call(request, key=key, tokens=tokens)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        # The embeddings API takes a list, so the whole batch is one request
+        response = await self._create(texts, tokens=estimate_tokens(*texts))
+        vectors = [None] * len(texts)
+        for item in response.data:
+            vectors[item.index] = item.embedding
+        return vectors
+
+    async def embed_one(self, text: str) -> List[float]:
+        response = await self._create(text, key=("embedding", text), tokens=estimate_tokens(text))
+        return response.data[0].embedding
+
+
+class LocalEmbedder(Embedder):
+    """
+    In-process model with dynamic micro-batching. `model` needs the
+    sentence-transformers interface: `encode(texts, ...)` and
+    `get_sentence_embedding_dimension()`.
+    """
+
+    def __init__(self, model, name: str, threads: int = 2, max_batch: int = 64, max_wait_ms: float = 1.0):
+        self.model = model
+        self.name = f"local:{name}"
+        self.dimension = model.get_sentence_embedding_dimension()
+        self.threads = max(1, threads)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="embedder")
+        self._pending: List[str] = []
+        self._inflight: Dict[str, asyncio.Future] = {}  # text -> vector, shared by identical callers
+        self._busy = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @classmethod
+    def load(cls, name: Optional[str] = None, threads: Optional[int] = None) -> "LocalEmbedder":
+        """Load LOCAL_EMBEDDING_MODEL (or `name`) with the LOCAL_EMBEDDING_* settings."""
+        name = name or _local_model_name()
+        runtime = os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch")  # "torch" or "onnx"
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=local needs sentence-transformers "
+                "(pip install sentence-transformers, or 'sentence-transformers[onnx]' for LOCAL_EMBEDDING_RUNTIME=onnx)."
+            ) from None
+        embedder = cls(
+            SentenceTransformer(name, device="cpu", backend=runtime),
+            name,
+            threads=threads or int(os.getenv("LOCAL_EMBEDDING_THREADS", 2)),
+            max_batch=int(os.getenv("LOCAL_EMBEDDING_MAX_BATCH", 64)),
+            max_wait_ms=float(os.getenv("LOCAL_EMBEDDING_MAX_WAIT_MS", 1)),
+        )
+        configured = _embedding_dimensions()
+        if configured and configured != embedder.dimension:
+            raise ValueError(
+                f"EMBEDDING_DIMENSIONS={configured} but {name} produces {embedder.dimension}-dim vectors."
+            )
+        return embedder
+
+    def encode(self, texts: List[str]):
+        """Blocking inference on one batch: float32 array of unit-length vectors."""
+        return self.model.encode(
+            texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+        )
+
+    def _encode_batch(self, texts: List[str]) -> list:
+        """One vector (or the exception raised for it) per text."""
+        try:
+            return list(self.encode(texts))
+        except Exception:
+            if len(texts) == 1:
+                raise
+        # One bad input must not fail the unrelated texts batched with it
+        results = []
+        for text in texts:
+            try:
+                results.append(self.encode([text])[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = self._inflight.get(text)
+            if future is None:
+                future = self._inflight[text] = loop.create_future()
+                self._pending.append(text)
+            futures.append(future)
+        self._schedule(loop)
+        # shield: a caller giving up must not cancel the vector for the others waiting on it
+        vectors = await asyncio.gather(*(asyncio.shield(future) for future in futures))
+        return [vector.tolist() for vector in vectors]
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop):
+        if not self._pending or self._busy >= self.threads:
+            return  # a finishing batch dispatches whatever queued up meanwhile
+        if len(self._pending) >= self.max_batch or self.max_wait <= 0:
+            self._dispatch(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch, loop)
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending and self._busy < self.threads:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            self._busy += 1
+            done = loop.run_in_executor(self._executor, self._encode_batch, batch)
+            done.add_done_callback(lambda done, batch=batch: self._finished(loop, batch, done))
+
+    def _finished(self, loop: asyncio.AbstractEventLoop, batch: List[str], done: asyncio.Future):
+        self._busy -= 1
+        # texts / batches on /metrics is the mean batch size
+        count("local_embedding_batches")
+        count("local_embedding_texts", len(batch))
+        error = done.exception()
+        results = [error] * len(batch) if error is not None else done.result()
+        for text, result in zip(batch, results):
+            future = self._inflight.pop(text)
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+                future.exception()  # retrieved even if every waiter already gave up
+            else:
+                future.set_result(result)
+        # Texts that arrived while every thread was busy have waited long enough
+        if self._pending:
+            self._dispatch(loop)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def create_embedder(azure_client=None, upstream: Optional[Upstream] = None) -> Embedder:
+    if embedding_backend() == "local":
+        return LocalEmbedder.load()
+    return AzureEmbedder(
+        azure_client, os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"), _embedding_dimensions(), upstream
+    )
+
+
+def embedding_model_key() -> str:
+    """Same as `create_embedder(...).name`, without loading a model."""
+    if embedding_backend() == "local":
+        return f"local:{_local_model_name()}"
+    deployment, dimensions = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"), _embedding_dimensions()
+    return f"{deployment}@{dimensions}" if dimensions else deployment
+
+
+@lru_cache(maxsize=None)
+def _local_model_dimension(name: str) -> int:
+    return LocalEmbedder.load(name, threads=1).dimension
+
+
+def embedding_dimension() -> Optional[int]:
+    """Vector size the collection needs for the configured backend (None: keep the schema profile's)."""
+    configured = _embedding_dimensions()
+    if configured or embedding_backend() == "azure":
+        return configured
+    return _local_model_dimension(_local_model_name())
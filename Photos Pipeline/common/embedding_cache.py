@@ -0,0 +1,163 @@
+"""
+Query-embedding cache shared by the rag service (/query, /query/batch) and the
+metadata service (/hybrid-query), so the same query text is embedded once.
+Both key on (embedding model key, normalize_query(query)) and embed the
+normalized text, so a cached vector is the one either service would compute.
+Point EMBEDDING_CACHE_PATH of both services at the same file to share entries
+between them (and between workers) while they run.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from .normalize import normalize_query
+
+
+class EmbeddingCache:
+    """
+    In-process LRU + TTL cache of query embeddings stored as float32 arrays.
+
+    Entries are keyed on (deployment name, normalized query). Memory is bounded
+    both by entry count and by total vector bytes; the least recently used entry
+    is evicted first and expired entries are dropped on access. When
+    `persist_path` is set, entries are written through to a SQLite file, read
+    from it on an in-memory miss (another process may have stored them), and the
+    freshest ones are reloaded on startup, so a restart does not start cold.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 24 * 3600,
+        max_bytes: int = 128 * 1024 * 1024,
+        persist_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, vector)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " deployment TEXT NOT NULL,"
+                " query TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (deployment, query))"
+            )
+            self._load_persisted()
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        """Configured by EMBEDDING_CACHE_{MAX_ENTRIES,MAX_BYTES,TTL_SECONDS,PATH}."""
+        return cls(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 10000)),
+            ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 24 * 3600)),
+            max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 128 * 1024 * 1024)),
+            persist_path=os.getenv("EMBEDDING_CACHE_PATH"),
+        )
+
+    # --- Public API ---
+    def get(self, query: str, deployment: str) -> Optional[np.ndarray]:
+        key = (deployment, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key) or self._load_one(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, vector = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, query: str, deployment: str, embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector.setflags(write=False)
+        key = (deployment, normalize_query(query))
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._insert(key, expires_at, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (deployment, query, vector, expires_at) VALUES (?, ?, ?, ?)",
+                    (key[0], key[1], vector.tobytes(), expires_at),
+                )
+                self._db.commit()
+        return vector
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # --- Internals (caller holds the lock) ---
+    def _insert(self, key: tuple, expires_at: float, vector: np.ndarray):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, vector)
+        self._bytes += vector.nbytes
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: tuple):
+        _, vector = self._entries.pop(key)
+        self._bytes -= vector.nbytes
+
+    def _load_one(self, key: tuple, now: float) -> Optional[tuple]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT vector, expires_at FROM embeddings WHERE deployment = ? AND query = ? AND expires_at > ?",
+            (key[0], key[1], now),
+        ).fetchone()
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        self._insert(key, row[1], vector)
+        return row[1], vector
+
+    def _load_persisted(self):
+        now = time.time()
+        self._db.execute("DELETE FROM embeddings WHERE expires_at <= ?", (now,))
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT deployment, query, vector, expires_at FROM embeddings ORDER BY expires_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        # Oldest first so the freshest entries end up most recently used
+        for deployment, query, blob, expires_at in reversed(rows):
+            vector = np.frombuffer(blob, dtype=np.float32)
+            self._insert((deployment, query), expires_at, vector)
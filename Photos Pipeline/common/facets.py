@@ -0,0 +1,237 @@
+"""
+Value counts ("facets") of the filterable payload fields of the photo collection.
+
+    deviceType / appName / localFolderName   value -> number of photos
+    persons                                  name  -> number of photos it appears in
+    month                                    "YYYY-MM" of `timestamp` (UTC) -> number of photos;
+                                             per-year counts are summed from it
+
+Two layers:
+
+* FacetCounts - the aggregate in memory. The metadata service serves it on
+  /facets and builds its extraction vocabularies from it.
+* FacetStore  - the same aggregate in a SQLite file (FACET_INDEX_PATH), next to
+  each point's own facet values, so writers can keep it current incrementally:
+  re-upserting a point first subtracts what it contributed before, deleting one
+  subtracts it. Every change bumps a generation counter, which is how the
+  services notice they should reload.
+
+The store is built once by scanning the collection (`FacetStore.rebuild` with
+`iter_facet_payloads`: facet fields only, no vectors); after that ingest_photos.py
+applies every upserted, updated and deleted batch. Writes that bypass it (e.g.
+the NiFi flow) are picked up by running QdrantDB/build_facets.py again.
+"""
+import json
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+FACET_FIELDS = ("deviceType", "appName", "localFolderName", "persons")
+MONTH_FIELD = "month"
+PointId = Union[int, str]
+
+
+def facet_values(payload: dict) -> Dict[str, List[str]]:
+    """Facet field -> distinct values of one point (fields without a value are left out)."""
+    values = {}
+    for field in FACET_FIELDS:
+        value = payload.get(field)
+        items = value if isinstance(value, list) else [value]
+        distinct = sorted({item.strip() for item in items if isinstance(item, str) and item.strip()})
+        if distinct:
+            values[field] = distinct
+    timestamp = payload.get("timestamp")
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        try:
+            values[MONTH_FIELD] = [datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m")]
+        except (OverflowError, OSError, ValueError):
+            pass
+    return values
+
+
+def iter_facet_payloads(client, collection_name: str, batch_size: int = 1000) -> Iterator[Tuple[PointId, dict]]:
+    """(point id, payload with only the facet fields) for every point, via a sync QdrantClient."""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=list(FACET_FIELDS) + ["timestamp"],
+            with_vectors=False,
+        )
+        for point in points:
+            yield point.id, point.payload or {}
+        if offset is None:
+            return
+
+
+class FacetCounts:
+    def __init__(self, counts: Optional[Dict[str, Dict[str, int]]] = None, points: int = 0):
+        self.counts: Dict[str, Dict[str, int]] = {field: {} for field in FACET_FIELDS + (MONTH_FIELD,)}
+        for field, values in (counts or {}).items():
+            self.counts.setdefault(field, {}).update(values)
+        self.points = points
+
+    @classmethod
+    def from_payloads(cls, payloads: Iterable[Tuple[PointId, dict]]) -> "FacetCounts":
+        counters = {field: Counter() for field in FACET_FIELDS + (MONTH_FIELD,)}
+        points = 0
+        for _, payload in payloads:
+            points += 1
+            for field, values in facet_values(payload).items():
+                counters[field].update(values)
+        return cls({field: dict(counter) for field, counter in counters.items()}, points)
+
+    def top(self, field: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(value, count) pairs, most frequent first."""
+        ranked = sorted(self.counts.get(field, {}).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+    def months(self) -> Dict[str, int]:
+        return dict(sorted(self.counts[MONTH_FIELD].items()))
+
+    def years(self) -> Dict[str, int]:
+        years = Counter()
+        for month, count in self.counts[MONTH_FIELD].items():
+            years[month[:4]] += count
+        return dict(sorted(years.items()))
+
+    def vocabulary(self) -> Dict[str, List[str]]:
+        """Every known value of each facet field (the rule parser's vocabulary)."""
+        return {field: list(self.counts[field]) for field in FACET_FIELDS}
+
+    def to_dict(self, limit: Optional[int] = None) -> dict:
+        return {
+            "points": self.points,
+            "fields": {
+                field: [{"value": value, "count": count} for value, count in self.top(field, limit)]
+                for field in FACET_FIELDS
+            },
+            "years": self.years(),
+            "months": self.months(),
+        }
+
+
+class FacetStore:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS facet_points (point_id TEXT PRIMARY KEY, facets TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS facet_counts ("
+            " field TEXT NOT NULL, value TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (field, value))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS facet_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.commit()
+
+    # --- Readers ---
+    def generation(self) -> int:
+        """0 until the store was first built; changes whenever the counts do."""
+        with self._lock:
+            return self._meta("generation")
+
+    def load(self) -> FacetCounts:
+        with self._lock:
+            counts: Dict[str, Dict[str, int]] = {}
+            for field, value, count in self._db.execute("SELECT field, value, count FROM facet_counts"):
+                counts.setdefault(field, {})[value] = count
+            return FacetCounts(counts, self._meta("points"))
+
+    # --- Writers ---
+    def rebuild(self, payloads: Iterable[Tuple[PointId, dict]]):
+        """Replace everything with the given points (the full collection)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM facet_points")
+                self._db.execute("DELETE FROM facet_counts")
+                self._set_meta("points", 0)
+                self._apply(payloads)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def apply(self, payloads: Iterable[Tuple[PointId, dict]]):
+        """Account for upserted points (new, or replacing their previous payload)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._apply(payloads)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def delete(self, point_ids: Iterable[PointId]):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                deltas, removed = Counter(), 0
+                for point_id in point_ids:
+                    previous = self._previous(str(point_id))
+                    if previous is None:
+                        continue
+                    self._db.execute("DELETE FROM facet_points WHERE point_id = ?", (str(point_id),))
+                    self._count(deltas, previous, -1)
+                    removed += 1
+                self._write(deltas, -removed)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- Internals (called with the lock held, inside a transaction) ---
+    def _apply(self, payloads: Iterable[Tuple[PointId, dict]]):
+        deltas, added = Counter(), 0
+        for point_id, payload in payloads:
+            key = str(point_id)
+            values = facet_values(payload)
+            previous = self._previous(key)
+            if previous is None:
+                added += 1
+            else:
+                self._count(deltas, previous, -1)
+            self._count(deltas, values, 1)
+            self._db.execute(
+                "INSERT OR REPLACE INTO facet_points (point_id, facets) VALUES (?, ?)", (key, json.dumps(values))
+            )
+        self._write(deltas, added)
+
+    def _previous(self, point_id: str) -> Optional[Dict[str, List[str]]]:
+        row = self._db.execute("SELECT facets FROM facet_points WHERE point_id = ?", (point_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _count(deltas: Counter, values: Dict[str, List[str]], sign: int):
+        for field, field_values in values.items():
+            for value in field_values:
+                deltas[(field, value)] += sign
+
+    def _write(self, deltas: Counter, points_delta: int):
+        changes = [(field, value, delta) for (field, value), delta in deltas.items() if delta]
+        self._db.executemany(
+            "INSERT INTO facet_counts (field, value, count) VALUES (?, ?, ?)"
+            " ON CONFLICT (field, value) DO UPDATE SET count = count + excluded.count",
+            changes,
+        )
+        if changes:
+            self._db.execute("DELETE FROM facet_counts WHERE count <= 0")
+        self._set_meta("points", self._meta("points") + points_delta)
+        self._set_meta("generation", self._meta("generation") + 1)
+
+    def _meta(self, key: str) -> int:
+        row = self._db.execute("SELECT value FROM facet_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, key: str, value: int):
+        self._db.execute("INSERT OR REPLACE INTO facet_meta (key, value) VALUES (?, ?)", (key, value))
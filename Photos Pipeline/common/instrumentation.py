@@ -0,0 +1,212 @@
+"""
+Request tracing and latency metrics for the FastAPI services.
+
+    instrument_app(app, "rag")           # middleware + GET /metrics
+    with span("embedding"):              # time one stage of a request
+        vector = await get_query_embedding(...)
+    register_cache_stats("embedding", cache.stats)
+
+Every request gets a `Server-Timing` header listing the spans that finished
+before the response started (e.g. `embedding;dur=41.2, qdrant;dur=6.8,
+total;dur=49.0`), and the same durations feed Prometheus-style histograms
+served as text on /metrics. Recording is a perf_counter pair, a bisect and
+a locked increment per span, so it is cheap enough to leave on.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers cache hits (sub-ms) up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            bucket_labels = _format_labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response body.",
+    ("service", "method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "request_stage_duration_seconds", "Time spent in one stage of a request (see span()).",
+    ("service", "stage", "outcome"),
+)
+EVENTS = Counter("request_events_total", "Counted events within requests (see count()).", ("service", "event"))
+
+# name -> stats() callable of a cache (must return at least "hits" and "misses")
+_cache_stats: Dict[str, Callable[[], dict]] = {}
+_service_name = "app"
+
+
+def register_cache_stats(name: str, stats: Callable[[], dict]):
+    """Expose a cache's hit/miss counters on /metrics without touching its hot path."""
+    _cache_stats[name] = stats
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage of the current request (also usable outside requests, e.g. in startup code)."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, _service_name, stage, outcome)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def count(event: str, amount: float = 1):
+    EVENTS.inc(_service_name, event, amount=amount)
+
+
+def render_metrics() -> str:
+    lines = REQUEST_SECONDS.render() + STAGE_SECONDS.render() + EVENTS.render()
+    if _cache_stats:
+        for metric, key in (("cache_hits_total", "hits"), ("cache_misses_total", "misses")):
+            lines.append(f"# TYPE {metric} counter")
+            for name, stats in sorted(_cache_stats.items()):
+                try:
+                    value = stats().get(key, 0)
+                except Exception:
+                    continue
+                lines.append(f'{metric}{{service="{_service_name}",cache="{_escape(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    entries = [f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class InstrumentationMiddleware:
+    """
+    Pure ASGI middleware (unlike BaseHTTPMiddleware it doesn't buffer streaming
+    responses). The route label is the matched path template, so ids and query
+    strings never create new series.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                total = time.perf_counter() - start
+                headers.append((b"server-timing", server_timing(timings, total).encode("latin-1")))
+                headers.append((b"x-response-time-ms", f"{total * 1000:.1f}".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, self.service, scope["method"], route_label, str(status))
+
+
+def instrument_app(app, service: str, metrics_path: str = "/metrics"):
+    """Install the timing middleware and a Prometheus text endpoint on a FastAPI app."""
+    from fastapi.responses import PlainTextResponse
+
+    global _service_name
+    _service_name = service
+    app.add_middleware(InstrumentationMiddleware, service=service)
+
+    async def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    app.add_api_route(metrics_path, metrics, methods=["GET"], include_in_schema=False)
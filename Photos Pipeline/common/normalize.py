@@ -0,0 +1,10 @@
+"""
+Query normalization shared by every cache keyed on user queries (embeddings,
+extracted metadata, result caches), so the services always agree on the key.
+"""
+import unicodedata
+
+
+def normalize_query(text: str) -> str:
+    """Collapse Unicode compatibility forms, case and whitespace so trivially different queries share a key."""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
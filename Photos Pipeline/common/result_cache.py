@@ -0,0 +1,201 @@
+"""
+Ranked search results shared by every worker of a service, invalidated when the
+collection changes.
+
+    cache = ResultCache(RESULT_CACHE_PATH)
+    version = cache.version(COLLECTION_NAME)       # read *before* searching
+    key = result_cache_key("query", query=user_query, limit=5)
+    results = cache.get(COLLECTION_NAME, key, version)
+    if results is None:
+        results = ...                                # embed + search
+        cache.put(COLLECTION_NAME, key, version, results)
+
+Entries live in one SQLite file (WAL mode), so all uvicorn workers on a host
+read and fill the same cache. Next to them the file holds a version counter per
+collection; ingestion and the schema tools call `bump_collection_version`
+after writing, and entries stored under an older version are treated as misses
+(and dropped) from then on. Reading the version before the search means a
+result computed while ingestion was running is stored under the old version
+and never served after the bump.
+
+Writes that bypass the scripts (e.g. the NiFi flow) don't bump the counter;
+the TTL bounds how long results stay stale then, or run
+`python -m common.result_cache bump <collection>` at the end of the flow.
+
+The cache is bounded to `max_entries`: every `max_entries // 20` puts, expired
+and outdated rows are deleted, then the least recently used rows beyond the
+limit. The last-used time is only rewritten when it is older than
+USED_AT_RESOLUTION_SECONDS, so hot keys don't turn every hit into a write.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from .normalize import normalize_query
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 20000))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 3600))
+USED_AT_RESOLUTION_SECONDS = 60
+
+
+def result_cache_key(endpoint: str, query: str, **params) -> str:
+    """Canonical key: endpoint, normalized query and every parameter that changes the results."""
+    return json.dumps({"endpoint": endpoint, "query": normalize_query(query), **params}, sort_keys=True, default=str)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS collection_versions ("
+        " collection TEXT PRIMARY KEY,"
+        " version INTEGER NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+    return db
+
+
+class ResultCache:
+    def __init__(self, path: str, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.trim_interval = max(1, max_entries // 20)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+        self._db = _connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " used_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+        self._db.commit()
+
+    def version(self, namespace: str) -> int:
+        """Current version of a collection (0 until it is first bumped)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM collection_versions WHERE collection = ?", (namespace,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get(self, namespace: str, key: str, version: int) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, value, expires_at, used_at FROM results WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            entry_version, value, expires_at, used_at = row
+            if entry_version != version or expires_at <= now:
+                # A result from before the last bump is dropped; one computed against a newer
+                # version than ours (another worker saw the bump first) is simply not used
+                if entry_version < version or expires_at <= now:
+                    self._db.execute(
+                        "DELETE FROM results WHERE namespace = ? AND key = ? AND version = ?",
+                        (namespace, key, entry_version),
+                    )
+                    self._db.commit()
+                self.stale += 1
+                self.misses += 1
+                return None
+            if now - used_at > USED_AT_RESOLUTION_SECONDS:
+                self._db.execute(
+                    "UPDATE results SET used_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+                )
+                self._db.commit()
+            self.hits += 1
+        return json.loads(value)
+
+    def put(self, namespace: str, key: str, version: int, value: Any):
+        """Store `value` (JSON-serializable) as computed against `version` of the collection."""
+        now = time.time()
+        encoded = json.dumps(value)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (namespace, key, version, value, expires_at, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, version, encoded, now + self.ttl_seconds, now),
+            )
+            self._puts += 1
+            if self._puts % self.trim_interval == 0:
+                self._trim(now)
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {"entries": entries, "hits": self.hits, "misses": self.misses, "stale": self.stale}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _trim(self, now: float):
+        self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM results WHERE version < COALESCE("
+            " (SELECT version FROM collection_versions WHERE collection = results.namespace), 0)"
+        )
+        self._db.execute(
+            "DELETE FROM results WHERE rowid IN ("
+            " SELECT rowid FROM results ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+def bump_collection_version(collection: str, path: Optional[str] = None) -> Optional[int]:
+    """
+    Invalidate every cached result for `collection` (call after changing it).
+    No-op returning None when no result cache is configured (RESULT_CACHE_PATH unset).
+    """
+    path = path or os.getenv("RESULT_CACHE_PATH")
+    if not path:
+        return None
+    db = _connect(path)
+    try:
+        db.execute(
+            "INSERT INTO collection_versions (collection, version, updated_at) VALUES (?, 1, ?)"
+            " ON CONFLICT (collection) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            (collection, time.time()),
+        )
+        db.commit()
+        return db.execute(
+            "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+        ).fetchone()[0]
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the shared search result cache.")
+    parser.add_argument("command", choices=["bump"], help="bump: invalidate cached results for a collection")
+    parser.add_argument("collection", help="Collection or alias name the services query")
+    parser.add_argument("--path", default=os.getenv("RESULT_CACHE_PATH"), help="Cache file (default: $RESULT_CACHE_PATH)")
+    args = parser.parse_args()
+    if not args.path:
+        raise SystemExit("❌ No cache file: set RESULT_CACHE_PATH or pass --path.")
+    print(f"🔄 '{args.collection}' is now at version {bump_collection_version(args.collection, args.path)}")
@@ -0,0 +1,20 @@
+"""
+Qdrant search parameters for the `summary_embedding` vectors, shared by the rag
+service (/query) and the metadata service (/hybrid-query) so both rank the same
+way on quantized schema profiles (see QdrantDB/schema.py).
+
+    QDRANT_SEARCH_OVERSAMPLING  > 0: search the quantized vectors with this
+                                oversampling and rescore with the originals
+    QDRANT_HNSW_EF              > 0: HNSW beam width (default: the collection's)
+"""
+import os
+
+from qdrant_client.models import QuantizationSearchParams, SearchParams
+
+
+def search_params_from_env() -> SearchParams:
+    oversampling = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", 0)) or None
+    return SearchParams(
+        hnsw_ef=int(os.getenv("QDRANT_HNSW_EF", 0)) or None,
+        quantization=QuantizationSearchParams(rescore=True, oversampling=oversampling) if oversampling else None,
+    )
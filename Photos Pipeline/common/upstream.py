@@ -0,0 +1,254 @@
+"""
+Guarded calls to a rate-limited upstream (the Azure OpenAI deployments).
+
+    embeddings = Upstream("azure_embedding", rpm=AZURE_EMBEDDING_RPM, tpm=AZURE_EMBEDDING_TPM)
+    response = await embeddings.call(
+        lambda: client.embeddings.create(input=text, model=deployment),
+        key=("embedding", text),         # identical in-flight calls share one request
+        tokens=estimate_tokens(text),
+    )
+
+Every call goes through four layers:
+
+* singleflight  - concurrent calls with the same key wait for a single upstream
+                  request instead of sending N identical ones
+* token buckets - one for requests/minute and one for tokens/minute, sized to the
+                  deployment quota; callers queue here instead of collecting 429s.
+                  A 429 pauses the buckets for its Retry-After and halves their
+                  rate, which then recovers gradually as calls succeed
+* retries       - 429, 408, 409, 5xx, timeouts and connection errors are retried
+                  with full-jitter exponential backoff, or after Retry-After when
+                  the response has one
+* deadline      - the whole call, including queueing and retries, is bounded;
+                  running out raises UpstreamTimeout (HTTP 504) rather than
+                  holding the request open
+
+Errors that survive the retries are raised as UpstreamUnavailable (HTTP 503,
+with a Retry-After hint) so handlers can tell a throttled upstream apart from a
+bug. Other exceptions (e.g. a 400 for an over-long input) pass through as-is.
+"""
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from .instrumentation import count
+
+T = TypeVar("T")
+
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", 4))
+UPSTREAM_DEADLINE_SECONDS = float(os.getenv("UPSTREAM_DEADLINE_SECONDS", 20))
+UPSTREAM_BACKOFF_BASE_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_BASE_SECONDS", 0.5))
+UPSTREAM_BACKOFF_MAX_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_MAX_SECONDS", 8))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Lowest share of the configured rate the limiter backs off to after repeated 429s
+MIN_RATE_SCALE = 0.1
+RATE_RECOVERY_STEP = 0.05
+
+
+class UpstreamError(Exception):
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, round(self.retry_after)))} if self.retry_after else {}
+
+
+class UpstreamUnavailable(UpstreamError):
+    """Retries exhausted on throttling or transient failures."""
+
+
+class UpstreamTimeout(UpstreamError):
+    """The per-request deadline passed before the upstream answered."""
+    status_code = 504
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count for quota accounting (~4 characters per token)."""
+    return sum(len(text) // 4 + 1 for text in texts)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay the upstream asked for, from `retry-after-ms` or `retry-after` (seconds or HTTP date)."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # openai.APIConnectionError / APITimeoutError carry no status; neither do socket errors
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in (
+        "APIConnectionError", "APITimeoutError",
+    )
+
+
+class TokenBucket:
+    """`rate_per_minute` units refilled continuously, bursts up to one minute's worth."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.available = rate_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float, scale: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float, scale: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill(now, scale)
+        # A single request larger than the bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / (self.rate * scale)
+
+    def take(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+
+class Upstream:
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, max_retries: int = UPSTREAM_MAX_RETRIES,
+                 deadline_seconds: float = UPSTREAM_DEADLINE_SECONDS):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_retries = max_retries
+        self.deadline_seconds = deadline_seconds
+        self.rate_scale = 1.0
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def call(self, request: Callable[[], Awaitable[T]], key: Optional[Hashable] = None, tokens: int = 0,
+                   timeout: Optional[float] = None) -> T:
+        """
+        Run `request` (a zero-argument coroutine factory, called once per attempt)
+        within the limits. Calls sharing a non-None `key` are coalesced.
+        """
+        deadline = time.monotonic() + (timeout or self.deadline_seconds)
+        if key is None:
+            return await self._call_with_retries(request, tokens, deadline)
+
+        future = self._inflight.get(key)
+        if future is None:
+            # The first caller's deadline bounds the shared request
+            future = asyncio.ensure_future(self._call_with_retries(request, tokens, deadline))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            count(f"{self.name}_coalesced")
+        try:
+            # shield: one waiter timing out or disconnecting must not cancel it for the others
+            return await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(f"{self.name}: no response within the deadline") from None
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # retrieved even if every waiter already gave up
+
+    async def _acquire(self, tokens: int, deadline: float):
+        """Wait (in arrival order) until the buckets allow this call, or fail fast if that's past the deadline."""
+        try:
+            await asyncio.wait_for(self._lock.acquire(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            count(f"{self.name}_shed")
+            raise UpstreamTimeout(f"{self.name}: queued past the deadline") from None
+        try:
+            while True:
+                now = time.monotonic()
+                wait = max(0.0, self.paused_until - now)
+                if self.requests is not None:
+                    wait = max(wait, self.requests.wait_time(1, now, self.rate_scale))
+                if self.tokens is not None and tokens:
+                    wait = max(wait, self.tokens.wait_time(tokens, now, self.rate_scale))
+                if wait == 0:
+                    break
+                if now + wait > deadline:
+                    count(f"{self.name}_shed")
+                    raise UpstreamTimeout(f"{self.name}: quota exhausted until after the deadline", retry_after=wait)
+                await asyncio.sleep(wait)
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None and tokens:
+                self.tokens.take(tokens)
+        finally:
+            self._lock.release()
+
+    def _throttled(self, retry_after: Optional[float]):
+        self.rate_scale = max(MIN_RATE_SCALE, self.rate_scale / 2)
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def _succeeded(self):
+        if self.rate_scale < 1.0:
+            self.rate_scale = min(1.0, self.rate_scale + RATE_RECOVERY_STEP)
+
+    async def _call_with_retries(self, request: Callable[[], Awaitable[T]], tokens: int, deadline: float) -> T:
+        attempt = 0
+        while True:
+            await self._acquire(tokens, deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise UpstreamTimeout(f"{self.name}: no response within the deadline")
+            try:
+                result = await asyncio.wait_for(request(), remaining)
+            except asyncio.TimeoutError:
+                count(f"{self.name}_timeout")
+                raise UpstreamTimeout(f"{self.name}: no response within the deadline") from None
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                retry_after = retry_after_seconds(e)
+                if getattr(e, "status_code", None) == 429:
+                    count(f"{self.name}_throttled")
+                    self._throttled(retry_after)
+                if attempt >= self.max_retries:
+                    raise UpstreamUnavailable(f"{self.name}: {e}", retry_after=retry_after) from e
+                delay = retry_after if retry_after is not None else random.uniform(
+                    0, min(UPSTREAM_BACKOFF_MAX_SECONDS, UPSTREAM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+                )
+                if time.monotonic() + delay > deadline:
+                    raise UpstreamUnavailable(f"{self.name}: {e}", retry_after=retry_after or delay) from e
+                count(f"{self.name}_retry")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self._succeeded()
+            return result
+
+
+async def upstream_error_response(request, error: UpstreamError):
+    """FastAPI exception handler: a throttled or slow upstream is a 503/504, not a 500."""
+    from fastapi.responses import JSONResponse
+
+    return JSONResponse({"detail": str(error)}, status_code=error.status_code, headers=error.headers())
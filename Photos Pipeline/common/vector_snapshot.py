@@ -0,0 +1,353 @@
+"""
+Self-contained, memory-mapped copy of the `secure_photos` collection for
+searching without a Qdrant server (edge deployments, read replicas, offline).
+
+A snapshot is a directory written by QdrantDB/export_snapshot.py:
+
+    manifest.json            count, dim, dtype, export time, field vocabularies
+    vectors.npy              (count, dim) float16, or int8 + scales.npy (per-row scale)
+    ids.npy                  point ids (int64, or fixed-width strings for UUIDs)
+    <field>.offsets.npy      string columns (url, summary, title, image_path):
+    <field>.data.bin           utf-8 bytes of row i at data[offsets[i]:offsets[i+1]]
+    <field>.codes.npy        categorical columns (deviceType, appName, localFolderName):
+                               index into the manifest vocabulary, -1 when missing
+    persons.offsets.npy      list column: codes of row i at persons.codes[offsets[i]:offsets[i+1]]
+    persons.codes.npy
+    timestamp.npy            int64, MISSING_TIMESTAMP when missing
+    latitude.npy / longitude.npy   float32, NaN when missing
+
+Every array is opened with mmap, so startup only reads the manifest and all
+worker processes share one copy of the data through the page cache. Search is
+an exact (brute-force) top-k in NumPy, chunked so the float32 working set
+stays small; metadata filters are evaluated first as boolean masks over the
+columns and only the matching rows are scored.
+"""
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DTYPES = ("float16", "int8")
+STRING_FIELDS = ("url", "summary", "title", "image_path")
+CATEGORY_FIELDS = ("deviceType", "appName", "localFolderName")
+LIST_FIELD = "persons"
+MISSING_TIMESTAMP = np.iinfo(np.int64).min
+
+# Rows converted to float32 at a time while scoring (8192 x 1536 x 4 bytes = 48 MB)
+SEARCH_CHUNK_ROWS = int(os.getenv("SNAPSHOT_SEARCH_CHUNK_ROWS", 8192))
+EARTH_RADIUS_KM = 6371.0088
+
+
+@dataclass
+class SnapshotHit:
+    """Same attributes the services read from Qdrant's ScoredPoint."""
+    id: Union[int, str]
+    score: float
+    payload: dict
+
+
+class SnapshotWriter:
+    """Streams points into a new snapshot directory; `close()` publishes it atomically."""
+
+    def __init__(self, path: str, capacity: int, dim: int, dtype: str = "float16", source: str = ""):
+        if dtype not in SNAPSHOT_DTYPES:
+            raise ValueError(f"Unknown snapshot dtype '{dtype}'. Expected one of {SNAPSHOT_DTYPES}.")
+        self.path = Path(path)
+        self.tmp = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        self.tmp.mkdir(parents=True)
+        self.capacity = capacity
+        self.dim = dim
+        self.dtype = dtype
+        self.source = source
+        self.count = 0
+
+        self.vectors = np.lib.format.open_memmap(self.tmp / "vectors.npy", mode="w+", dtype=dtype, shape=(capacity, dim))
+        self.scales = np.ones(capacity, dtype=np.float32)
+        self.ids: List[Union[int, str]] = []
+        self.string_offsets = {field: [0] for field in STRING_FIELDS}
+        self.string_files = {field: open(self.tmp / f"{field}.data.bin", "wb") for field in STRING_FIELDS}
+        self.vocabularies: Dict[str, Dict[str, int]] = {field: {} for field in CATEGORY_FIELDS + (LIST_FIELD,)}
+        self.category_codes = {field: np.full(capacity, -1, dtype=np.int32) for field in CATEGORY_FIELDS}
+        self.list_offsets = [0]
+        self.list_codes: List[int] = []
+        self.timestamps = np.full(capacity, MISSING_TIMESTAMP, dtype=np.int64)
+        self.latitudes = np.full(capacity, np.nan, dtype=np.float32)
+        self.longitudes = np.full(capacity, np.nan, dtype=np.float32)
+
+    def _code(self, field: str, value: str) -> int:
+        vocabulary = self.vocabularies[field]
+        code = vocabulary.get(value)
+        if code is None:
+            code = vocabulary[value] = len(vocabulary)
+        return code
+
+    def add(self, point_id: Union[int, str], vector: Sequence[float], payload: dict):
+        if self.count >= self.capacity:
+            raise ValueError(f"Snapshot capacity of {self.capacity} points exceeded.")
+        row = self.count
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        if self.dtype == "int8":
+            scale = float(np.abs(vector).max()) / 127 or 1.0
+            self.vectors[row] = np.round(vector / scale).astype(np.int8)
+            self.scales[row] = scale
+        else:
+            self.vectors[row] = vector
+
+        self.ids.append(point_id)
+        for field in STRING_FIELDS:
+            value = payload.get(field)
+            data = value.encode("utf-8") if isinstance(value, str) else b""
+            self.string_files[field].write(data)
+            self.string_offsets[field].append(self.string_offsets[field][-1] + len(data))
+        for field in CATEGORY_FIELDS:
+            value = payload.get(field)
+            if isinstance(value, str) and value:
+                self.category_codes[field][row] = self._code(field, value)
+        persons = payload.get(LIST_FIELD) or []
+        if isinstance(persons, str):
+            persons = [persons]
+        self.list_codes.extend(self._code(LIST_FIELD, p.lower()) for p in persons if isinstance(p, str) and p)
+        self.list_offsets.append(len(self.list_codes))
+
+        if isinstance(payload.get("timestamp"), (int, float)):
+            self.timestamps[row] = int(payload["timestamp"])
+        location = payload.get("location") or {}
+        latitude = location.get("lat", payload.get("latitude"))
+        longitude = location.get("lon", payload.get("longitude"))
+        if latitude is not None and longitude is not None:
+            self.latitudes[row] = latitude
+            self.longitudes[row] = longitude
+        self.count += 1
+
+    def close(self) -> Path:
+        count = self.count
+        self.vectors.flush()
+        del self.vectors
+        for handle in self.string_files.values():
+            handle.close()
+
+        if all(isinstance(i, int) for i in self.ids):
+            ids = np.asarray(self.ids, dtype=np.int64)
+        else:
+            ids = np.asarray([str(i) for i in self.ids])
+        np.save(self.tmp / "ids.npy", ids)
+        if self.dtype == "int8":
+            np.save(self.tmp / "scales.npy", self.scales[:count])
+        for field in STRING_FIELDS:
+            np.save(self.tmp / f"{field}.offsets.npy", np.asarray(self.string_offsets[field], dtype=np.int64))
+        for field in CATEGORY_FIELDS:
+            np.save(self.tmp / f"{field}.codes.npy", self.category_codes[field][:count])
+        np.save(self.tmp / f"{LIST_FIELD}.offsets.npy", np.asarray(self.list_offsets, dtype=np.int64))
+        np.save(self.tmp / f"{LIST_FIELD}.codes.npy", np.asarray(self.list_codes, dtype=np.int32))
+        np.save(self.tmp / "timestamp.npy", self.timestamps[:count])
+        np.save(self.tmp / "latitude.npy", self.latitudes[:count])
+        np.save(self.tmp / "longitude.npy", self.longitudes[:count])
+
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "source": self.source,
+            "created_at": time.time(),
+            # vectors.npy may hold unused rows past `count` if points were deleted during the export
+            "count": count,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "vocabularies": {field: list(vocabulary) for field, vocabulary in self.vocabularies.items()},
+        }
+        (self.tmp / "manifest.json").write_text(json.dumps(manifest))
+
+        # Swap directories; processes that still map the old files keep reading them until they reopen
+        old = self.path.with_name(f"{self.path.name}.old-{os.getpid()}")
+        if self.path.exists():
+            os.rename(self.path, old)
+        os.rename(self.tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        return self.path
+
+
+class VectorSnapshot:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        manifest = json.loads((self.path / "manifest.json").read_text())
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {manifest.get('version')} in {path}.")
+        self.count = manifest["count"]
+        self.dim = manifest["dim"]
+        self.dtype = manifest["dtype"]
+        self.source = manifest.get("source", "")
+        self.created_at = manifest.get("created_at", 0.0)
+        self.vocabularies = {field: {value: code for code, value in enumerate(values)}
+                             for field, values in manifest["vocabularies"].items()}
+        self.vocabulary_values = manifest["vocabularies"]
+
+        load = lambda name: np.load(self.path / name, mmap_mode="r")
+        self.vectors = load("vectors.npy")[:self.count]
+        self.scales = load("scales.npy") if self.dtype == "int8" else None
+        self.ids = load("ids.npy")
+        self.string_offsets = {field: load(f"{field}.offsets.npy") for field in STRING_FIELDS}
+        self.string_data = {
+            field: np.memmap(self.path / f"{field}.data.bin", dtype=np.uint8, mode="r")
+            if (self.path / f"{field}.data.bin").stat().st_size else np.zeros(0, dtype=np.uint8)
+            for field in STRING_FIELDS
+        }
+        self.category_codes = {field: load(f"{field}.codes.npy") for field in CATEGORY_FIELDS}
+        self.list_offsets = load(f"{LIST_FIELD}.offsets.npy")
+        self.list_codes = load(f"{LIST_FIELD}.codes.npy")
+        self.timestamps = load("timestamp.npy")
+        self.latitudes = load("latitude.npy")
+        self.longitudes = load("longitude.npy")
+
+    def __len__(self) -> int:
+        return self.count
+
+    # --- Payload ---
+    def _string(self, field: str, row: int) -> Optional[str]:
+        offsets = self.string_offsets[field]
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return bytes(self.string_data[field][start:end]).decode("utf-8") if end > start else None
+
+    def payload(self, row: int, fields: Optional[Iterable[str]] = None) -> dict:
+        payload = {}
+        for field in fields or STRING_FIELDS + CATEGORY_FIELDS + (LIST_FIELD, "timestamp", "location"):
+            if field in self.string_offsets:
+                value = self._string(field, row)
+            elif field in self.category_codes:
+                code = int(self.category_codes[field][row])
+                value = self.vocabulary_values[field][code] if code >= 0 else None
+            elif field == LIST_FIELD:
+                codes = self.list_codes[self.list_offsets[row]:self.list_offsets[row + 1]]
+                value = [self.vocabulary_values[LIST_FIELD][int(c)] for c in codes] or None
+            elif field == "timestamp":
+                value = int(self.timestamps[row]) if self.timestamps[row] != MISSING_TIMESTAMP else None
+            elif field == "location":
+                latitude, longitude = float(self.latitudes[row]), float(self.longitudes[row])
+                value = None if np.isnan(latitude) else {"lat": latitude, "lon": longitude}
+            else:
+                continue
+            if value is not None:
+                payload[field] = value
+        return payload
+
+    def point_id(self, row: int) -> Union[int, str]:
+        value = self.ids[row]
+        return int(value) if self.ids.dtype.kind == "i" else str(value)
+
+    # --- Filtering ---
+    def filter_mask(self, equals: Optional[Dict[str, str]] = None, persons: Optional[Sequence[str]] = None,
+                    persons_mode: str = "any", timestamp_after: Optional[int] = None,
+                    timestamp_before: Optional[int] = None, near: Optional[Tuple[float, float, float]] = None,
+                    bbox: Optional[Tuple[float, float, float, float]] = None) -> np.ndarray:
+        """
+        Boolean mask of the rows matching every condition. `equals` maps categorical
+        fields to exact values, `near` is (lat, lon, radius_km), `bbox` is
+        (north, south, west, east).
+        """
+        mask = np.ones(self.count, dtype=bool)
+        for field, value in (equals or {}).items():
+            if field not in self.category_codes:
+                raise ValueError(f"Field '{field}' is not filterable in the snapshot.")
+            code = self.vocabularies[field].get(value)
+            if code is None:
+                return np.zeros(self.count, dtype=bool)
+            mask &= self.category_codes[field] == code
+
+        if persons:
+            codes = [self.vocabularies[LIST_FIELD].get(p.lower()) for p in persons]
+            lengths = np.diff(self.list_offsets)
+            rows = np.repeat(np.arange(self.count), lengths)
+            if persons_mode == "all":
+                if None in codes:
+                    return np.zeros(self.count, dtype=bool)
+                for code in codes:
+                    mask &= np.bincount(rows[self.list_codes == code], minlength=self.count) > 0
+            else:
+                known = [c for c in codes if c is not None]
+                hits = np.isin(self.list_codes, known)
+                mask &= np.bincount(rows[hits], minlength=self.count) > 0
+
+        if timestamp_after is not None or timestamp_before is not None:
+            mask &= self.timestamps != MISSING_TIMESTAMP
+            if timestamp_after is not None:
+                mask &= self.timestamps >= timestamp_after
+            if timestamp_before is not None:
+                mask &= self.timestamps <= timestamp_before
+
+        if near is not None:
+            latitude, longitude, radius_km = near
+            lat1, lat2 = np.radians(latitude), np.radians(self.latitudes)
+            dlat = lat2 - lat1
+            dlon = np.radians(self.longitudes) - np.radians(longitude)
+            a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+            distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+            mask &= distance <= radius_km  # NaN (no location) compares False
+
+        if bbox is not None:
+            north, south, west, east = bbox
+            mask &= (self.latitudes <= north) & (self.latitudes >= south)
+            if west <= east:
+                mask &= (self.longitudes >= west) & (self.longitudes <= east)
+            else:  # crosses the antimeridian
+                mask &= (self.longitudes >= west) | (self.longitudes <= east)
+        return mask
+
+    # --- Search ---
+    def _scores(self, queries: np.ndarray, rows: Union[slice, np.ndarray]) -> np.ndarray:
+        block = self.vectors[rows].astype(np.float32)
+        scores = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        return scores
+
+    def search_batch(self, queries: Sequence[Sequence[float]], limit: int = 5,
+                     mask: Optional[np.ndarray] = None, with_payload: Optional[Iterable[str]] = None
+                     ) -> List[List[SnapshotHit]]:
+        """Exact cosine top-`limit` for each query, restricted to `mask` rows if given."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query vectors have {queries.shape[1]} dimensions, the snapshot has {self.dim}.")
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if limit <= 0:
+            return [[] for _ in queries]
+
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        total = self.count if candidates is None else len(candidates)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, SEARCH_CHUNK_ROWS):
+            end = min(total, start + SEARCH_CHUNK_ROWS)
+            rows = np.arange(start, end) if candidates is None else candidates[start:end]
+            scores = self._scores(queries, slice(start, end) if candidates is None else rows)
+            if scores.shape[1] > limit:
+                top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = rows[top]
+            else:
+                rows = np.broadcast_to(rows, scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > limit:
+                top = np.argpartition(-best_scores, limit - 1, axis=1)[:, :limit]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores, kind="stable")
+            results.append([
+                SnapshotHit(self.point_id(int(rows[i])), float(scores[i]), self.payload(int(rows[i]), with_payload))
+                for i in order
+            ])
+        return results
+
+    def search(self, query: Sequence[float], limit: int = 5, mask: Optional[np.ndarray] = None,
+               with_payload: Optional[Iterable[str]] = None) -> List[SnapshotHit]:
+        return self.search_batch([query], limit, mask, with_payload)[0]
@@ -0,0 +1,111 @@
+"""
+Image preprocessing before the gpt-4o summary call.
+
+The NiFi flow Base64-encodes the full original (often a multi-megabyte JPEG
+or HEIC) for every photo. The vision model downsamples anything larger than
+2048 px, then to 768 px on the short side (512 px for detail="low"), so the
+extra pixels only cost upload bytes and latency. prepare_image decodes the
+file at reduced scale, downsizes it to what the model actually uses and
+re-encodes it as a compact JPEG.
+
+It also computes the keys used to skip duplicate photos: a SHA-256 of the
+file bytes (exact copies across Takeout albums) and a 64-bit difference hash
+of the pixels (the same photo re-encoded or resized).
+
+Pillow is optional. Without it, or for formats it cannot open (HEIC needs
+pillow-heif), the original bytes are sent as before.
+"""
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+if Image is not None:
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
+# "low", "high" or "auto" (the API default, same as the NiFi flow)
+SUMMARY_IMAGE_DETAIL = os.getenv("SUMMARY_IMAGE_DETAIL", "auto")
+SUMMARY_IMAGE_QUALITY = int(os.getenv("SUMMARY_IMAGE_QUALITY", 85))
+
+# Largest size the model looks at for each detail level: (long side cap, short side cap)
+DETAIL_LIMITS = {"low": (512, 512), "high": (2048, 768), "auto": (2048, 768)}
+
+DEDUP_MODES = ("off", "content", "perceptual")
+
+MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".heic": "image/heic"}
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    content_hash: str
+    perceptual_hash: Optional[str] = None
+    original_size: int = 0
+
+    def dedup_key(self, mode: str) -> Optional[str]:
+        if mode == "perceptual" and self.perceptual_hash:
+            return f"p:{self.perceptual_hash}"
+        if mode in ("content", "perceptual"):
+            return f"c:{self.content_hash}"
+        return None
+
+
+def target_size(width: int, height: int, detail: str = SUMMARY_IMAGE_DETAIL):
+    long_cap, short_cap = DETAIL_LIMITS.get(detail, DETAIL_LIMITS["auto"])
+    scale = min(1.0, long_cap / max(width, height), short_cap / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def difference_hash(image) -> str:
+    """64-bit dHash: compare neighbouring pixels of a 9x8 grayscale thumbnail."""
+    pixels = list(image.convert("L").resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def prepare_image(image_bytes: bytes, suffix: str, detail: str = SUMMARY_IMAGE_DETAIL,
+                  perceptual: bool = False) -> PreparedImage:
+    """Downscale and re-encode one image for the summary request (CPU-bound; run in a thread)."""
+    content_hash = hashlib.sha256(image_bytes).hexdigest()
+    original = PreparedImage(image_bytes, MIME_TYPES.get(suffix.lower(), "image/jpeg"), content_hash,
+                             original_size=len(image_bytes))
+    if Image is None:
+        return original
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width, height = target_size(*image.size, detail=detail)
+            # JPEG: let the decoder skip detail we don't need (DCT scaling), much faster than a full decode
+            image.draft("RGB", (width, height))
+            image = ImageOps.exif_transpose(image)
+            perceptual_hash = difference_hash(image) if perceptual else None
+            width, height = target_size(*image.size, detail=detail)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if (width, height) != image.size:
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=SUMMARY_IMAGE_QUALITY, optimize=True)
+    except Exception:
+        # Unsupported format (e.g. HEIC without pillow-heif) or a corrupt file: send it unchanged
+        return original
+
+    data = buffer.getvalue()
+    if len(data) >= len(image_bytes) and original.mime_type != "image/heic":
+        # Already small; re-encoding didn't help
+        original.perceptual_hash = perceptual_hash
+        return original
+    return PreparedImage(data, "image/jpeg", content_hash, perceptual_hash, len(image_bytes))
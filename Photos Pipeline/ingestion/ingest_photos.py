@@ -0,0 +1,544 @@
+"""
+Bulk ingestion engine for Google Takeout photos.
+
+Covers the same steps as the NiFi flow (ListFile -> FetchFile -> EncodeContent
+-> Generate Summary -> Generate Embedding -> Prepare Payload -> upsert) but as
+one async pipeline:
+
+    walk + pair sidecars  ->  summarize (N concurrent gpt-4o calls)
+                          ->  embed a whole batch in one embeddings request
+                          ->  upsert the batch to Qdrant
+
+Queues between the stages are bounded, so memory stays flat however large the
+library is. Sidecars are paired per directory and parsed in a process pool
+(see metadata_resolver.py); --sidecar-cache keeps parsed sidecars across runs.
+Images are downscaled to the resolution the vision model uses before upload,
+and duplicate photos reuse the summary and vector of the first copy
+(see image_prep.py, --dedup).
+
+With --manifest the run is incremental (see manifest.py): unchanged images are
+skipped, images whose sidecar changed only get their payload rewritten, only new
+or modified images are summarized and embedded, points of deleted images are
+removed, and an interrupted run resumes where it stopped.
+
+EMBEDDING_BACKEND=local embeds with an in-process CPU model instead of the Azure
+deployment (see common/embedders.py). Summaries still come from the vision
+deployment, but the manifest keeps them, so re-indexing an already summarized
+library (e.g. into a collection created for a new embedding model) needs no
+network access at all; AZURE_OPENAI_ENDPOINT may then be left unset.
+
+With --facet-index (FACET_INDEX_PATH) every upserted, updated or deleted batch
+is also applied to the facet counts the metadata service serves on /facets
+(see common/facets.py).
+
+Usage:
+    python ingest_photos.py --root "/path/to/Takeout/Google Photos" --batch-size 64 --concurrency 16
+    python ingest_photos.py --root "/path/to/Takeout/Google Photos" --manifest photo_manifest.sqlite
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+import sys
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointStruct, PointIdsList, OverwritePayload, OverwritePayloadOperation
+
+from image_prep import DEDUP_MODES, SUMMARY_IMAGE_DETAIL, prepare_image
+from manifest import Manifest, STATUS_DONE, hash_file
+from metadata_resolver import MetadataResolver
+from takeout import metadata_to_payload
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.embedders import Embedder, create_embedder
+from common.facets import FacetStore
+from common.result_cache import bump_collection_version
+
+load_dotenv()
+
+# --- Configuration ---
+QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "secure_photos")
+AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
+
+VECTOR_NAME = "summary_embedding"
+SUMMARY_PROMPT = (
+    "Describe this image for a photo search engine. Be descriptive but concise. "
+    "Mention people, animals, objects, colors, and the general setting."
+)
+# Summaries remembered per dedup key within a run (a few hundred bytes each)
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", 200000))
+
+# What an incremental run has to do for an image
+ACTION_FULL = "full"            # summarize + embed + upsert
+ACTION_EMBED = "embed"          # summary already known (resumed run): embed + upsert
+ACTION_PAYLOAD = "payload"      # only the sidecar changed: rewrite the payload
+ACTION_SKIP = "skip"            # unchanged
+
+
+def point_id_for(image_path: Path) -> str:
+    """Stable point id per file, so re-running the ingest overwrites instead of duplicating."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, str(image_path.resolve())))
+
+
+def payload_hash_for(payload: dict) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class PhotoRecord:
+    image_path: Path
+    payload: dict
+    summary: Optional[str] = None
+    point_id: Optional[str] = None
+    payload_hash: Optional[str] = None
+    action: str = ACTION_FULL
+    # Set when the summary was reused from a duplicate photo; its stored vector is reused too
+    source_point_id: Optional[str] = None
+
+    def __post_init__(self):
+        self.point_id = self.point_id or point_id_for(self.image_path)
+        self.payload_hash = self.payload_hash or payload_hash_for(self.payload)
+
+
+@dataclass
+class IngestStats:
+    discovered: int = 0
+    no_metadata: int = 0
+    summarized: int = 0
+    failed: int = 0
+    upserted: int = 0
+    skipped: int = 0
+    payload_updated: int = 0
+    deleted: int = 0
+    deduplicated: int = 0
+    vectors_reused: int = 0
+    image_bytes_read: int = 0
+    image_bytes_sent: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def changed_collection(self) -> bool:
+        return bool(self.upserted or self.payload_updated or self.deleted)
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started_at
+        rate = self.upserted / elapsed if elapsed else 0.0
+        return (
+            f"discovered={self.discovered} no_metadata={self.no_metadata} skipped={self.skipped} "
+            f"summarized={self.summarized} upserted={self.upserted} payload_updated={self.payload_updated} "
+            f"deleted={self.deleted} deduplicated={self.deduplicated} failed={self.failed} "
+            f"sent={self.image_bytes_sent / 2**20:.1f}/{self.image_bytes_read / 2**20:.1f} MB ({rate:.1f} photos/s)"
+        )
+
+
+class PhotoIngestor:
+    def __init__(
+        self,
+        openai_client: Optional[AsyncAzureOpenAI],
+        qdrant_client: AsyncQdrantClient,
+        embedder: Embedder,
+        batch_size: int = 64,
+        concurrency: int = 16,
+        upsert_concurrency: int = 4,
+        include_unpaired: bool = False,
+        manifest: Optional[Manifest] = None,
+        resolver: Optional[MetadataResolver] = None,
+        dedup: str = "content",
+        facets: Optional[FacetStore] = None,
+    ):
+        self.openai_client = openai_client
+        self.qdrant_client = qdrant_client
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.upsert_concurrency = upsert_concurrency
+        self.upsert_slots = asyncio.Semaphore(upsert_concurrency)
+        self.include_unpaired = include_unpaired
+        self.manifest = manifest
+        self.resolver = resolver or MetadataResolver()
+        self.dedup = dedup
+        self.facets = facets
+        # dedup key -> future of (summary, point_id) of the first photo with that key
+        self.summaries: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self.stats = IngestStats()
+
+    # --- Stages ---
+    def prepare_record(self, image_path: Path, payload: Optional[dict]) -> Optional[PhotoRecord]:
+        """Build the record from the resolved sidecar payload (blocking file IO with a manifest)."""
+        if payload is None:
+            if not self.include_unpaired:
+                return None
+            payload = metadata_to_payload(image_path, {})
+        record = PhotoRecord(image_path, payload)
+        if self.manifest is not None:
+            self.plan_incremental(record)
+        return record
+
+    def prepare_directory(self, resolved: List[Tuple[Path, Optional[dict]]]) -> List[Tuple[Path, Optional[PhotoRecord]]]:
+        return [(image_path, self.prepare_record(image_path, payload)) for image_path, payload in resolved]
+
+    def plan_incremental(self, record: PhotoRecord):
+        """Compare the file with its manifest entry and decide how much work it needs."""
+        key = str(record.image_path)
+        stat = record.image_path.stat()
+        entry = self.manifest.get(key)
+
+        # size + mtime unchanged: trust the stored hash instead of re-reading the file
+        if entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            content_hash = entry.content_hash
+        else:
+            content_hash = hash_file(record.image_path)
+
+        if entry is not None:
+            record.point_id = entry.point_id
+        content_changed = entry is None or entry.content_hash != content_hash or not entry.summary
+        self.manifest.observe(key, stat.st_size, stat.st_mtime_ns, content_hash, record.point_id, content_changed)
+        if content_changed:
+            record.action = ACTION_FULL
+            return
+
+        record.summary = entry.summary
+        if entry.status != STATUS_DONE:
+            record.action = ACTION_EMBED
+        elif entry.payload_hash != record.payload_hash:
+            record.action = ACTION_PAYLOAD
+        else:
+            record.action = ACTION_SKIP
+
+    async def summarize(self, record: PhotoRecord) -> str:
+        image_bytes = await asyncio.to_thread(record.image_path.read_bytes)
+        prepared = await asyncio.to_thread(
+            prepare_image, image_bytes, record.image_path.suffix, perceptual=self.dedup == "perceptual"
+        )
+        del image_bytes
+        self.stats.image_bytes_read += prepared.original_size
+
+        key = prepared.dedup_key(self.dedup)
+        if key is None:
+            return await self.request_summary(prepared.data, prepared.mime_type)
+
+        if key in self.summaries:
+            summary, record.source_point_id = await asyncio.shield(self.summaries[key])
+            self.summaries.move_to_end(key)
+            self.stats.deduplicated += 1
+            return summary
+
+        future = asyncio.get_running_loop().create_future()
+        self.summaries[key] = future
+        try:
+            reused = None
+            if self.manifest is not None:
+                # Same bytes indexed in an earlier run under another path
+                reused = await asyncio.to_thread(
+                    self.manifest.summary_for_content, prepared.content_hash, str(record.image_path)
+                )
+            if reused is not None:
+                summary, record.source_point_id = reused
+                self.stats.deduplicated += 1
+            else:
+                summary = await self.request_summary(prepared.data, prepared.mime_type)
+        except BaseException as e:
+            # Don't cache failures; a later duplicate gets its own attempt
+            self.summaries.pop(key, None)
+            future.set_exception(e)
+            future.exception()
+            raise
+        future.set_result((summary, record.source_point_id or record.point_id))
+        while len(self.summaries) > DEDUP_CACHE_SIZE:
+            oldest = next(iter(self.summaries))
+            if not self.summaries[oldest].done():
+                break
+            self.summaries.popitem(last=False)
+        return summary
+
+    async def request_summary(self, image_data: bytes, mime_type: str) -> str:
+        if self.openai_client is None:
+            raise RuntimeError("no summary deployment configured (AZURE_OPENAI_ENDPOINT) and no stored summary")
+        self.stats.image_bytes_sent += len(image_data)
+        data_url = f"data:{mime_type};base64,{base64.b64encode(image_data).decode('ascii')}"
+        response = await self.openai_client.chat.completions.create(
+            model=AZURE_OPENAI_DEPLOYMENT_NAME,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": SUMMARY_PROMPT},
+                    {"type": "image_url", "image_url": {"url": data_url, "detail": SUMMARY_IMAGE_DETAIL}},
+                ],
+            }],
+            max_tokens=150,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def reusable_vectors(self, batch: List[PhotoRecord]) -> dict:
+        """point_id -> stored vector of the photo each deduplicated record was copied from."""
+        sources = {r.source_point_id for r in batch if r.source_point_id and r.source_point_id != r.point_id}
+        if not sources:
+            return {}
+        try:
+            points = await self.qdrant_client.retrieve(
+                collection_name=COLLECTION_NAME, ids=list(sources), with_payload=False, with_vectors=[VECTOR_NAME]
+            )
+        except Exception as e:
+            print(f"⚠️ Could not fetch vectors of duplicate photos, re-embedding them: {e}")
+            return {}
+        stored = {str(p.id): p.vector[VECTOR_NAME] for p in points if p.vector and VECTOR_NAME in p.vector}
+        return {r.point_id: stored[r.source_point_id] for r in batch if r.source_point_id in stored}
+
+    async def embed_and_upsert(self, batch: List[PhotoRecord]):
+        async with self.upsert_slots:
+            try:
+                vectors = await self.reusable_vectors(batch)
+                self.stats.vectors_reused += len(vectors)
+                # Identical summaries (duplicate photos) are embedded once
+                texts = list(dict.fromkeys(r.summary for r in batch if r.point_id not in vectors))
+                if texts:
+                    # One embeddings request (or one local inference batch) for the whole batch
+                    by_text = dict(zip(texts, await self.embedder.embed(texts)))
+                    for record in batch:
+                        vectors.setdefault(record.point_id, by_text.get(record.summary))
+                points = [
+                    PointStruct(
+                        id=record.point_id,
+                        vector={VECTOR_NAME: vectors[record.point_id]},
+                        payload={**record.payload, "summary": record.summary},
+                    )
+                    for record in batch
+                ]
+                await self.qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points, wait=True)
+                if self.facets is not None:
+                    await asyncio.to_thread(self.facets.apply, [(r.point_id, r.payload) for r in batch])
+                if self.manifest is not None:
+                    await asyncio.to_thread(
+                        self.manifest.mark_done, [(str(r.image_path), r.payload_hash) for r in batch]
+                    )
+                self.stats.upserted += len(points)
+                print(f"✅ Upserted batch of {len(points)} | {self.stats.report()}")
+            except Exception as e:
+                self.stats.failed += len(batch)
+                print(f"❌ Failed to embed/upsert batch of {len(batch)}: {e}")
+
+    async def update_payloads(self, batch: List[PhotoRecord]):
+        """Rewrite payloads in place (one batch_update_points call) when only the sidecar changed."""
+        async with self.upsert_slots:
+            try:
+                await self.qdrant_client.batch_update_points(
+                    collection_name=COLLECTION_NAME,
+                    update_operations=[
+                        OverwritePayloadOperation(overwrite_payload=OverwritePayload(
+                            payload={**record.payload, "summary": record.summary},
+                            points=[record.point_id],
+                        ))
+                        for record in batch
+                    ],
+                    wait=True,
+                )
+                if self.facets is not None:
+                    await asyncio.to_thread(self.facets.apply, [(r.point_id, r.payload) for r in batch])
+                await asyncio.to_thread(
+                    self.manifest.mark_done, [(str(r.image_path), r.payload_hash) for r in batch]
+                )
+                self.stats.payload_updated += len(batch)
+            except Exception as e:
+                self.stats.failed += len(batch)
+                print(f"❌ Failed to update payloads for batch of {len(batch)}: {e}")
+
+    async def delete_removed(self):
+        """Delete points of images that were in the manifest but no longer exist on disk."""
+        removed = await asyncio.to_thread(self.manifest.unseen)
+        for start in range(0, len(removed), self.batch_size):
+            chunk = removed[start:start + self.batch_size]
+            await self.qdrant_client.delete(
+                collection_name=COLLECTION_NAME,
+                points_selector=PointIdsList(points=[point_id for _, point_id in chunk]),
+                wait=True,
+            )
+            if self.facets is not None:
+                await asyncio.to_thread(self.facets.delete, [point_id for _, point_id in chunk])
+            await asyncio.to_thread(self.manifest.delete, [image_path for image_path, _ in chunk])
+            self.stats.deleted += len(chunk)
+        if removed:
+            print(f"🗑️ Deleted {len(removed)} points for removed images")
+
+    # --- Pipeline ---
+    async def run(self, root: str, limit: Optional[int] = None) -> IngestStats:
+        to_summarize: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        to_upsert: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 2)
+
+        payload_updates = []
+
+        async def produce() -> bool:
+            """Feed the pipeline; returns True when the whole library was walked."""
+            completed = True
+            directories = self.resolver.iter_directories(root)
+            while (resolved := await asyncio.to_thread(next, directories, None)) is not None:
+                if limit is not None:
+                    if self.stats.discovered >= limit:
+                        completed = False
+                        break
+                    if self.stats.discovered + len(resolved) > limit:
+                        resolved = resolved[:limit - self.stats.discovered]
+                        completed = False
+                for image_path, record in await asyncio.to_thread(self.prepare_directory, resolved):
+                    self.stats.discovered += 1
+                    if record is None:
+                        self.stats.no_metadata += 1
+                        print(f"⚠️ No matching metadata JSON file found for image: '{image_path}'")
+                    elif record.action == ACTION_SKIP:
+                        self.stats.skipped += 1
+                    elif record.action == ACTION_PAYLOAD:
+                        payload_updates.append(record)
+                        if len(payload_updates) >= self.batch_size:
+                            await self.update_payloads(payload_updates[:])
+                            payload_updates.clear()
+                    elif record.action == ACTION_EMBED:
+                        await to_upsert.put(record)
+                    else:
+                        await to_summarize.put(record)
+            if payload_updates:
+                await self.update_payloads(payload_updates[:])
+            for _ in range(self.concurrency):
+                await to_summarize.put(None)
+            return completed
+
+        async def summarize_worker():
+            while (record := await to_summarize.get()) is not None:
+                try:
+                    record.summary = await self.summarize(record)
+                    self.stats.summarized += 1
+                    if self.manifest is not None:
+                        # Persist right away so a crash before the upsert doesn't pay for it twice
+                        await asyncio.to_thread(self.manifest.record_summary, str(record.image_path), record.summary)
+                    await to_upsert.put(record)
+                except Exception as e:
+                    self.stats.failed += 1
+                    print(f"❌ Failed to summarize '{record.image_path}': {e}")
+
+        async def batch_writer():
+            pending = set()
+            batch = []
+            while (record := await to_upsert.get()) is not None:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    # Stop reading (and let to_upsert fill up, which holds back the
+                    # summarizers) while every upsert slot is busy, instead of queueing
+                    # batches in memory behind the semaphore
+                    if len(pending) >= self.upsert_concurrency:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+                    pending.add(asyncio.create_task(self.embed_and_upsert(batch)))
+                    batch = []
+            if batch:
+                pending.add(asyncio.create_task(self.embed_and_upsert(batch)))
+            if pending:
+                await asyncio.gather(*pending)
+
+        writer = asyncio.create_task(batch_writer())
+        workers = [asyncio.create_task(summarize_worker()) for _ in range(self.concurrency)]
+        walked_everything = await produce()
+        await asyncio.gather(*workers)
+        await to_upsert.put(None)
+        await writer
+
+        if self.manifest is not None:
+            self.manifest.commit()
+            # A partial walk (--limit) can't tell deleted files from unvisited ones
+            if walked_everything:
+                await self.delete_removed()
+        return self.stats
+
+
+async def main(args):
+    openai_client = AsyncAzureOpenAI(
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version="2024-12-01-preview",
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    ) if AZURE_OPENAI_ENDPOINT else None
+    embedder = create_embedder(openai_client)
+    qdrant_client = AsyncQdrantClient(url=QDRANT_HOST)
+    manifest = Manifest(args.manifest) if args.manifest else None
+    facets = FacetStore(args.facet_index) if args.facet_index else None
+    if facets is not None and facets.generation() == 0:
+        # Incremental updates need the counts of the existing points as a base
+        print(f"⚠️ Facet index {args.facet_index} was never built; run QdrantDB/build_facets.py. Not updating it.")
+        facets.close()
+        facets = None
+    resolver = MetadataResolver(workers=args.metadata_workers, cache_path=args.sidecar_cache)
+    try:
+        if manifest is not None and manifest.count_done():
+            points = await qdrant_client.count(collection_name=COLLECTION_NAME, exact=False)
+            if points.count == 0:
+                # The collection was recreated (e.g. create_qdrant_schema.py); everything must be re-upserted
+                print("⚠️ Collection is empty but the manifest has indexed files; resetting manifest progress.")
+                manifest.reset()
+
+        ingestor = PhotoIngestor(
+            openai_client,
+            qdrant_client,
+            embedder,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            upsert_concurrency=args.upsert_concurrency,
+            include_unpaired=args.include_unpaired,
+            manifest=manifest,
+            resolver=resolver,
+            dedup=args.dedup,
+            facets=facets,
+        )
+        try:
+            stats = await ingestor.run(args.root, limit=args.limit)
+        finally:
+            # Even a failed run may have written points; cached search results must not outlive them
+            if ingestor.stats.changed_collection and bump_collection_version(COLLECTION_NAME) is not None:
+                print(f"🔄 Invalidated cached search results for '{COLLECTION_NAME}'")
+        for image_path, error in resolver.errors:
+            print(f"⚠️ Could not parse sidecar for '{image_path}': {error}")
+        print(f"🗂️ Sidecars: parsed={resolver.parsed} cached={resolver.cache_hits} unreadable={len(resolver.errors)}")
+        print(f"🏁 Done: {stats.report()}")
+    finally:
+        resolver.close()
+        await embedder.close()
+        if openai_client is not None:
+            await openai_client.close()
+        await qdrant_client.close()
+        if manifest is not None:
+            manifest.close()
+        if facets is not None:
+            facets.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest a Google Takeout photo library into Qdrant.")
+    parser.add_argument("--root", default=os.getenv("TAKEOUT_DIR"), required=not os.getenv("TAKEOUT_DIR"),
+                        help="Takeout 'Google Photos' directory (default: $TAKEOUT_DIR)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Points per embeddings request and upsert")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent summary requests")
+    parser.add_argument("--upsert-concurrency", type=int, default=4, help="Concurrent embed+upsert batches")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many images")
+    parser.add_argument("--include-unpaired", action="store_true",
+                        help="Also ingest images without a sidecar JSON (NiFi routes them to no.metadata.found)")
+    parser.add_argument("--manifest", default=os.getenv("MANIFEST_PATH"),
+                        help="SQLite manifest path; enables incremental, resumable indexing")
+    parser.add_argument("--metadata-workers", type=int, default=None,
+                        help="Processes parsing sidecar JSON (default: CPU count)")
+    parser.add_argument("--facet-index", default=os.getenv("FACET_INDEX_PATH"),
+                        help="SQLite facet index (see QdrantDB/build_facets.py) to keep up to date")
+    parser.add_argument("--sidecar-cache", default=os.getenv("SIDECAR_CACHE_PATH"),
+                        help="SQLite file caching parsed sidecars by mtime across runs")
+    parser.add_argument("--dedup", default=os.getenv("DEDUP_MODE", "content"), choices=DEDUP_MODES,
+                        help="Reuse summaries/vectors for duplicate photos: identical bytes (content) "
+                             "or identical difference hash (perceptual)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,152 @@
+"""
+SQLite manifest for incremental, resumable photo indexing.
+
+One row per image: size, mtime and content hash of the file, a hash of the
+payload derived from its sidecar, the Qdrant point id and the generated
+summary. A row only reaches status 'done' after its point was upserted, so a
+crashed run simply picks up the rows that are still 'pending' or 'summarized'
+(the latter skip the expensive summary call on resume).
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+STATUS_PENDING = "pending"
+STATUS_SUMMARIZED = "summarized"
+STATUS_DONE = "done"
+
+
+@dataclass
+class ManifestEntry:
+    image_path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    payload_hash: Optional[str]
+    point_id: str
+    summary: Optional[str]
+    status: str
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " image_path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " payload_hash TEXT,"
+            " point_id TEXT NOT NULL,"
+            " summary TEXT,"
+            " status TEXT NOT NULL,"
+            " last_seen_run INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_last_seen_run ON files (last_seen_run)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash)")
+        self._db.commit()
+        self.run_id = time.time_ns()
+
+    def get(self, image_path: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT image_path, size, mtime_ns, content_hash, payload_hash, point_id, summary, status"
+                " FROM files WHERE image_path = ?",
+                (image_path,),
+            ).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def summary_for_content(self, content_hash: str, exclude_path: str) -> Optional[Tuple[str, str]]:
+        """(summary, point_id) of another file with identical bytes, preferring one already upserted."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT summary, point_id FROM files"
+                " WHERE content_hash = ? AND summary IS NOT NULL AND image_path != ?"
+                " ORDER BY status = ? DESC LIMIT 1",
+                (content_hash, exclude_path, STATUS_DONE),
+            ).fetchone()
+
+    def observe(self, image_path: str, size: int, mtime_ns: int, content_hash: str, point_id: str, content_changed: bool):
+        """Record that the file was seen in this run; a content change resets it to 'pending'."""
+        with self._lock:
+            if content_changed:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO files"
+                    " (image_path, size, mtime_ns, content_hash, payload_hash, point_id, summary, status, last_seen_run, updated_at)"
+                    " VALUES (?, ?, ?, ?, NULL, ?, NULL, ?, ?, ?)",
+                    (image_path, size, mtime_ns, content_hash, point_id, STATUS_PENDING, self.run_id, time.time()),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ?, last_seen_run = ? WHERE image_path = ?",
+                    (size, mtime_ns, self.run_id, image_path),
+                )
+
+    def record_summary(self, image_path: str, summary: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE files SET summary = ?, status = ?, updated_at = ? WHERE image_path = ?",
+                (summary, STATUS_SUMMARIZED, time.time(), image_path),
+            )
+            self._db.commit()
+
+    def mark_done(self, entries: Iterable[Tuple[str, str]]):
+        """Mark (image_path, payload_hash) pairs as upserted."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE files SET payload_hash = ?, status = ?, updated_at = ? WHERE image_path = ?",
+                [(payload_hash, STATUS_DONE, now, image_path) for image_path, payload_hash in entries],
+            )
+            self._db.commit()
+
+    def unseen(self) -> List[Tuple[str, str]]:
+        """(image_path, point_id) of files not seen in this run, i.e. removed from disk."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT image_path, point_id FROM files WHERE last_seen_run != ?", (self.run_id,)
+            ).fetchall()
+
+    def delete(self, image_paths: Iterable[str]):
+        with self._lock:
+            self._db.executemany("DELETE FROM files WHERE image_path = ?", [(p,) for p in image_paths])
+            self._db.commit()
+
+    def count_done(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files WHERE status = ?", (STATUS_DONE,)).fetchone()[0]
+
+    def reset(self):
+        """Forget all progress (e.g. after the collection was recreated), keeping cached summaries."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE files SET status = CASE WHEN summary IS NULL THEN ? ELSE ? END",
+                (STATUS_PENDING, STATUS_SUMMARIZED),
+            )
+            self._db.commit()
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,236 @@
+"""
+Parallel, memoized replacement for per-image sidecar lookup.
+
+takeout.find_sidecar globs the image's directory once per image, which is
+O(files in the directory) per photo and dominates on large album folders. The
+resolver instead lists each directory once, indexes its JSON sidecars by name
+and pairs every image with a few lookups:
+
+    exact      IMG_1.jpg.json, IMG_1.jpg.supplemental-metadata.json
+    Rule A/B   same rules as find_sidecar (NiFi `Metadata Mapping`)
+    truncated  Takeout cuts sidecar names to 51 characters
+               (IMG_with_a_very_long_name.jpg.supplemental-metad.json)
+    duplicate  IMG_1234(1).jpg -> IMG_1234.jpg(1).json
+
+Sidecars are parsed in a process pool into the compact payload produced by
+takeout.metadata_to_payload (title, timestamp, geo, persons, device, app,
+folder, ...). Parsed payloads are cached by sidecar mtime/size, in memory and
+optionally in SQLite, so re-runs only parse sidecars that changed.
+"""
+import bisect
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from takeout import IMAGE_FILE_PATTERN, PAYLOAD_VERSION, load_sidecar, metadata_to_payload
+
+# Takeout limits sidecar file names to this many characters including ".json"
+TAKEOUT_MAX_SIDECAR_NAME = 51
+SUPPLEMENTAL_SUFFIX = ".supplemental-metadata"
+
+# Below this many uncached sidecars a directory is parsed inline; the pool round-trip costs more
+INLINE_PARSE_THRESHOLD = 32
+PARSE_CHUNK_SIZE = 256
+
+
+class DirectoryIndex:
+    """Sidecar names of one directory, sorted for prefix lookups."""
+
+    def __init__(self, json_names: List[str]):
+        self.names = sorted(json_names)
+        self.name_set = set(self.names)
+
+    def _with_prefix(self, prefix: str) -> Iterator[str]:
+        start = bisect.bisect_left(self.names, prefix)
+        for name in self.names[start:]:
+            if not name.startswith(prefix):
+                break
+            yield name
+
+    def find(self, image_filename: str) -> Optional[str]:
+        base_name, _ = os.path.splitext(image_filename)
+        # Exact names first: under Rule A alone IMG_1.jpg would take IMG_1.jpg(1).json,
+        # which belongs to the duplicate IMG_1(1).jpg and sorts before IMG_1.jpg.json
+        for exact in (image_filename + ".json", image_filename + SUPPLEMENTAL_SUFFIX + ".json"):
+            if exact in self.name_set:
+                return exact
+        # Rule A / Rule B, in the same (sorted) order find_sidecar checks them
+        for name in self._with_prefix(base_name):
+            if name.startswith(image_filename):
+                return name
+            if len(name) > len(base_name) and "." in name[len(base_name):]:
+                return name
+
+        keep = TAKEOUT_MAX_SIDECAR_NAME - len(".json")
+        for full_name in (image_filename + SUPPLEMENTAL_SUFFIX, image_filename):
+            truncated = full_name[:keep] + ".json"
+            if truncated in self.name_set:
+                return truncated
+
+        # Duplicates get the counter after the extension in the sidecar name
+        if base_name.endswith(")") and "(" in base_name:
+            original, counter = base_name.rsplit("(", 1)
+            extension = image_filename[len(base_name):]
+            for middle in (SUPPLEMENTAL_SUFFIX, ""):
+                candidate = f"{original}{extension}{middle}({counter}.json"
+                if candidate in self.name_set:
+                    return candidate
+        return None
+
+
+def _parse_sidecars(items: List[Tuple[str, str]]) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    """Process-pool worker: (image path, sidecar path) -> (image path, payload, error)."""
+    results = []
+    for image_path, sidecar_path in items:
+        try:
+            results.append((image_path, metadata_to_payload(Path(image_path), load_sidecar(Path(sidecar_path))), None))
+        except (OSError, ValueError) as e:
+            results.append((image_path, None, str(e)))
+    return results
+
+
+class SidecarCache:
+    """image path -> (sidecar path, sidecar mtime_ns, size, payload), optionally persisted to SQLite."""
+
+    def __init__(self, persist_path: Optional[str] = None):
+        self._entries: Dict[str, Tuple[str, int, int, dict]] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != PAYLOAD_VERSION:
+                # Payloads from an older metadata_to_payload (e.g. without `location`)
+                self._db.execute("DROP TABLE IF EXISTS sidecars")
+                self._db.execute(f"PRAGMA user_version = {PAYLOAD_VERSION}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sidecars ("
+                " image_path TEXT PRIMARY KEY,"
+                " sidecar_path TEXT NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+            for image_path, sidecar_path, mtime_ns, size, payload in self._db.execute("SELECT * FROM sidecars"):
+                self._entries[image_path] = (sidecar_path, mtime_ns, size, json.loads(payload))
+
+    def get(self, image_path: str, sidecar_path: str, stat: os.stat_result) -> Optional[dict]:
+        entry = self._entries.get(image_path)
+        if entry and entry[0] == sidecar_path and entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size:
+            return entry[3]
+        return None
+
+    def put_many(self, rows: List[Tuple[str, str, os.stat_result, dict]]):
+        with self._lock:
+            for image_path, sidecar_path, stat, payload in rows:
+                self._entries[image_path] = (sidecar_path, stat.st_mtime_ns, stat.st_size, payload)
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sidecars VALUES (?, ?, ?, ?, ?)",
+                    [(i, s, st.st_mtime_ns, st.st_size, json.dumps(p)) for i, s, st, p in rows],
+                )
+                self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+class MetadataResolver:
+    """
+    Walks a Takeout tree and yields, per directory, each image with its payload
+    (None when no sidecar was found or it could not be parsed).
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache_path: Optional[str] = None, prefetch: int = 4):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = SidecarCache(cache_path)
+        self.prefetch = prefetch
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.parsed = 0
+        self.cache_hits = 0
+        self.errors: List[Tuple[str, str]] = []
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _plan_directory(self, dirpath: str, filenames: List[str]):
+        """Pair the images of one directory; submit uncached sidecars for parsing."""
+        images = sorted(f for f in filenames if IMAGE_FILE_PATTERN.fullmatch(f))
+        if not images:
+            return None
+        index = DirectoryIndex([f for f in filenames if f.endswith(".json")])
+
+        payloads: Dict[str, Optional[dict]] = {}
+        misses: List[Tuple[str, str, os.stat_result]] = []
+        for filename in images:
+            image_path = os.path.join(dirpath, filename)
+            sidecar_name = index.find(filename)
+            if sidecar_name is None:
+                payloads[image_path] = None
+                continue
+            sidecar_path = os.path.join(dirpath, sidecar_name)
+            stat = os.stat(sidecar_path)
+            cached = self.cache.get(image_path, sidecar_path, stat)
+            if cached is not None:
+                payloads[image_path] = cached
+                self.cache_hits += 1
+            else:
+                misses.append((image_path, sidecar_path, stat))
+
+        items = [(image_path, sidecar_path) for image_path, sidecar_path, _ in misses]
+        if len(items) < INLINE_PARSE_THRESHOLD or self.workers == 1:
+            futures = [_parse_sidecars(items)] if items else []
+        else:
+            chunk = max(1, min(PARSE_CHUNK_SIZE, -(-len(items) // self.workers)))
+            futures = [self._executor().submit(_parse_sidecars, items[i:i + chunk]) for i in range(0, len(items), chunk)]
+        return images, dirpath, payloads, misses, futures
+
+    def _finish_directory(self, plan) -> List[Tuple[Path, Optional[dict]]]:
+        images, dirpath, payloads, misses, futures = plan
+        stats = {image_path: (sidecar_path, stat) for image_path, sidecar_path, stat in misses}
+        parsed = []
+        for future in futures:
+            for image_path, payload, error in (future if isinstance(future, list) else future.result()):
+                payloads[image_path] = payload
+                if error is not None:
+                    self.errors.append((image_path, error))
+                    continue
+                sidecar_path, stat = stats[image_path]
+                parsed.append((image_path, sidecar_path, stat, payload))
+        self.cache.put_many(parsed)
+        self.parsed += len(parsed)
+        return [(Path(dirpath) / filename, payloads[os.path.join(dirpath, filename)]) for filename in images]
+
+    def iter_directories(self, root: str) -> Iterator[List[Tuple[Path, Optional[dict]]]]:
+        """
+        Yield one list per directory that contains images, in os.walk order. Up to
+        `prefetch` directories are parsed ahead so the pool stays busy.
+        """
+        pending = deque()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            plan = self._plan_directory(dirpath, filenames)
+            if plan is None:
+                continue
+            pending.append(plan)
+            if len(pending) > self.prefetch:
+                yield self._finish_directory(pending.popleft())
+        while pending:
+            yield self._finish_directory(pending.popleft())
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        self.cache.close()
@@ -0,0 +1,95 @@
+"""
+Google Takeout helpers shared by the ingestion scripts: finding images,
+pairing them with their JSON sidecar and mapping the sidecar onto the
+`secure_photos` payload fields indexed in QdrantDB/create_qdrant_schema.py.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Same filter as the NiFi ListFile processor
+IMAGE_FILE_PATTERN = re.compile(r"[^\.].*\.(jpg|jpeg|png|heic)", re.IGNORECASE)
+
+# Bump when metadata_to_payload's output changes, so cached payloads are re-parsed
+PAYLOAD_VERSION = 2
+
+
+def iter_images(root: str) -> Iterator[Path]:
+    """Recursively yield image files under `root`, skipping hidden files and directories."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in sorted(filenames):
+            if IMAGE_FILE_PATTERN.fullmatch(filename):
+                yield Path(dirpath) / filename
+
+
+def find_sidecar(image_path: Path) -> Optional[Path]:
+    """
+    Port of the NiFi `Metadata Mapping` lookup: among `<base name>*.json` files
+    next to the image, prefer one starting with the full image filename
+    (Rule A: cows.jpg.json, cows.jpg.supplemental-metadata.json), otherwise one
+    starting with the base name followed by an extension-like part
+    (Rule B: sumatran-tiger.jpe.json for sumatran-tiger.jpeg).
+    """
+    image_filename = image_path.name
+    base_name = image_path.stem
+    for candidate in sorted(image_path.parent.glob(f"{glob_escape(base_name)}*.json")):
+        name = candidate.name
+        if name.startswith(image_filename):
+            return candidate
+        if len(name) > len(base_name) and "." in name[len(base_name):]:
+            return candidate
+    return None
+
+
+def glob_escape(text: str) -> str:
+    return re.sub(r"([\[\]*?])", r"[\1]", text)
+
+
+def load_sidecar(sidecar_path: Path) -> dict:
+    with open(sidecar_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _float_or_none(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def metadata_to_payload(image_path: Path, metadata: dict) -> dict:
+    """Flatten a Takeout sidecar into the payload fields indexed on `secure_photos`."""
+    taken = metadata.get("photoTakenTime") or metadata.get("creationTime") or {}
+    geo = metadata.get("geoData") or metadata.get("geoDataExif") or {}
+    origin = (metadata.get("googlePhotosOrigin") or {}).get("mobileUpload") or {}
+    app_source = metadata.get("appSource") or {}
+
+    timestamp = taken.get("timestamp")
+    latitude = _float_or_none(geo.get("latitude"))
+    longitude = _float_or_none(geo.get("longitude"))
+    # Takeout writes 0.0/0.0 when a photo has no location
+    has_location = bool(latitude or longitude)
+
+    payload = {
+        "image_path": str(image_path),
+        "title": metadata.get("title") or image_path.name,
+        "description": metadata.get("description") or None,
+        "imageViews": metadata.get("imageViews"),
+        "timestamp": int(timestamp) if timestamp else None,
+        "formatted_time": taken.get("formatted"),
+        "url": metadata.get("url") or image_path.resolve().as_uri(),
+        "latitude": latitude if has_location else None,
+        "longitude": longitude if has_location else None,
+        "altitude": _float_or_none(geo.get("altitude")) if has_location else None,
+        # Same point in Qdrant's geo format, for the `geo` index (radius / bounding-box filters)
+        "location": {"lat": latitude, "lon": longitude} if has_location else None,
+        "appName": app_source.get("androidPackageName"),
+        "deviceType": origin.get("deviceType"),
+        "localFolderName": (origin.get("deviceFolder") or {}).get("localFolderName"),
+        # Stored lower-case; metadata search matches persons on the lower-cased name
+        "persons": [p["name"].lower() for p in metadata.get("people") or [] if p.get("name")],
+    }
+    return {key: value for key, value in payload.items() if value not in (None, "", [])}
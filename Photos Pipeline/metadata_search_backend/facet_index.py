@@ -0,0 +1,89 @@
+"""
+Facet counts of the collection as the metadata service uses them (see
+common/facets.py): the /facets response, the rule parser's vocabulary and the
+known values listed in the extraction prompt.
+
+With FACET_INDEX_PATH set, every worker reads the shared SQLite index (building
+it by scanning the collection if it doesn't exist yet) and reloads it when its
+generation changes, checked at most every FACET_REFRESH_SECONDS. Without it,
+each worker scans the whole collection at startup (N uvicorn workers mean N
+full scans, and the snapshot never updates), so multi-worker deployments should
+set FACET_INDEX_PATH. Between reloads everything is served from memory, and the
+last few /facets bodies are kept serialized.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from common.facets import FACET_FIELDS, FacetCounts, FacetStore, iter_facet_payloads
+from rule_parser import Vocabulary
+
+load_dotenv()
+
+FACET_INDEX_PATH = os.getenv("FACET_INDEX_PATH")
+FACET_REFRESH_SECONDS = float(os.getenv("FACET_REFRESH_SECONDS", 5))
+# Serialized /facets bodies kept per index generation (one per distinct effective limit)
+FACET_RENDER_CACHE_ENTRIES = 8
+
+
+class FacetIndex:
+    def __init__(self, counts: FacetCounts, store: Optional[FacetStore] = None, generation: int = 0):
+        self.store = store
+        self.generation = generation
+        self.checked_at = time.monotonic()
+        self._set(counts)
+
+    @classmethod
+    def load(cls, client, collection_name: str) -> "FacetIndex":
+        if not FACET_INDEX_PATH:
+            print(f"🧮 Scanning '{collection_name}' for facets (set FACET_INDEX_PATH to share one index between workers)")
+            return cls(FacetCounts.from_payloads(iter_facet_payloads(client, collection_name)))
+        store = FacetStore(FACET_INDEX_PATH)
+        if store.generation() == 0:
+            print(f"🧮 Building facet index {FACET_INDEX_PATH} from '{collection_name}'")
+            store.rebuild(iter_facet_payloads(client, collection_name))
+        return cls(store.load(), store, store.generation())
+
+    def refresh(self) -> bool:
+        """Reload from the shared index if it changed since; True when it did."""
+        if self.store is None:
+            return False
+        now = time.monotonic()
+        if now - self.checked_at < FACET_REFRESH_SECONDS:
+            return False
+        self.checked_at = now
+        generation = self.store.generation()
+        if generation == self.generation:
+            return False
+        self.generation = generation
+        self._set(self.store.load())
+        return True
+
+    def render(self, limit: Optional[int] = None) -> bytes:
+        """JSON body of /facets: the `limit` most frequent values per field, years and months."""
+        # Any limit at or above the largest field's value count renders the same body
+        if limit is not None and limit >= self._largest_field:
+            limit = None
+        body = self._rendered.get(limit)
+        if body is None:
+            body = json.dumps({"generation": self.generation, **self.counts.to_dict(limit)}).encode("utf-8")
+            self._rendered[limit] = body
+            if len(self._rendered) > FACET_RENDER_CACHE_ENTRIES:
+                self._rendered.popitem(last=False)
+        else:
+            self._rendered.move_to_end(limit)
+        return body
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def _set(self, counts: FacetCounts):
+        self.counts = counts
+        self.vocabulary = Vocabulary(counts.vocabulary())
+        self._largest_field = max(len(counts.counts[field]) for field in FACET_FIELDS)
+        self._rendered: "OrderedDict[Optional[int], bytes]" = OrderedDict()
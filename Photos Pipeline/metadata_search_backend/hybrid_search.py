@@ -0,0 +1,103 @@
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Filter, Prefetch, FusionQuery, Fusion
+from typing import List, Optional
+from qdrant_search import host, port, COLLECTION_NAME, QDRANT_HOST
+from query_cache import embedding_cache
+from common.embedders import create_embedder, embedding_backend
+from common.normalize import normalize_query
+from common.search_params import search_params_from_env
+from common.upstream import Upstream
+import os
+
+load_dotenv()
+
+AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+# "azure" (AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME / EMBEDDING_DIMENSIONS) or "local" (see common/embedders.py)
+EMBEDDING_BACKEND = embedding_backend()
+
+VECTOR_NAME = "summary_embedding"
+# Candidates pulled by each prefetch branch before fusion
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", 50))
+# Same HNSW / quantization rescoring settings as the rag service's /query
+SEARCH_PARAMS = search_params_from_env()
+
+# Quota of the embedding deployment available to this worker (0 = unlimited)
+AZURE_EMBEDDING_RPM = float(os.getenv("AZURE_EMBEDDING_RPM", 0))
+AZURE_EMBEDDING_TPM = float(os.getenv("AZURE_EMBEDDING_TPM", 0))
+
+embedding_client = AsyncAzureOpenAI(
+    api_key=AZURE_OPENAI_API_KEY,
+    api_version="2024-12-01-preview",
+    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    max_retries=0,  # embedding_upstream retries, within the request deadline
+) if EMBEDDING_BACKEND == "azure" else None
+embedding_upstream = Upstream("azure_embedding", rpm=AZURE_EMBEDDING_RPM, tpm=AZURE_EMBEDDING_TPM)
+# Must produce the collection's vectors: the same backend and model as ingestion
+embedder = create_embedder(embedding_client, embedding_upstream)
+
+# With QDRANT_HOST=":memory:" this is a separate in-process store from qdrant_search.qdrant
+async_qdrant = AsyncQdrantClient(location=":memory:") if QDRANT_HOST == ":memory:" else AsyncQdrantClient(host=host, port=port)
+
+async def embed_query(query: str) -> List[float]:
+    """Embed the normalized query, through the embedding cache shared with the rag service."""
+    vector = embedding_cache.get(query, embedder.name)
+    if vector is None:
+        vector = embedding_cache.put(query, embedder.name, await embedder.embed_one(normalize_query(query)))
+    return vector.tolist()
+
+async def hybrid_search(
+    query_vector: List[float], filters: Optional[Filter], limit: int = 5, strict: bool = False
+) -> List[dict]:
+    """
+    Vector search on `summary_embedding` constrained or boosted by the metadata filter,
+    in a single Qdrant query.
+
+    - no filter: plain similarity search
+    - strict: the filter is a hard `query_filter` on the vector search
+    - otherwise: two prefetches (filtered and unfiltered) fused with reciprocal rank
+      fusion, so photos matching both the metadata and the meaning rank first while a
+      too-narrow or mis-extracted filter still returns semantically close photos
+    """
+    if filters is None or strict:
+        response = await async_qdrant.query_points(
+            collection_name=COLLECTION_NAME,
+            query=query_vector,
+            using=VECTOR_NAME,
+            query_filter=filters,
+            search_params=SEARCH_PARAMS,
+            limit=limit,
+            with_payload=["url", "summary"],
+        )
+    else:
+        prefetch_limit = max(HYBRID_PREFETCH_LIMIT, limit)
+        response = await async_qdrant.query_points(
+            collection_name=COLLECTION_NAME,
+            prefetch=[
+                Prefetch(query=query_vector, using=VECTOR_NAME, filter=filters, params=SEARCH_PARAMS, limit=prefetch_limit),
+                Prefetch(query=query_vector, using=VECTOR_NAME, params=SEARCH_PARAMS, limit=prefetch_limit),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            limit=limit,
+            with_payload=["url", "summary"],
+        )
+
+    matched = []
+    for point in response.points:
+        payload = point.payload or {}
+        if payload.get("url") and payload.get("summary"):
+            matched.append({
+                "image_url": payload["url"],
+                "summary": payload["summary"],
+                "score": point.score,
+            })
+    return matched
+
+async def close_clients():
+    await embedder.close()
+    if embedding_client is not None:
+        await embedding_client.close()
+    await async_qdrant.close()
+    embedding_cache.close()
@@ -1,35 +1,265 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
-from metadata_extractor import extract_fields_from_query
-from qdrant_search import search_by_metadata
-from models import MetadataFields, SearchResponse, ImageResult
+import sys
+from pathlib import Path
+from typing import Literal, Optional, Tuple
+
+# Shared helpers live in Photos Pipeline/common (also used by metadata_extractor / hybrid_search)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.facets import FacetCounts
+from common.instrumentation import count, instrument_app, register_cache_stats, span
+from common.result_cache import result_cache_key
+from common.upstream import UpstreamError, upstream_error_response
+
+from facet_index import FacetIndex
+from metadata_extractor import extract_fields_cached, set_known_values
+from qdrant_search import (
+    search_metadata_page, iter_metadata_matches, get_filter_for_metadata, load_match_modes, set_match_modes,
+    qdrant, COLLECTION_NAME,
+)
+from hybrid_search import embed_query, hybrid_search, close_clients
+from models import MetadataFields, SearchResponse, ImageResult, HybridSearchResponse
+from query_cache import embedding_cache, extraction_cache, filter_cache, result_cache
+from rule_parser import Vocabulary, parse_query
 
 load_dotenv()
 
-app = FastAPI(title="SecurePhotos Metadata Search API")
+# Minimum share of the query the rule-based parser must explain before the LLM is skipped
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", 1.0))
+MAX_PAGE_LIMIT = int(os.getenv("MAX_PAGE_LIMIT", 1000))
+# Values per field returned by /facets unless the request asks for another `limit`
+FACET_RESPONSE_LIMIT = int(os.getenv("FACET_RESPONSE_LIMIT", 100))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Value counts of deviceType / appName / localFolderName / persons and photos per month:
+    # served on /facets and used as the fast path and extraction prompt vocabularies
+    try:
+        app.state.facets = FacetIndex.load(qdrant, COLLECTION_NAME)
+    except Exception as e:
+        print(f"⚠️ Could not load facets, fast path limited to dates: {e}")
+        app.state.facets = FacetIndex(FacetCounts())
+    set_known_values(app.state.facets.counts)
+    # Full-text or exact matching per field, depending on how it is indexed
+    try:
+        set_match_modes(load_match_modes(qdrant, COLLECTION_NAME))
+    except Exception as e:
+        print(f"⚠️ Could not read payload indexes, using default match modes: {e}")
+    yield
+    await close_clients()
+    app.state.facets.close()
+
+
+app = FastAPI(title="SecurePhotos Metadata Search API", lifespan=lifespan)
+instrument_app(app, "metadata")
+app.add_exception_handler(UpstreamError, upstream_error_response)
+register_cache_stats("extraction", extraction_cache.stats)
+register_cache_stats("filter", filter_cache.stats)
+register_cache_stats("embedding", embedding_cache.stats)
+if result_cache is not None:
+    register_cache_stats("result", result_cache.stats)
 
 class QueryInput(BaseModel):
     query: str
+    limit: int = Field(5, ge=1, le=MAX_PAGE_LIMIT)
+    cursor: Optional[str] = None  # `next_cursor` from the previous page
+    sort: Literal["newest", "oldest", "none"] = "newest"
+
+class HybridQueryInput(BaseModel):
+    query: str
+    limit: int = Field(5, ge=1, le=MAX_PAGE_LIMIT)
+    strict: bool = False  # True: only return photos matching the extracted metadata
+
+class StreamQueryInput(BaseModel):
+    query: str
+    limit: Optional[int] = Field(None, ge=1)  # None streams every match
+    sort: Literal["newest", "oldest", "none"] = "none"
+
+def refresh_facets(app: FastAPI) -> FacetIndex:
+    """The facet index, after picking up changes to the shared one (e.g. from ingestion)."""
+    facets: FacetIndex = app.state.facets
+    if facets.refresh():
+        set_known_values(facets.counts)
+    return facets
+
+async def resolve_metadata_fields(user_query: str, vocabulary: Vocabulary) -> Tuple[dict, str]:
+    """Extract filter fields, preferring the rule-based parser over the LLM."""
+    with span("rule_parser"):
+        fast_path = parse_query(user_query, vocabulary)
+    if fast_path.is_confident(FAST_PATH_MIN_CONFIDENCE):
+        count("extraction_rules")
+        return fast_path.fields, "rules"
+
+    with span("extraction"):
+        extracted_dict, from_cache = await extract_fields_cached(user_query)
+    extraction_path = "cache" if from_cache else "llm"
+    count(f"extraction_{extraction_path}")
+    return extracted_dict, extraction_path
+
+def cached_response(key: str) -> Tuple[Optional[int], Optional[dict]]:
+    """(collection version, cached response fields or None); (None, None) without a result cache."""
+    if result_cache is None:
+        return None, None
+    with span("result_cache"):
+        version = result_cache.version(COLLECTION_NAME)
+        response = result_cache.get(COLLECTION_NAME, key, version)
+    if response is not None:
+        count("result_cache_hit")
+    return version, response
+
+def store_response(version: Optional[int], key: str, response: BaseModel):
+    if version is not None:
+        result_cache.put(COLLECTION_NAME, key, version, response.dict(exclude={"query"}))
 
 @app.post("/metadata-query", response_model=SearchResponse)
-async def metadata_search(input: QueryInput):
+async def metadata_search(input: QueryInput, request: Request):
+    user_query = input.query.strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+
+    key = result_cache_key("metadata-query", user_query, limit=input.limit, cursor=input.cursor, sort=input.sort)
+    version, cached = cached_response(key)
+    if cached is not None:
+        return SearchResponse(query=user_query, **cached)
+
+    try:
+        extracted_dict, extraction_path = await resolve_metadata_fields(user_query, refresh_facets(request.app).vocabulary)
+        metadata = MetadataFields(**extracted_dict)
+
+        if not metadata.has_filters():
+            response = SearchResponse(query=user_query, extraction_path=extraction_path, matched_images=[])
+        else:
+            with span("qdrant_scroll"):
+                results, next_cursor = search_metadata_page(metadata, limit=input.limit, cursor=input.cursor, sort=input.sort)
+            response = SearchResponse(
+                query=user_query,
+                extraction_path=extraction_path,
+                next_cursor=next_cursor,
+                matched_images=results,
+            )
+        store_response(version, key, response)
+        return response
+
+    except UpstreamError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+@app.post("/metadata-query/stream")
+async def metadata_search_stream(input: StreamQueryInput, request: Request):
+    """Stream every match as NDJSON, one result per line, batch by batch."""
     user_query = input.query.strip()
     if not user_query:
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
 
+    # Everything that can fail on the request itself happens before the 200 is sent;
+    # once streaming has started an error can only truncate the body
     try:
-        extracted_dict = await extract_fields_from_query(user_query)
+        extracted_dict, extraction_path = await resolve_metadata_fields(user_query, refresh_facets(request.app).vocabulary)
         metadata = MetadataFields(**extracted_dict)
+        if not metadata.has_filters():
+            raise HTTPException(status_code=422, detail="No metadata filters could be extracted from the query.")
+        filters = get_filter_for_metadata(metadata)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if not any(metadata.dict().values()):
-            return SearchResponse(query=user_query, matched_images=[])
+    def ndjson_lines():
+        for result in iter_metadata_matches(filters, sort=input.sort, max_results=input.limit):
+            yield json.dumps(result) + "\n"
 
-        results = search_by_metadata(metadata, limit=5)
-        return SearchResponse(query=user_query, matched_images=results)
+    # A sync generator is iterated in Starlette's threadpool, so the blocking
+    # scroll calls don't stall the event loop
+    return StreamingResponse(
+        ndjson_lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Extraction-Path": extraction_path},
+    )
 
+@app.post("/hybrid-query", response_model=HybridSearchResponse)
+async def hybrid_query(input: HybridQueryInput, request: Request):
+    """Metadata filter + semantic similarity in one Qdrant query."""
+    user_query = input.query.strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+
+    key = result_cache_key("hybrid-query", user_query, limit=input.limit, strict=input.strict)
+    version, cached = cached_response(key)
+    if cached is not None:
+        return HybridSearchResponse(query=user_query, **cached)
+
+    # Extraction and embedding are independent, so run them concurrently
+    async def timed_embedding():
+        with span("embedding"):
+            return await embed_query(user_query)
+
+    extraction, query_vector = await asyncio.gather(
+        resolve_metadata_fields(user_query, refresh_facets(request.app).vocabulary),
+        timed_embedding(),
+        return_exceptions=True,
+    )
+    if isinstance(query_vector, UpstreamError):
+        raise query_vector
+    if isinstance(query_vector, Exception):
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(query_vector)}")
+
+    filters = None
+    extraction_path = None
+    degraded = isinstance(extraction, Exception)
+    if degraded:
+        # Fall back to pure semantic search rather than failing the request
+        print(f"⚠️ Metadata extraction failed, running unfiltered: {extraction}")
+    else:
+        extracted_dict, extraction_path = extraction
+        try:
+            metadata = MetadataFields(**extracted_dict)
+            if metadata.has_filters():
+                with span("filter_build"):
+                    filters = get_filter_for_metadata(metadata)
+        except ValueError as e:
+            # e.g. out-of-range coordinates from the LLM, or only fields that don't filter
+            print(f"⚠️ Unusable metadata, running unfiltered: {e}")
+
+    try:
+        with span("qdrant_query"):
+            results = await hybrid_search(query_vector, filters, limit=input.limit, strict=input.strict)
+        response = HybridSearchResponse(
+            query=user_query,
+            extraction_path=extraction_path,
+            filter_applied=filters is not None,
+            matched_images=results,
+        )
+        # An unfiltered fallback after a failed extraction is not worth keeping
+        if not degraded:
+            store_response(version, key, response)
+        return response
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+@app.get("/facets")
+async def facets(request: Request, limit: int = Query(FACET_RESPONSE_LIMIT, ge=1)):
+    """Known values with photo counts per field, plus photos per year and month."""
+    return Response(content=refresh_facets(request.app).render(limit), media_type="application/json")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    stats = {
+        "extraction_cache": extraction_cache.stats(),
+        "filter_cache": filter_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+    }
+    if result_cache is not None:
+        stats["result_cache"] = result_cache.stats()
+    return stats
@@ -1,8 +1,14 @@
 import os
 import json
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 import re
+from typing import Dict, Tuple
+
+from common.facets import FACET_FIELDS, FacetCounts
+from common.normalize import normalize_query
+from common.upstream import Upstream, estimate_tokens
+from query_cache import extraction_cache
 
 load_dotenv()
 
@@ -10,45 +16,107 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
-client = AzureOpenAI(
+# Quota of the chat deployment available to this worker (0 = unlimited)
+AZURE_CHAT_RPM = float(os.getenv("AZURE_CHAT_RPM", 0))
+AZURE_CHAT_TPM = float(os.getenv("AZURE_CHAT_TPM", 0))
+EXTRACTION_MAX_TOKENS = 500
+# Most frequent values per field listed in the prompt (0 = list none)
+FACET_PROMPT_MAX_VALUES = int(os.getenv("FACET_PROMPT_MAX_VALUES", 25))
+
+# Async client so the chat completion can overlap with other awaits (e.g. embedding in /hybrid-query)
+client = AsyncAzureOpenAI(
     api_key=AZURE_OPENAI_API_KEY,
     api_version="2024-12-01-preview",
-    azure_endpoint=AZURE_OPENAI_ENDPOINT
+    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    max_retries=0,  # chat_upstream retries, within the request deadline
 )
+# Rate limits, retries and coalescing of identical in-flight extractions
+chat_upstream = Upstream("azure_chat", rpm=AZURE_CHAT_RPM, tpm=AZURE_CHAT_TPM)
 
-# This function will be imported in `main.py`
-async def extract_fields_from_query(query: str) -> dict:
-    metadata_fields = {
-        "title": "title of the image file",
-        "description": "description of the image",
-        "imageViews": "number of times image was viewed",
-        "timestamp": "UNIX timestamp when the photo was taken",
-        "formatted_time": "formatted human-readable date-time",
-        "latitude": "latitude where the photo was taken",
-        "longitude": "longitude where the photo was taken",
-        "altitude": "altitude where the photo was taken",
-        "appName": "application used to upload the photo",
-        "deviceType": "type of device (e.g., ANDROID_PHONE, IPHONE)",
-        "localFolderName": "folder name on device where photo was stored",
-        "persons": "full name of a person recognized in the image (e.g., 'john doe')",
+# The schema section of the prompt never changes, so it is rendered once at import
+METADATA_FIELDS = {
+    "title": "title of the image file",
+    "description": "description of the image",
+    "imageViews": "number of times image was viewed",
+    "timestamp": "UNIX timestamp when the photo was taken",
+    "formatted_time": "formatted human-readable date-time",
+    "near": "approximate coordinates {\"lat\": ..., \"lon\": ...} of a place the user mentions (e.g. 'near Paris')",
+    "radius_km": "distance in km around `near` if the user gives one (e.g. 'within 10 km')",
+    "bbox": "{\"north\", \"south\", \"west\", \"east\"} in degrees for a whole region or country (instead of `near`)",
+    "appName": "application used to upload the photo",
+    "deviceType": "type of device (e.g., ANDROID_PHONE, IPHONE)",
+    "localFolderName": "folder name on device where photo was stored",
+    "persons": "full name of a person recognized in the image (e.g., 'john doe'), or a list of names",
+    "persons_mode": "'all' if every listed person must be in the photo (e.g. 'john and jane together'), else 'any'",
+}
+
+PROMPT_PREFIX = (
+    f"You are an assistant that extracts structured metadata filters from a user query "
+    f"about photos. Return only a JSON object with keys from this schema if present:\n"
+    f"{json.dumps(METADATA_FIELDS, indent=2)}\n\n"
+)
+PROMPT_SUFFIX = "\n\nOnly return valid JSON. Do not include markdown formatting or explanations."
+
+# Known values of the exact-match fields, set from the facet index by `set_known_values`.
+# They go into the prompt so the LLM picks spellings that exist, and extracted values are
+# mapped back to their stored spelling (lower-case name -> value as stored).
+prompt_prefix = PROMPT_PREFIX
+canonical_values: Dict[str, Dict[str, str]] = {}
+CANONICAL_FIELDS = ("deviceType", "appName", "localFolderName")
+
+
+def set_known_values(facets: FacetCounts):
+    """Re-render the prompt with the values (and years) that exist in the collection."""
+    global prompt_prefix, canonical_values
+    canonical_values = {
+        field: {value.lower(): value for value in facets.counts[field]} for field in CANONICAL_FIELDS
     }
+    lines = []
+    if FACET_PROMPT_MAX_VALUES > 0:
+        for field in FACET_FIELDS:
+            values = [value for value, _ in facets.top(field, FACET_PROMPT_MAX_VALUES)]
+            if values:
+                lines.append(f"- {field}: {json.dumps(values)}")
+        years = list(facets.years())
+        if years:
+            lines.append(f"- photos exist for the years: {', '.join(years)}")
+    prompt_prefix = PROMPT_PREFIX
+    if lines:
+        prompt_prefix += (
+            "Values that exist in the collection, most frequent first. When the query refers to one "
+            "of them, use it with exactly this spelling:\n" + "\n".join(lines) + "\n\n"
+        )
 
-    prompt = (
-        f"You are an assistant that extracts structured metadata filters from a user query "
-        f"about photos. Return only a JSON object with keys from this schema if present:\n"
-        f"{json.dumps(metadata_fields, indent=2)}\n\n"
-        f"User Query: {query}\n\n"
-        f"Only return valid JSON. Do not include markdown formatting or explanations."
-    )
 
-    response = client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT_NAME,
-        messages=[
-            {"role": "system", "content": "You extract metadata filters from user queries about photos."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.2,
-        max_tokens=500
+def canonicalize(extracted: dict) -> dict:
+    """Replace known values spelled differently (e.g. 'iphone') with the stored spelling."""
+    for field in CANONICAL_FIELDS:
+        value = extracted.get(field)
+        if isinstance(value, str):
+            extracted[field] = canonical_values.get(field, {}).get(value.strip().lower(), value)
+    return extracted
+
+
+MARKDOWN_FENCE_START = re.compile(r"^```[a-z]*\n")
+MARKDOWN_FENCE_END = re.compile(r"\n```$")
+
+# This function will be imported in `main.py`
+async def extract_fields_from_query(query: str) -> dict:
+    prompt = f"{prompt_prefix}User Query: {query}{PROMPT_SUFFIX}"
+
+    response = await chat_upstream.call(
+        lambda: client.chat.completions.create(
+            model=AZURE_OPENAI_DEPLOYMENT_NAME,
+            messages=[
+                {"role": "system", "content": "You extract metadata filters from user queries about photos."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=EXTRACTION_MAX_TOKENS
+        ),
+        key=("extraction", query),
+        # Azure counts max_tokens against the TPM quota up front
+        tokens=estimate_tokens(prompt) + EXTRACTION_MAX_TOKENS,
     )
 
     content = response.choices[0].message.content.strip()
@@ -56,12 +124,27 @@ async def extract_fields_from_query(query: str) -> dict:
 
     # --- New: Clean up markdown wrapping ---
     if content.startswith("```json") or content.startswith("```"):
-        content = re.sub(r"^```[a-z]*\n", "", content.strip())  # remove starting ```json
-        content = re.sub(r"\n```$", "", content.strip())         # remove ending ```
+        content = MARKDOWN_FENCE_START.sub("", content.strip())  # remove starting ```json
+        content = MARKDOWN_FENCE_END.sub("", content.strip())    # remove ending ```
         print("🧹 Cleaned content:\n", content)
 
     try:
         parsed = json.loads(content)
-        return parsed
     except json.JSONDecodeError:
-        raise ValueError(f"LLM did not return valid JSON. Cleaned content:\n{content}")
\ No newline at end of file
+        raise ValueError(f"LLM did not return valid JSON. Cleaned content:\n{content}")
+    return canonicalize(parsed) if isinstance(parsed, dict) else parsed
+
+
+async def extract_fields_cached(query: str) -> Tuple[dict, bool]:
+    """
+    Like `extract_fields_from_query`, but answers known queries from the cache.
+    Returns the extracted fields and whether they came from the cache.
+    """
+    key = normalize_query(query)
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        return dict(cached), True
+
+    extracted = await extract_fields_from_query(query)
+    extraction_cache.put(key, extracted)
+    return extracted, False
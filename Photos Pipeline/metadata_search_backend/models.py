@@ -1,10 +1,29 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal, Optional, List, Union
+
+class GeoPoint(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+class BoundingBox(BaseModel):
+    north: float = Field(..., ge=-90, le=90)
+    south: float = Field(..., ge=-90, le=90)
+    west: float = Field(..., ge=-180, le=180)
+    east: float = Field(..., ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def check_latitudes(self) -> "BoundingBox":
+        # An inverted box is accepted by Qdrant but matches nothing
+        if self.north < self.south:
+            raise ValueError(f"bbox north ({self.north}) must not be south of south ({self.south})")
+        return self
 
 class MetadataFields(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     person: Optional[str] = None  # Will match against 'persons' list in Qdrant
+    persons: Optional[Union[str, List[str]]] = None  # one or several names, combined per `persons_mode`
+    persons_mode: Literal["any", "all"] = "any"
     deviceType: Optional[str] = None
     appName: Optional[str] = None
     localFolderName: Optional[str] = None
@@ -13,22 +32,49 @@ class MetadataFields(BaseModel):
     longitude: Optional[float] = None
     altitude: Optional[float] = None
 
+    # Matched against the geo-indexed `location` payload field
+    near: Optional[GeoPoint] = None
+    radius_km: Optional[float] = Field(None, gt=0)  # around `near` (or latitude/longitude)
+    bbox: Optional[BoundingBox] = None
+
     timestamp: Optional[int] = None
     timestamp_before: Optional[int] = None
     timestamp_after: Optional[int] = None
 
+    def has_filters(self) -> bool:
+        """Whether build_filter_from_metadata has a condition to build."""
+        # persons_mode and radius_km only qualify other fields; altitude is not filtered on,
+        # and latitude/longitude only count as a pair (the centre of a radius search)
+        qualifiers = {"persons_mode", "radius_km", "altitude", "latitude", "longitude"}
+        # 0 is a valid timestamp (1970-01-01), so those only count as unset when None
+        return any(
+            value is not None if name.startswith("timestamp") else value
+            for name, value in self.dict(exclude=qualifiers).items()
+        ) or (self.latitude is not None and self.longitude is not None)
+
 class ImageResult(BaseModel):
     image_url: str
     summary: str
 
+class ScoredImageResult(ImageResult):
+    score: float
+
 class QueryRequest(BaseModel):
     query: str
 
 class SearchResponse(BaseModel):
     query: str
+    extraction_path: Optional[str] = None  # "rules", "cache" or "llm"
+    next_cursor: Optional[str] = None  # pass back as `cursor` to fetch the next page
     matched_images: List[ImageResult] = Field(..., example=[
         {
             "image_url": "https://photos.google.com/photo/abc123",
             "summary": "A lion roaring in the wild"
         }
     ])
+
+class HybridSearchResponse(BaseModel):
+    query: str
+    extraction_path: Optional[str] = None
+    filter_applied: bool = False
+    matched_images: List[ScoredImageResult] = []
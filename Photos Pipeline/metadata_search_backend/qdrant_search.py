@@ -1,15 +1,45 @@
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue, Range
-from typing import List
+from qdrant_client.http.models import (
+    Filter, FieldCondition, MatchAny, MatchText, MatchValue, Range, OrderBy, Direction, HasIdCondition,
+    GeoBoundingBox, GeoPoint, GeoRadius, PayloadSchemaType,
+)
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from models import MetadataFields
+from query_cache import filter_cache, metadata_cache_key
+import base64
+import json
 import os
 
 load_dotenv()
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "http://localhost:6333")
+# Alias maintained by QdrantDB/migrate_collection.py, so schema migrations never interrupt search
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "secure_photos")
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 256))
+# Radius used when a query names a place ("photos near Paris") without a distance
+DEFAULT_RADIUS_KM = float(os.getenv("DEFAULT_RADIUS_KM", 25))
+
+# "newest"/"oldest" rank by the indexed `timestamp` field; "none" keeps Qdrant's id order,
+# which is the cheapest way to page through a whole result set
+SORT_MODES = ("newest", "oldest", "none")
+RESULT_PAYLOAD_FIELDS = ["url", "summary", "timestamp"]
+
+# How each string field is matched, following its payload index:
+#   text    - MatchText: every word of the value must occur in the field, case-insensitive
+#             (update_qdrant_schema.py word-tokenizes these; description/persons are text from the start)
+#   keyword - MatchValue on the exact value, MatchAny when any of several values may match
+# load_match_modes() replaces these defaults with what the collection actually has indexed.
+DEFAULT_MATCH_MODES = {
+    "title": "text",
+    "description": "text",
+    "deviceType": "text",
+    "appName": "text",
+    "localFolderName": "text",
+    "persons": "text",
+}
+match_modes: Dict[str, str] = dict(DEFAULT_MATCH_MODES)
 
 # ✅ Parse host and port correctly
 parsed = urlparse(QDRANT_HOST)
@@ -17,43 +47,80 @@ host = parsed.hostname or "localhost"
 port = parsed.port or 6333
 
 # ✅ Initialize client safely
-qdrant = QdrantClient(host=host, port=port)
+# QDRANT_HOST=":memory:" runs an in-process Qdrant (used by the benchmarks)
+qdrant = QdrantClient(location=":memory:") if QDRANT_HOST == ":memory:" else QdrantClient(host=host, port=port)
+
+def load_match_modes(client: QdrantClient, collection_name: str) -> Dict[str, str]:
+    """Match mode per filterable field, from the collection's payload index types."""
+    payload_schema = client.get_collection(collection_name).payload_schema or {}
+    modes = dict(DEFAULT_MATCH_MODES)
+    for field in modes:
+        index = payload_schema.get(field)
+        if index is not None:
+            modes[field] = "text" if index.data_type == PayloadSchemaType.TEXT else "keyword"
+    return modes
+
+def set_match_modes(modes: Dict[str, str]):
+    match_modes.clear()
+    match_modes.update(modes)
+    # Cached filters were built with the previous modes
+    filter_cache.clear()
+
+def match_condition(field: str, values: List[str], require_all: bool = True) -> Optional[Union[FieldCondition, Filter]]:
+    """
+    One condition matching `values` on `field` in the way its index supports. With
+    several values, require_all needs every one of them (must), otherwise any (should).
+    """
+    values = [value for value in values if value]
+    if not values:
+        return None
+    if match_modes.get(field, "keyword") == "text":
+        conditions = [FieldCondition(key=field, match=MatchText(text=value)) for value in values]
+    elif len(values) > 1 and not require_all:
+        return FieldCondition(key=field, match=MatchAny(any=values))
+    else:
+        conditions = [FieldCondition(key=field, match=MatchValue(value=value)) for value in values]
+    if len(conditions) == 1:
+        return conditions[0]
+    return Filter(must=conditions) if require_all else Filter(should=conditions)
+
+def requested_persons(metadata: MetadataFields) -> List[str]:
+    """`person` plus `persons` (a name or a list), lower-cased like the stored payload."""
+    persons = metadata.persons or []
+    if isinstance(persons, str):
+        persons = [persons]
+    if metadata.person:
+        persons = [metadata.person] + list(persons)
+    return list(dict.fromkeys(p.strip().lower() for p in persons if p and p.strip()))
 
 def build_filter_from_metadata(metadata: MetadataFields) -> Filter:
     must_conditions = []
 
     # Match fields
     for field in ["title", "description", "deviceType", "appName", "localFolderName"]:
-        value = getattr(metadata, field)
-        if value:
-            must_conditions.append(
-                FieldCondition(key=field, match=MatchValue(value=value))
-            )
+        condition = match_condition(field, [getattr(metadata, field)])
+        if condition is not None:
+            must_conditions.append(condition)
 
-    # Person (matched against "persons" list)
-    if metadata.person:
-        must_conditions.append(
-            FieldCondition(key="persons", match=MatchValue(value=metadata.person.lower()))
-        )
+    # Persons (matched against the "persons" list): everyone, or any one of them
+    condition = match_condition("persons", requested_persons(metadata), require_all=metadata.persons_mode == "all")
+    if condition is not None:
+        must_conditions.append(condition)
 
-    # Geo fields
-    for field in ["latitude", "longitude", "altitude"]:
-        value = getattr(metadata, field)
-        if value is not None:
-            must_conditions.append(
-                FieldCondition(key=field, match=MatchValue(value=value))
-            )
+    # Location (geo index on `location`)
+    must_conditions.extend(build_geo_conditions(metadata))
 
     # Timestamp
-    if metadata.timestamp:
+    # Compared with None: 0 (1970-01-01) is a valid bound
+    if metadata.timestamp is not None:
         must_conditions.append(FieldCondition(
             key="timestamp", match=MatchValue(value=metadata.timestamp)
         ))
-    elif metadata.timestamp_before or metadata.timestamp_after:
+    elif metadata.timestamp_before is not None or metadata.timestamp_after is not None:
         time_range = {}
-        if metadata.timestamp_after:
+        if metadata.timestamp_after is not None:
             time_range["gte"] = metadata.timestamp_after
-        if metadata.timestamp_before:
+        if metadata.timestamp_before is not None:
             time_range["lte"] = metadata.timestamp_before
         must_conditions.append(FieldCondition(key="timestamp", range=Range(**time_range)))
 
@@ -62,26 +129,162 @@ def build_filter_from_metadata(metadata: MetadataFields) -> Filter:
 
     return Filter(must=must_conditions)
 
-def search_by_metadata(metadata: MetadataFields, limit: int = 5) -> List[dict]:
-    try:
+def build_geo_conditions(metadata: MetadataFields) -> List[FieldCondition]:
+    """
+    Radius and bounding-box conditions on the geo-indexed `location` field. A bare
+    latitude/longitude pair is treated as the centre of a DEFAULT_RADIUS_KM search:
+    exact float matches on coordinates never hit anything.
+    """
+    conditions = []
+    center = metadata.near
+    if center is None and metadata.latitude is not None and metadata.longitude is not None:
+        center = GeoPoint(lat=metadata.latitude, lon=metadata.longitude)
+    if center is not None:
+        radius_km = metadata.radius_km or DEFAULT_RADIUS_KM
+        conditions.append(FieldCondition(
+            key="location",
+            geo_radius=GeoRadius(center=GeoPoint(lat=center.lat, lon=center.lon), radius=radius_km * 1000),
+        ))
+    if metadata.bbox is not None:
+        box = metadata.bbox
+        conditions.append(FieldCondition(
+            key="location",
+            geo_bounding_box=GeoBoundingBox(
+                top_left=GeoPoint(lat=box.north, lon=box.west),
+                bottom_right=GeoPoint(lat=box.south, lon=box.east),
+            ),
+        ))
+    return conditions
+
+def get_filter_for_metadata(metadata: MetadataFields) -> Filter:
+    """Cached `build_filter_from_metadata`; callers must not mutate the result."""
+    key = metadata_cache_key(metadata)
+    filters = filter_cache.get(key)
+    if filters is None:
         filters = build_filter_from_metadata(metadata)
+        filter_cache.put(key, filters)
+    return filters
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid pagination cursor.")
+    # Only what _scroll_page writes: a tampered cursor must be a 400, not a 500 later on
+    if (
+        not isinstance(state, dict)
+        or not set(state) <= {"sort", "offset", "ts", "ids"}
+        or state.get("sort", "none") not in SORT_MODES
+        or not isinstance(state.get("offset"), (int, str, type(None)))
+        or not isinstance(state.get("ts"), (int, float, type(None)))
+        or not isinstance(state.get("ids", []), list)
+    ):
+        raise ValueError("Invalid pagination cursor.")
+    return state
+
+def _to_image_results(points) -> List[dict]:
+    matched = []
+    for point in points:
+        payload = point.payload
+        if payload.get("url") and payload.get("summary"):
+            matched.append({
+                "image_url": payload["url"],
+                "summary": payload["summary"]
+            })
+    return matched
 
-        results, _ = qdrant.scroll(
+def _scroll_page(filters: Filter, limit: int, sort: str, state: dict) -> Tuple[List[dict], Optional[dict]]:
+    """Fetch one page and return its results plus the state needed to fetch the next one."""
+    if sort == "none":
+        points, next_offset = qdrant.scroll(
             collection_name=COLLECTION_NAME,
             scroll_filter=filters,
             limit=limit,
-            with_payload=True
+            offset=state.get("offset"),
+            with_payload=RESULT_PAYLOAD_FIELDS,
+            with_vectors=False,
+        )
+        next_state = {"sort": sort, "offset": next_offset} if next_offset is not None else None
+        return _to_image_results(points), next_state
+
+    # Ordered scrolls don't return a next-page offset, so resume from the last
+    # timestamp seen and exclude the points already returned at that timestamp.
+    seen_ids = state.get("ids", [])
+    page_filter = filters
+    if seen_ids:
+        page_filter = Filter(
+            must=filters.must,
+            should=filters.should,
+            must_not=list(filters.must_not or []) + [HasIdCondition(has_id=seen_ids)],
         )
+    points, _ = qdrant.scroll(
+        collection_name=COLLECTION_NAME,
+        scroll_filter=page_filter,
+        limit=limit,
+        order_by=OrderBy(
+            key="timestamp",
+            direction=Direction.DESC if sort == "newest" else Direction.ASC,
+            start_from=state.get("ts"),
+        ),
+        with_payload=RESULT_PAYLOAD_FIELDS,
+        with_vectors=False,
+    )
+
+    next_state = None
+    if len(points) == limit:
+        last_ts = points[-1].payload.get("timestamp")
+        ids_at_last_ts = [point.id for point in points if point.payload.get("timestamp") == last_ts]
+        if last_ts == state.get("ts"):
+            ids_at_last_ts = seen_ids + ids_at_last_ts
+        next_state = {"sort": sort, "ts": last_ts, "ids": ids_at_last_ts}
+    return _to_image_results(points), next_state
+
+def search_metadata_page(
+    metadata: MetadataFields, limit: int = 5, cursor: Optional[str] = None, sort: str = "newest"
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Return one ranked page of matches and an opaque cursor for the next page
+    (None when there are no more results). Points without a `timestamp` are
+    only reachable with sort="none".
+    """
+    state = {}
+    if cursor:
+        state = decode_cursor(cursor)
+        sort = state.get("sort", sort)
+    if sort not in SORT_MODES:
+        raise ValueError(f"Unknown sort mode '{sort}'. Expected one of {SORT_MODES}.")
 
-        matched = []
-        for point in results:
-            payload = point.payload
-            if payload.get("url") and payload.get("summary"):
-                matched.append({
-                    "image_url": payload["url"],
-                    "summary": payload["summary"]
-                })
+    filters = get_filter_for_metadata(metadata)
+    matched, next_state = _scroll_page(filters, limit, sort, state)
+    return matched, encode_cursor(next_state) if next_state else None
 
+def iter_metadata_matches(
+    filters: Filter, sort: str = "none", max_results: Optional[int] = None, batch_size: int = STREAM_BATCH_SIZE
+) -> Iterator[dict]:
+    """
+    Yield matches batch by batch as Qdrant returns them, without holding the full
+    result set. `filters` comes from get_filter_for_metadata, built by the caller
+    so invalid metadata is rejected before anything is streamed.
+    """
+    state = {}
+    yielded = 0
+    while True:
+        page_size = batch_size if max_results is None else min(batch_size, max_results - yielded)
+        if page_size <= 0:
+            return
+        matched, state = _scroll_page(filters, page_size, sort, state)
+        for result in matched:
+            yield result
+        yielded += len(matched)
+        if state is None:
+            return
+
+def search_by_metadata(metadata: MetadataFields, limit: int = 5) -> List[dict]:
+    try:
+        matched, _ = search_metadata_page(metadata, limit=limit)
         return matched
 
     except Exception as e:
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+from common.embedding_cache import EmbeddingCache
+from common.result_cache import ResultCache
+
+load_dotenv()
+
+# --- Configuration ---
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", 5000))
+EXTRACTION_CACHE_TTL_SECONDS = float(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+FILTER_CACHE_MAX_ENTRIES = int(os.getenv("FILTER_CACHE_MAX_ENTRIES", 5000))
+FILTER_CACHE_TTL_SECONDS = float(os.getenv("FILTER_CACHE_TTL_SECONDS", 24 * 3600))
+# Opt-in: persist extracted metadata so warm restarts skip the LLM for known queries
+METADATA_CACHE_PATH = os.getenv("METADATA_CACHE_PATH")
+# Opt-in: full responses shared by all workers, invalidated when ingestion or the
+# schema tools bump the collection version (see common/result_cache.py)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH")
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl_seconds`.
+
+    With `persist_path` set, values (which must be JSON-serializable) are also
+    written to a SQLite table and reloaded on startup.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, persist_path: Optional[str] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._load_persisted()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._insert(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.name} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.name}")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _insert(self, key: str, expires_at: float, value: Any):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_persisted(self):
+        now = time.time()
+        self._db.execute(f"DELETE FROM {self.name} WHERE expires_at <= ?", (now,))
+        self._db.commit()
+        rows = self._db.execute(
+            f"SELECT key, value, expires_at FROM {self.name} ORDER BY expires_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, value, expires_at in reversed(rows):
+            self._insert(key, expires_at, json.loads(value))
+
+
+# Level 1: normalized query -> extracted MetadataFields dict (optionally on disk)
+extraction_cache = TTLCache(
+    "metadata_extraction",
+    max_entries=EXTRACTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=EXTRACTION_CACHE_TTL_SECONDS,
+    persist_path=METADATA_CACHE_PATH,
+)
+
+# Level 2: canonical MetadataFields -> compiled Qdrant Filter (in memory only;
+# it is cheap to rebuild from a level 1 hit)
+filter_cache = TTLCache(
+    "metadata_filter",
+    max_entries=FILTER_CACHE_MAX_ENTRIES,
+    ttl_seconds=FILTER_CACHE_TTL_SECONDS,
+)
+
+
+# Level 0: (endpoint, normalized query, paging/limit) -> response of the current collection version
+result_cache = ResultCache(RESULT_CACHE_PATH) if RESULT_CACHE_PATH else None
+
+# /hybrid-query: (embedding model, normalized query) -> vector, the same cache and
+# keys as the rag service (EMBEDDING_CACHE_* settings, see common/embedding_cache.py)
+embedding_cache = EmbeddingCache.from_env()
+
+
+def metadata_cache_key(metadata) -> str:
+    """Canonical key for a MetadataFields instance (unset fields ignored)."""
+    return json.dumps({k: v for k, v in metadata.dict().items() if v is not None}, sort_keys=True)
@@ -0,0 +1,258 @@
+"""
+Deterministic fast-path extractor for simple metadata queries.
+
+Turns queries like "photos from IPHONE in May 2023" or "pictures of john doe in
+folder Camera" into MetadataFields without an LLM round-trip. It recognises
+date phrases (compiled into timestamp_after / timestamp_before), and values of
+deviceType / appName / localFolderName / persons that actually exist in the
+collection. Folder and app values only count after (or before) a cue word
+("in folder Camera", "from app com.whatsapp", "Camera folder"), and values that
+are ordinary query words (filler, month and date words) are never matched, so a
+folder called "Pictures" or a person called "May" can't silently turn a query
+into a wrong filter. Whatever is left of the query after removing recognised spans and
+filler words decides the confidence; callers fall back to the LLM when it is low.
+"""
+import re
+from calendar import monthrange
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+# Payload field -> MetadataFields attribute
+VOCABULARY_FIELDS = {
+    "deviceType": "deviceType",
+    "appName": "appName",
+    "localFolderName": "localFolderName",
+    "persons": "person",
+}
+
+# Colloquial device names -> candidate deviceType values in the payload
+DEVICE_ALIASES = {
+    "iphone": ("IPHONE", "IOS_PHONE"),
+    "ipad": ("IPAD", "IOS_TABLET"),
+    "android": ("ANDROID_PHONE",),
+    "android phone": ("ANDROID_PHONE",),
+}
+
+FILLER_WORDS = {
+    "a", "all", "an", "and", "any", "app", "at", "by", "captured", "device", "during",
+    "find", "folder", "from", "get", "image", "images", "in", "list", "me", "my", "of", "on",
+    "photo", "photos", "pic", "pics", "picture", "pictures", "shot", "show", "some", "taken",
+    "that", "the", "uploaded", "using", "via", "was", "were", "which", "with",
+}
+
+# Cue words required next to a value of these fields, before ("folder X") or after ("X folder")
+FIELD_CUES = {
+    "localFolderName": ("folder", "album", "directory"),
+    "appName": ("app", "application"),
+}
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sept": 9, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH_ALT = "|".join(sorted(MONTHS, key=len, reverse=True))
+_ORDINAL = r"(?:st|nd|rd|th)?"
+
+# A single absolute date expression: ISO day, "12 May 2023", "May 12, 2023", "May 2023" or "2023"
+DATE_EXPR = (
+    rf"(?:\d{{4}}-\d{{2}}-\d{{2}}"
+    rf"|\d{{1,2}}{_ORDINAL}\s+(?:{_MONTH_ALT})\s+\d{{4}}"
+    rf"|(?:{_MONTH_ALT})\s+\d{{1,2}}{_ORDINAL},?\s+\d{{4}}"
+    rf"|(?:{_MONTH_ALT})\s+\d{{4}}"
+    rf"|(?:19|20)\d{{2}})"
+)
+RANGE_PATTERN = re.compile(rf"\b(?:between|from)\s+({DATE_EXPR})\s+(?:and|to|until|through)\s+({DATE_EXPR})\b")
+BOUND_PATTERN = re.compile(rf"\b(before|after|since|until)\s+({DATE_EXPR})\b")
+SINGLE_PATTERN = re.compile(rf"\b(?:(?:in|during|on|from)\s+)?({DATE_EXPR})\b")
+RELATIVE_PATTERN = re.compile(r"\b(today|yesterday|(?:this|last)\s+(?:week|month|year))\b")
+
+# Query words a vocabulary value must not be: matching them would read ordinary
+# phrasing ("pictures of ...", "photos of may ...") as a filter
+RESERVED_WORDS = FILLER_WORDS | set(MONTHS) | {
+    "after", "before", "between", "during", "last", "month", "since", "this", "to", "today",
+    "until", "week", "year", "yesterday",
+}
+
+FAST_PATH_MIN_CONFIDENCE = 1.0
+
+
+@dataclass
+class FastPathResult:
+    fields: Dict[str, object] = field(default_factory=dict)
+    confidence: float = 0.0
+
+    def is_confident(self, threshold: float = FAST_PATH_MIN_CONFIDENCE) -> bool:
+        return bool(self.fields) and self.confidence >= threshold
+
+
+class Vocabulary:
+    """Known payload values per field, compiled into one case-insensitive regex per field."""
+
+    def __init__(self, values: Optional[Dict[str, Iterable[str]]] = None):
+        self.canonical: Dict[str, Dict[str, str]] = {}
+        self.patterns: Dict[str, re.Pattern] = {}
+        for payload_field, field_values in (values or {}).items():
+            lookup = {
+                str(v).strip().lower(): str(v).strip()
+                for v in field_values
+                if v and str(v).strip() and str(v).strip().lower() not in RESERVED_WORDS
+            }
+            if not lookup:
+                continue
+            alternation = "|".join(re.escape(v) for v in sorted(lookup, key=len, reverse=True))
+            self.canonical[payload_field] = lookup
+            cues = FIELD_CUES.get(payload_field)
+            if cues:
+                cue = "|".join(cues)
+                self.patterns[payload_field] = re.compile(
+                    rf"(?<!\w)(?:(?:{cue})\s+(?:named\s+|called\s+)?(?P<after>{alternation})"
+                    rf"|(?P<before>{alternation})\s+(?:{cue}))(?!\w)"
+                )
+            else:
+                self.patterns[payload_field] = re.compile(rf"(?<!\w)(?P<value>{alternation})(?!\w)")
+
+    def match(self, payload_field: str, text: str) -> Optional[Tuple[str, Tuple[int, int]]]:
+        pattern = self.patterns.get(payload_field)
+        if pattern is None:
+            return None
+        found = pattern.search(text)
+        if not found:
+            return None
+        value = next(group for group in found.groups() if group is not None)
+        # The span covers the cue word too; it is filler either way
+        return self.canonical[payload_field][value], found.span()
+
+    def resolve_device_alias(self, text: str) -> Optional[Tuple[str, Tuple[int, int]]]:
+        known = self.canonical.get("deviceType", {})
+        for alias in sorted(DEVICE_ALIASES, key=len, reverse=True):
+            found = re.search(rf"\b{re.escape(alias)}s?\b", text)
+            if not found:
+                continue
+            for candidate in DEVICE_ALIASES[alias]:
+                if candidate.lower() in known:
+                    return known[candidate.lower()], found.span()
+        return None
+
+
+# --- Date helpers (all timestamps are UTC epoch seconds, like the Takeout sidecars) ---
+def _epoch(dt: datetime) -> int:
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _date_expr_range(expr: str) -> Tuple[int, int]:
+    """Return the [start, end) epoch range covered by a DATE_EXPR match."""
+    expr = expr.replace(",", " ")
+    iso = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", expr)
+    if iso:
+        start = datetime(int(iso.group(1)), int(iso.group(2)), int(iso.group(3)))
+        return _epoch(start), _epoch(start + timedelta(days=1))
+
+    tokens = expr.split()
+    if len(tokens) == 1:
+        year = int(tokens[0])
+        return _epoch(datetime(year, 1, 1)), _epoch(datetime(year + 1, 1, 1))
+
+    year = int(tokens[-1])
+    if len(tokens) == 2:
+        month = MONTHS[tokens[0]]
+        days = monthrange(year, month)[1]
+        start = datetime(year, month, 1)
+        return _epoch(start), _epoch(start + timedelta(days=days))
+
+    if tokens[0] in MONTHS:
+        month, day = MONTHS[tokens[0]], tokens[1]
+    else:
+        day, month = tokens[0], MONTHS[tokens[1]]
+    start = datetime(year, month, int(re.sub(r"\D", "", day)))
+    return _epoch(start), _epoch(start + timedelta(days=1))
+
+
+def _relative_range(phrase: str, now: datetime) -> Tuple[int, int]:
+    today = datetime(now.year, now.month, now.day)
+    phrase = " ".join(phrase.split())
+    if phrase == "today":
+        return _epoch(today), _epoch(today + timedelta(days=1))
+    if phrase == "yesterday":
+        return _epoch(today - timedelta(days=1)), _epoch(today)
+    if phrase.endswith("week"):
+        start = today - timedelta(days=today.weekday())
+        if phrase.startswith("last"):
+            start -= timedelta(days=7)
+        return _epoch(start), _epoch(start + timedelta(days=7))
+    if phrase.endswith("month"):
+        year, month = today.year, today.month
+        if phrase.startswith("last"):
+            year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        start = datetime(year, month, 1)
+        return _epoch(start), _epoch(start + timedelta(days=monthrange(year, month)[1]))
+    year = today.year - 1 if phrase.startswith("last") else today.year
+    return _epoch(datetime(year, 1, 1)), _epoch(datetime(year + 1, 1, 1))
+
+
+def _extract_dates(text: str, now: datetime) -> Tuple[Dict[str, int], list]:
+    """Return timestamp bounds and the spans they were read from."""
+    found = RANGE_PATTERN.search(text)
+    if found:
+        start, _ = _date_expr_range(found.group(1))
+        _, end = _date_expr_range(found.group(2))
+        return {"timestamp_after": start, "timestamp_before": end - 1}, [found.span()]
+
+    found = BOUND_PATTERN.search(text)
+    if found:
+        start, end = _date_expr_range(found.group(2))
+        if found.group(1) in ("before", "until"):
+            bound = {"timestamp_before": (start if found.group(1) == "before" else end) - 1}
+        else:
+            bound = {"timestamp_after": end if found.group(1) == "after" else start}
+        return bound, [found.span()]
+
+    found = RELATIVE_PATTERN.search(text)
+    if found:
+        start, end = _relative_range(found.group(1), now)
+        return {"timestamp_after": start, "timestamp_before": end - 1}, [found.span()]
+
+    found = SINGLE_PATTERN.search(text)
+    if found:
+        start, end = _date_expr_range(found.group(1))
+        return {"timestamp_after": start, "timestamp_before": end - 1}, [found.span()]
+
+    return {}, []
+
+
+def _blank_spans(text: str, spans: list) -> str:
+    chars = list(text)
+    for start, end in spans:
+        chars[start:end] = " " * (end - start)
+    return "".join(chars)
+
+
+def parse_query(query: str, vocabulary: Optional[Vocabulary] = None, now: Optional[datetime] = None) -> FastPathResult:
+    vocabulary = vocabulary or Vocabulary()
+    now = now or datetime.now(timezone.utc)
+    text = " ".join(query.lower().split())
+    tokens_total = len(re.findall(r"\w+", text))
+    if not tokens_total:
+        return FastPathResult()
+
+    try:
+        fields, spans = _extract_dates(text, now)
+    except (ValueError, KeyError):
+        # e.g. "31 feb 2023" - leave it to the LLM
+        return FastPathResult()
+    text = _blank_spans(text, spans)
+
+    for payload_field, attribute in VOCABULARY_FIELDS.items():
+        matched = vocabulary.match(payload_field, text)
+        if matched is None and payload_field == "deviceType":
+            matched = vocabulary.resolve_device_alias(text)
+        if matched is not None:
+            value, span = matched
+            fields[attribute] = value.lower() if attribute == "person" else value
+            text = _blank_spans(text, [span])
+
+    leftover = [token for token in re.findall(r"\w+", text) if token not in FILLER_WORDS]
+    confidence = 1.0 - len(leftover) / tokens_total
+    return FastPathResult(fields=fields, confidence=round(confidence, 3))
@@ -0,0 +1,55 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Shared helpers live in Photos Pipeline/common (imported by qdrant_search via query_cache)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import MetadataFields
+from qdrant_search import build_filter_from_metadata
+from rule_parser import Vocabulary, parse_query
+
+NOW = datetime(2024, 6, 15, tzinfo=timezone.utc)
+
+VOCABULARY = Vocabulary({
+    "deviceType": ["IOS_PHONE", "ANDROID_PHONE"],
+    "appName": ["com.whatsapp"],
+    "localFolderName": ["Camera", "Pictures", "Screenshots"],
+    "persons": ["john doe", "may", "alex kim"],
+})
+
+
+def test_folder_needs_a_cue_word():
+    result = parse_query("pictures of john doe", VOCABULARY, NOW)
+    assert result.fields == {"person": "john doe"}
+    assert result.is_confident()
+
+    result = parse_query("screenshots of alex kim", VOCABULARY, NOW)
+    assert "localFolderName" not in result.fields
+
+    assert parse_query("photos in folder Camera", VOCABULARY, NOW).fields == {"localFolderName": "Camera"}
+    assert parse_query("screenshots folder photos", VOCABULARY, NOW).fields == {"localFolderName": "Screenshots"}
+
+
+def test_app_needs_a_cue_word():
+    assert "appName" not in parse_query("photos com.whatsapp", VOCABULARY, NOW).fields
+    assert parse_query("photos from app com.whatsapp", VOCABULARY, NOW).fields == {"appName": "com.whatsapp"}
+
+
+def test_values_that_are_query_words_are_not_matched():
+    vocabulary = Vocabulary({"localFolderName": ["Pictures"], "persons": ["may", "photos"]})
+    assert "pictures" not in vocabulary.canonical.get("localFolderName", {})
+
+    result = parse_query("photos of may at the beach", vocabulary, NOW)
+    assert "person" not in result.fields
+    assert not result.is_confident()
+
+
+def test_bound_at_epoch_zero_is_kept():
+    result = parse_query("photos since 1970", VOCABULARY, NOW)
+    assert result.fields == {"timestamp_after": 0}
+
+    metadata = MetadataFields(**result.fields)
+    assert metadata.has_filters()
+    condition = build_filter_from_metadata(metadata).must[0]
+    assert condition.range.gte == 0
@@ -4,6 +4,33 @@ import requests
 st.set_page_config(page_title="📷 Metadata Search", layout="wide")
 st.title("🔎 SecurePhotos: Metadata Search")
 
+
+@st.cache_data(ttl=60)
+def load_facets():
+    response = requests.get("http://localhost:8000/facets", params={"limit": 20})
+    response.raise_for_status()
+    return response.json()
+
+
+# What the collection can be filtered by, most frequent values first
+with st.sidebar:
+    st.header("Browse")
+    try:
+        facets = load_facets()
+    except requests.RequestException as e:
+        st.caption(f"Facets unavailable: {e}")
+    else:
+        st.caption(f"{facets['points']} photos")
+        for field, values in facets["fields"].items():
+            if values:
+                with st.expander(field):
+                    for item in values:
+                        st.markdown(f"{item['value']} ({item['count']})")
+        if facets["years"]:
+            with st.expander("years"):
+                for year, count in facets["years"].items():
+                    st.markdown(f"{year} ({count})")
+
 query = st.text_input("Enter your query:", placeholder="e.g. Photos taken in May 2023 by iPhone")
 
 if st.button("Search") and query.strip():
@@ -0,0 +1,248 @@
+"""
+Local stand-ins for the external services, so the benchmarks run offline.
+Shared by run_benchmarks.py and backend_rag_service/benchmark_concurrency.py.
+
+* FakeAzureServer  - answers the Azure OpenAI embeddings and chat-completion
+                     routes with deterministic output after a configurable delay
+* synthetic_photos - N photo points with realistic `secure_photos` payloads
+* SQLitePool       - MySQLConnectionPool look-alike backed by SQLite, enough
+                     for mysql_writer's INSERT ... ON DUPLICATE KEY UPDATE
+"""
+import base64
+import hashlib
+import json
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+
+VECTOR_SIZE = 1536
+EMBEDDING_DEPLOYMENT = "fake-embedding"
+CHAT_DEPLOYMENT = "fake-chat"
+
+DEVICE_TYPES = ["ANDROID_PHONE", "IOS_PHONE", "IPAD"]
+APP_NAMES = ["com.google.android.apps.photos", "com.whatsapp", "com.instagram.android"]
+FOLDERS = ["Camera", "WhatsApp Images", "Screenshots", "Downloads", "Instagram"]
+PERSONS = ["john doe", "jane smith", "alex kim", "maria garcia"]
+SUBJECTS = ["a white lion near a river", "a birthday cake with candles", "a beach at sunset",
+            "two dogs playing in snow", "a mountain trail in fog", "a city street at night"]
+
+
+def deterministic_embedding(text: str, dim: int = VECTOR_SIZE) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def fake_extraction(query: str) -> dict:
+    """What the chat stub 'extracts': any known folder/device/person mentioned, else a folder."""
+    lowered = query.lower()
+    fields = {}
+    for folder in FOLDERS:
+        if folder.lower() in lowered:
+            fields["localFolderName"] = folder
+    for device in DEVICE_TYPES:
+        if device.lower() in lowered:
+            fields["deviceType"] = device
+    for person in PERSONS:
+        if person in lowered:
+            fields["persons"] = person
+    return fields or {"localFolderName": FOLDERS[len(query) % len(FOLDERS)]}
+
+
+class FakeAzureServer:
+    """Threaded HTTP server speaking just enough of the Azure OpenAI REST API."""
+
+    def __init__(self, embedding_latency_ms: float = 50, chat_latency_ms: float = 400):
+        self.embedding_latency = embedding_latency_ms / 1000
+        self.chat_latency = chat_latency_ms / 1000
+        self.calls = {"embeddings": 0, "chat": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeAzureServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.calls[kind] += 1
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if self.path.split("?")[0].endswith("/embeddings"):
+                    fake._count("embeddings")
+                    time.sleep(fake.embedding_latency)
+                    payload = self.embeddings(body)
+                else:
+                    fake._count("chat")
+                    time.sleep(fake.chat_latency)
+                    payload = self.chat(body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def embeddings(self, body: dict) -> dict:
+                inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                dim = body.get("dimensions") or VECTOR_SIZE
+                data = []
+                for index, text in enumerate(inputs):
+                    vector = deterministic_embedding(str(text), dim)
+                    if body.get("encoding_format") == "base64":
+                        embedding = base64.b64encode(vector.tobytes()).decode()
+                    else:
+                        embedding = vector.tolist()
+                    data.append({"object": "embedding", "index": index, "embedding": embedding})
+                return {"object": "list", "data": data, "model": EMBEDDING_DEPLOYMENT,
+                        "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}}
+
+            def chat(self, body: dict) -> dict:
+                prompt = body["messages"][-1]["content"]
+                match = re.search(r"User Query: (.*?)\n\nOnly return", prompt, re.S)
+                content = json.dumps(fake_extraction(match.group(1) if match else prompt))
+                return {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": CHAT_DEPLOYMENT,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+                }
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def synthetic_photos(count: int, seed: int = 7) -> List[dict]:
+    """Point dicts (id, vector, payload) shaped like ingest_photos output."""
+    rng = random.Random(seed)
+    start = 1_420_070_400  # 2015-01-01
+    photos = []
+    for i in range(count):
+        summary = f"Photo {i}: {rng.choice(SUBJECTS)}"
+        payload = {
+            "image_path": f"/takeout/Google Photos/album/IMG_{i:06d}.jpg",
+            "title": f"IMG_{i:06d}.jpg",
+            "summary": summary,
+            "timestamp": start + rng.randrange(10 * 365 * 86400),
+            "url": f"https://photos.example.com/{i}",
+            "deviceType": rng.choice(DEVICE_TYPES),
+            "appName": rng.choice(APP_NAMES),
+            "localFolderName": rng.choice(FOLDERS),
+            "persons": rng.sample(PERSONS, rng.randint(0, 2)),
+        }
+        photos.append({"id": i, "vector": deterministic_embedding(summary), "payload": payload})
+    return photos
+
+
+def vectors_config(size: int = VECTOR_SIZE):
+    from qdrant_client.models import Distance, VectorParams
+
+    return {"summary_embedding": VectorParams(size=size, distance=Distance.COSINE)}
+
+
+def _points(photos: List[dict]):
+    from qdrant_client.models import PointStruct
+
+    return [PointStruct(id=p["id"], vector={"summary_embedding": p["vector"].tolist()}, payload=p["payload"])
+            for p in photos]
+
+
+def seed_sync(client, collection_name: str, photos: List[dict], batch_size: int = 512):
+    client.create_collection(collection_name, vectors_config=vectors_config())
+    client.create_payload_index(collection_name, "timestamp", field_schema="integer")
+    for start in range(0, len(photos), batch_size):
+        client.upsert(collection_name, points=_points(photos[start:start + batch_size]))
+
+
+async def seed_async(client, collection_name: str, photos: List[dict], batch_size: int = 512):
+    await client.create_collection(collection_name, vectors_config=vectors_config())
+    await client.create_payload_index(collection_name, "timestamp", field_schema="integer")
+    for start in range(0, len(photos), batch_size):
+        await client.upsert(collection_name, points=_points(photos[start:start + batch_size]))
+
+
+# --- MySQL stand-in ---
+_UPSERT_CLAUSE = re.compile(r"ON DUPLICATE KEY UPDATE")
+_VALUES_REF = re.compile(r"VALUES\((`\w+`)\)")
+
+
+def mysql_to_sqlite(statement: str) -> str:
+    statement = statement.replace("%s", "?")
+    statement = _UPSERT_CLAUSE.sub("ON CONFLICT(`id`) DO UPDATE SET", statement)
+    return _VALUES_REF.sub(r"excluded.\1", statement)
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, statement: str, params=()):
+        self._cursor.execute(mysql_to_sqlite(statement), params)
+
+    def close(self):
+        self._cursor.close()
+
+
+class _PooledConnection:
+    def __init__(self, pool: "SQLitePool", connection: sqlite3.Connection):
+        self._pool = pool
+        self._connection = connection
+
+    def cursor(self):
+        return _SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._pool._release(self._connection)
+
+
+class SQLitePool:
+    """get_connection()/close() semantics of mysql.connector pooling, on one SQLite file."""
+
+    def __init__(self, path: str, table_name: str = "processed_data_dify", pool_size: int = 8):
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            connection = sqlite3.connect(path, check_same_thread=False, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._connections.put(connection)
+        setup = sqlite3.connect(path)
+        setup.execute(
+            f"CREATE TABLE IF NOT EXISTS `{table_name}` "
+            "(`id` INTEGER PRIMARY KEY, `value1` INTEGER, `value2` INTEGER, `sum` INTEGER)"
+        )
+        setup.commit()
+        setup.close()
+
+    def get_connection(self, timeout: Optional[float] = None) -> _PooledConnection:
+        return _PooledConnection(self, self._connections.get(timeout=timeout))
+
+    def _release(self, connection: sqlite3.Connection):
+        self._connections.put(connection)
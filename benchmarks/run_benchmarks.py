@@ -0,0 +1,352 @@
+"""
+End-to-end load benchmarks for the three FastAPI services, fully offline.
+
+    rag       Photos Pipeline/backend_rag_service      /query, /query/batch
+    metadata  Photos Pipeline/metadata_search_backend  /metadata-query (rule and LLM path), /hybrid-query
+    csv       CSV to SQL/dify_main.py                  /upload, /upload/csv
+
+Azure OpenAI is replaced by fakes.FakeAzureServer (runs in this process, with
+configurable embedding and chat latency), Qdrant runs in ":memory:" mode seeded
+with --points synthetic photos and MySQL by an SQLite-backed pool. Each service
+runs in its own spawned process: both search services have a module called
+`main`, their settings are read from the environment at import time, and
+memory is then measured per service.
+
+Requests go through httpx.ASGITransport, so the numbers cover the app itself
+(routing, validation, handlers, clients) without a socket or uvicorn in
+between, like one worker. Per scenario the report holds throughput, p50/p95/p99
+latency, error count and peak RSS.
+
+    python run_benchmarks.py --output baseline.json
+    python run_benchmarks.py --services rag --requests 500 --concurrency 64
+    python run_benchmarks.py --baseline baseline.json --tolerance 0.15   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fakes
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SERVICE_DIRS = {
+    "rag": REPO_ROOT / "Photos Pipeline" / "backend_rag_service",
+    "metadata": REPO_ROOT / "Photos Pipeline" / "metadata_search_backend",
+    "csv": REPO_ROOT / "CSV to SQL",
+}
+SCENARIOS = {
+    "rag": ["rag_query", "rag_query_batch"],
+    "metadata": ["metadata_rules", "metadata_llm", "hybrid_query"],
+    "csv": ["csv_upload_json", "csv_upload_stream"],
+}
+BATCH_QUERIES = 8
+
+# A scenario regresses when throughput drops or p95 latency grows by more than the tolerance
+HIGHER_IS_BETTER = ("qps",)
+LOWER_IS_BETTER = ("p95_ms", "peak_rss_mb")
+
+
+# --- Request bodies ---
+def subject_query(i: int, distinct: int) -> str:
+    n = i % distinct if distinct else i
+    return f"{fakes.SUBJECTS[n % len(fakes.SUBJECTS)]} #{n}"
+
+
+def csv_records(i: int, rows: int) -> list:
+    first = i * rows
+    return [{"id": first + r, "value1": r, "value2": 2 * r, "sum": 3 * r} for r in range(rows)]
+
+
+def csv_body(i: int, rows: int) -> bytes:
+    first = i * rows
+    lines = ["id,value1,value2"] + [f"{first + r},{r},{2 * r}" for r in range(rows)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def build_request(scenario: str, i: int, args) -> tuple:
+    """(path, keyword arguments for httpx.AsyncClient.post) of the i-th request."""
+    distinct = args.distinct_queries
+    if scenario == "rag_query":
+        return "/query", {"json": {"query": subject_query(i, distinct)}}
+    if scenario == "rag_query_batch":
+        queries = [subject_query(i * BATCH_QUERIES + k, distinct) for k in range(BATCH_QUERIES)]
+        return "/query/batch", {"json": {"queries": queries}}
+    if scenario == "metadata_rules":
+        # Fully explained by the rule parser: no LLM call
+        folder = fakes.FOLDERS[i % len(fakes.FOLDERS)]
+        return "/metadata-query", {"json": {"query": f"photos from {folder}", "limit": 20}}
+    if scenario == "metadata_llm":
+        # The trailing words defeat the rule parser and, when distinct, the extraction cache
+        folder = fakes.FOLDERS[i % len(fakes.FOLDERS)]
+        return "/metadata-query", {"json": {"query": f"{folder} pictures of our trip {subject_query(i, distinct)}",
+                                            "limit": 20}}
+    if scenario == "hybrid_query":
+        folder = fakes.FOLDERS[i % len(fakes.FOLDERS)]
+        return "/hybrid-query", {"json": {"query": f"{subject_query(i, distinct)} in {folder}", "limit": 10}}
+    if scenario == "csv_upload_json":
+        return "/upload", {"json": csv_records(i, args.csv_rows)}
+    if scenario == "csv_upload_stream":
+        return "/upload/csv", {"content": csv_body(i, args.csv_rows), "headers": {"Content-Type": "text/csv"}}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def response_failed(response) -> bool:
+    if response.status_code >= 400:
+        return True
+    # dify_main reports failures in the body with a 200
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("status") == "error"
+
+
+# --- Measurement ---
+def current_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def drive(client, scenario: str, args) -> dict:
+    for i in range(args.warmup):
+        path, kwargs = build_request(scenario, args.requests + i, args)
+        await client.post(path, **kwargs)
+
+    latencies = []
+    errors = 0
+    next_index = 0
+    peak_rss = current_rss_mb()
+    rss_start = peak_rss
+    done = asyncio.Event()
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while not done.is_set():
+            peak_rss = max(peak_rss, current_rss_mb())
+            await asyncio.sleep(0.05)
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < args.requests:
+            i = next_index
+            next_index += 1
+            path, kwargs = build_request(scenario, i, args)
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, **kwargs)
+                failed = response_failed(response)
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    sampler = asyncio.create_task(sample_rss())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await sampler
+    peak_rss = max(peak_rss, current_rss_mb())
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "qps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "rss_start_mb": round(rss_start, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+# --- Service processes ---
+def configure_environment(service: str, endpoint: str):
+    os.environ.update({
+        "QDRANT_HOST": ":memory:",
+        "COLLECTION_NAME": "secure_photos",
+        "AZURE_OPENAI_API_KEY": "fake-key",
+        "AZURE_OPENAI_ENDPOINT": endpoint,
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME": fakes.EMBEDDING_DEPLOYMENT,
+        "AZURE_OPENAI_DEPLOYMENT_NAME": fakes.CHAT_DEPLOYMENT,
+    })
+    # A persisted cache would turn a second run into all hits
+    os.environ.pop("EMBEDDING_CACHE_PATH", None)
+    sys.path.insert(0, str(SERVICE_DIRS[service]))
+
+
+async def run_service(service: str, endpoint: str, args, workdir: str) -> dict:
+    import httpx
+
+    configure_environment(service, endpoint)
+    photos = fakes.synthetic_photos(args.points) if service in ("rag", "metadata") else []
+
+    if service == "csv":
+        import dify_main as module
+
+        # The app only calls create_pool(db_config) in its lifespan
+        module.create_pool = lambda db_config: fakes.SQLitePool(os.path.join(workdir, "csv.sqlite3"))
+    elif service == "metadata":
+        import main as module
+        import hybrid_search
+        import qdrant_search
+
+        # Seeded before startup so the lifespan loads the vocabularies from it
+        fakes.seed_sync(qdrant_search.qdrant, qdrant_search.COLLECTION_NAME, photos)
+        await fakes.seed_async(hybrid_search.async_qdrant, qdrant_search.COLLECTION_NAME, photos)
+    else:
+        import main as module
+
+    app = module.app
+    rss_seeded = current_rss_mb()
+    results = {}
+    async with app.router.lifespan_context(app):
+        if service == "rag":
+            await fakes.seed_async(app.state.qdrant_client, module.COLLECTION_NAME, photos)
+            rss_seeded = current_rss_mb()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for scenario in SCENARIOS[service]:
+                if args.scenarios and scenario not in args.scenarios:
+                    continue
+                result = await drive(client, scenario, args)
+                result["rss_after_seed_mb"] = round(rss_seeded, 1)
+                results[scenario] = result
+    return results
+
+
+def _service_process(service: str, endpoint: str, args, queue):
+    if not args.verbose:
+        # The services print every LLM response; keep the report readable
+        sys.stdout = open(os.devnull, "w")
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            queue.put(("ok", asyncio.run(run_service(service, endpoint, args, workdir))))
+    except BaseException as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_in_process(service: str, endpoint: str, args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_service_process, args=(service, endpoint, args, queue))
+    process.start()
+    status, result = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(result)
+    return result
+
+
+# --- Baselines ---
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of current vs baseline scenarios as human-readable lines."""
+    regressions = []
+    for scenario, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if not before:
+            continue
+        for metric in HIGHER_IS_BETTER:
+            if before.get(metric) and result[metric] < before[metric] * (1 - tolerance):
+                regressions.append(f"{scenario}: {metric} {before[metric]} -> {result[metric]}")
+        for metric in LOWER_IS_BETTER:
+            if before.get(metric) and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{scenario}: {metric} {before[metric]} -> {result[metric]}")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks of the FastAPI services.")
+    parser.add_argument("--services", default="rag,metadata,csv", help="Comma-separated: rag, metadata, csv")
+    parser.add_argument("--scenarios", default="", help="Comma-separated scenario names (default: all)")
+    parser.add_argument("--requests", type=int, default=300, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--points", type=int, default=5000, help="Synthetic photos seeded into Qdrant")
+    parser.add_argument("--distinct-queries", type=int, default=0,
+                        help="Cycle through this many distinct queries (0 = every query unique, no cache hits)")
+    parser.add_argument("--csv-rows", type=int, default=1000, help="Rows per CSV upload request")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--chat-latency-ms", type=float, default=400)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the services' own output")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+
+    services = [s for s in args.services.split(",") if s]
+    if "csv" in services:
+        try:
+            import mysql.connector  # noqa: F401  (mysql_writer imports it at module level)
+        except ImportError:
+            print("⚠️ mysql-connector-python not installed, skipping the csv service")
+            services.remove("csv")
+
+    server = fakes.FakeAzureServer(args.embedding_latency_ms, args.chat_latency_ms).start()
+    scenarios = {}
+    try:
+        for service in services:
+            print(f"🚀 {service}")
+            for scenario, result in run_in_process(service, server.endpoint, args).items():
+                scenarios[scenario] = {"service": service, **result}
+                print(f"✅ {scenario:>18}: {result['qps']:>8} req/s  p50 {result['p50_ms']} ms  "
+                      f"p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+                      f"peak RSS {result['peak_rss_mb']} MB  errors={result['errors']}")
+    finally:
+        server.stop()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "verbose")},
+        "upstream_calls": server.calls,
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ Regression {line}")
+        if regressions:
+            return 1
+        print(f"✅ No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())